@@ -0,0 +1,24 @@
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("regrade-quiz")
+@click.argument("quiz")
+@pass_context
+def regrade_quiz(context, quiz):
+	"""Regrade the submissions of a quiz against its current answer key."""
+	import frappe
+
+	from lms.lms.regrade import regrade_quiz_submissions
+
+	frappe.init(site=get_site(context))
+	frappe.connect()
+	try:
+		result = regrade_quiz_submissions(quiz)
+	finally:
+		frappe.destroy()
+
+	click.echo(f"Regraded {result['submissions']} submissions, {result['updated']} updated.")
+
+
+commands = [regrade_quiz]
@@ -102,6 +102,106 @@ doc_events = {
 		]
 	},
 	"Discussion Reply": {"after_insert": "lms.lms.utils.handle_notifications"},
+	"LMS Course": {
+		"on_update": [
+			"lms.lms.course_outline.clear_outline_cache_for_doc",
+			"lms.lms.course_statistics.update_lesson_count_for_doc",
+			"lms.lms.catalog.clear_catalog_cache",
+			"lms.lms.search.update_search_index",
+			"lms.lms.facets.update_facets",
+		],
+		"on_trash": [
+			"lms.lms.course_outline.clear_outline_cache_for_doc",
+			"lms.lms.catalog.clear_catalog_cache",
+			"lms.lms.search.update_search_index",
+			"lms.lms.facets.update_facets",
+		],
+	},
+	"LMS Batch": {
+		"on_update": [
+			"lms.lms.catalog.clear_catalog_cache",
+			"lms.lms.search.update_search_index",
+			"lms.lms.facets.update_facets",
+			"lms.lms.gradebook.clear_gradebook_cache_for_batch",
+		],
+		"on_trash": [
+			"lms.lms.catalog.clear_catalog_cache",
+			"lms.lms.search.update_search_index",
+			"lms.lms.facets.update_facets",
+		],
+	},
+	"Batch Course": {"on_trash": "lms.lms.gradebook.clear_gradebook_cache_for_batch"},
+	"LMS Assessment": {"on_trash": "lms.lms.gradebook.clear_gradebook_cache_for_batch"},
+	"Job Opportunity": {
+		"on_update": "lms.lms.search.update_search_index",
+		"on_trash": "lms.lms.search.update_search_index",
+	},
+	"LMS Enrollment": {
+		"after_insert": "lms.lms.course_statistics.update_enrollment_count",
+		"on_update": [
+			"lms.lms.catalog.clear_catalog_cache",
+			"lms.lms.course_statistics.update_enrollment_count",
+			"lms.lms.gradebook.clear_gradebook_cache_for_doc",
+		],
+		"on_trash": [
+			"lms.lms.catalog.clear_catalog_cache",
+			"lms.lms.course_statistics.update_enrollment_count",
+			"lms.lms.gradebook.clear_gradebook_cache_for_doc",
+		],
+	},
+	"LMS Course Progress": {
+		"on_update": "lms.lms.gradebook.clear_gradebook_cache_for_doc",
+		"on_trash": "lms.lms.gradebook.clear_gradebook_cache_for_doc",
+	},
+	"LMS Quiz Submission": {
+		"on_update": "lms.lms.gradebook.clear_gradebook_cache_for_doc",
+		"on_trash": [
+			"lms.lms.gradebook.clear_gradebook_cache_for_doc",
+			"lms.lms.item_analysis.clear_item_analysis_for_doc",
+		],
+	},
+	"LMS Assignment Submission": {
+		"on_update": "lms.lms.gradebook.clear_gradebook_cache_for_doc",
+		"on_trash": "lms.lms.gradebook.clear_gradebook_cache_for_doc",
+	},
+	"LMS Programming Exercise Submission": {
+		"on_update": "lms.lms.gradebook.clear_gradebook_cache_for_doc",
+		"on_trash": "lms.lms.gradebook.clear_gradebook_cache_for_doc",
+	},
+	"LMS Course Review": {
+		"on_update": [
+			"lms.lms.course_statistics.update_rating_for_doc",
+			"lms.lms.reviews.update_review_summary",
+		],
+		"after_delete": [
+			"lms.lms.course_statistics.update_rating_for_doc",
+			"lms.lms.reviews.update_review_summary",
+		],
+	},
+	"LMS Batch Enrollment": {
+		"on_update": "lms.lms.catalog.clear_catalog_cache",
+		"on_trash": "lms.lms.catalog.clear_catalog_cache",
+	},
+	"Course Chapter": {
+		"on_update": [
+			"lms.lms.course_outline.clear_outline_cache_for_doc",
+			"lms.lms.search.update_search_index",
+		],
+		"on_trash": [
+			"lms.lms.course_outline.clear_outline_cache_for_doc",
+			"lms.lms.search.update_search_index",
+		],
+	},
+	"Course Lesson": {
+		"on_update": [
+			"lms.lms.course_outline.clear_outline_cache_for_doc",
+			"lms.lms.search.update_search_index",
+		],
+		"on_trash": [
+			"lms.lms.course_outline.clear_outline_cache_for_doc",
+			"lms.lms.search.update_search_index",
+		],
+	},
 	"Notification Log": {"on_change": "lms.lms.utils.publish_notifications"},
 	"User": {
 		"validate": "lms.lms.user.validate_username_duplicates",
@@ -117,6 +217,8 @@ scheduler_events = {
 		"lms.lms.api.update_course_statistics",
 		"lms.lms.doctype.lms_certificate_request.lms_certificate_request.mark_eval_as_completed",
 		"lms.lms.doctype.lms_live_class.lms_live_class.update_attendance",
+		"lms.lms.exchange_rates.refresh_exchange_rates",
+		"lms.lms.seats.reconcile_seats_taken",
 	],
 	"daily": [
 		"lms.job.doctype.job_opportunity.job_opportunity.update_job_openings",
@@ -124,7 +226,20 @@ scheduler_events = {
 		"lms.lms.doctype.lms_batch.lms_batch.send_batch_start_reminder",
 		"lms.lms.doctype.lms_live_class.lms_live_class.send_live_class_reminder",
 		"lms.lms.analytics.aggregate_daily_analytics",
+		"lms.lms.facets.rebuild_all_facets",
 	],
+	"cron": {
+		"* * * * *": [
+			"lms.lms.heartbeat_buffer.flush_heartbeat_buffer",
+		],
+		"*/5 * * * *": [
+			"lms.lms.analytics.close_stale_sessions",
+			"lms.lms.seats.release_expired_holds",
+		],
+		"*/15 * * * *": [
+			"lms.lms.analytics_rollup.rollup_time_analytics",
+		],
+	},
 }
 
 fixtures = ["Custom Field", "Function", "Industry", "LMS Category"]
@@ -2,51 +2,112 @@
 
 import frappe
 from frappe import _
-from frappe.utils import getdate, add_days, now_datetime, cint, flt, get_datetime
+from frappe.utils import getdate, add_days, add_to_date, now, now_datetime, cint, flt, get_datetime
+from frappe.utils import time_diff_in_seconds
 from datetime import datetime, timedelta
 
+from lms.lms.analytics_rollup import backfill_time_analytics, get_data_as_of
+from lms.lms.heartbeat_buffer import (
+    clear_session_counters,
+    forget_session_meta,
+    get_session_counters
+)
+from lms.lms.utils import decode_cursor, encode_cursor
 
-def update_time_analytics(session):
-    """Update time analytics from a session."""
-    # Get date from session
-    date = getdate(session.start_time)
-    
-    # Check if analytics record exists
-    filters = {
-        "member": session.member,
-        "course": session.course,
-        "chapter": session.chapter or "",
-        "lesson": session.lesson or "",
-        "date": date
-    }
-    
-    analytics = frappe.db.get_value("LMS Time Analytics", filters, ["name", "active_time", "sessions_count"])
-    
-    if analytics:
-        name, active_time, sessions_count = analytics
-        frappe.db.set_value(
-            "LMS Time Analytics", 
-            name, 
-            {
-                "active_time": cint(active_time) + cint(session.active_time),
-                "sessions_count": cint(sessions_count) + 1
-            }
-        )
+ANALYTICS_SORT_FIELDS = {
+    "total_active_time": "t.total_active_time",
+    "total_sessions": "t.total_sessions",
+    "completion": "t.completion"
+}
+STALE_SESSION_TIMEOUT = 30 * 60
+STALE_SESSION_BATCH_SIZE = 500
+
+
+def get_heartbeat_counters(session_id):
+    """Get session counters from the stored heartbeats, when Redis no longer has them."""
+    counters = frappe.db.sql("""
+        SELECT
+            SUM(CASE WHEN is_focused = 1 AND is_visible = 1 THEN 1 ELSE 0 END) as active_beats,
+            COUNT(*) as heartbeats,
+            MAX(timestamp) as last_heartbeat
+        FROM `tabLMS Learning Heartbeat`
+        WHERE session_id = %s
+    """, (session_id,), as_dict=True)[0]
+
+    heartbeats = cint(counters.heartbeats)
+    active_beats = cint(counters.active_beats)
+    return frappe._dict(
+        active_time=active_beats * 15,
+        idle_time=(heartbeats - active_beats) * 15,
+        heartbeats=heartbeats,
+        last_heartbeat=counters.last_heartbeat
+    )
+
+
+def calculate_session_times(session, counters, end_time):
+    """Calculate active and idle seconds of a session from its counters."""
+    active_time = cint(counters.active_time)
+    idle_time = cint(counters.idle_time)
+    total_time = max(0, time_diff_in_seconds(end_time, session.start_time))
+
+    if counters.heartbeats:
+        # If no heartbeats were active, calculate from start to end time
+        if not active_time:
+            active_time = max(0, total_time - idle_time)
+    elif total_time < 300:
+        # No heartbeats - assume active if session was short (< 5 minutes)
+        active_time = total_time
     else:
-        doc = frappe.get_doc({
-            "doctype": "LMS Time Analytics",
-            "member": session.member,
-            "course": session.course,
-            "chapter": session.chapter or "",
-            "lesson": session.lesson or "",
-            "date": date,
-            "active_time": session.active_time,
-            "sessions_count": 1
-        })
-        doc.insert(ignore_permissions=True)
-    
-    # Note: Time tracking is stored in LMS Time Analytics
-    # LMS Course Progress is used only for completion tracking
+        # For longer sessions without heartbeats, be conservative
+        active_time = min(total_time, 60)
+
+    return int(active_time), int(idle_time)
+
+
+def close_learning_session(session, end_reason, end_time=None, counters=None):
+    """Close a session using its running counters."""
+    if not counters:
+        counters = get_session_counters([session.session_id]).get(session.session_id)
+    if not counters:
+        counters = get_heartbeat_counters(session.session_id)
+
+    session.end_time = end_time or now()
+    session.end_reason = end_reason
+    session.active_time, session.idle_time = calculate_session_times(session, counters, session.end_time)
+    session.last_heartbeat = counters.last_heartbeat or session.last_heartbeat
+    session.save(ignore_permissions=True)
+
+    clear_session_counters(session.session_id)
+    forget_session_meta(session.session_id)
+
+
+def close_stale_sessions():
+    """Scheduled task to close sessions that stopped sending heartbeats without an end call."""
+    cutoff = add_to_date(now_datetime(), seconds=-STALE_SESSION_TIMEOUT)
+
+    sessions = frappe.get_all(
+        "LMS Learning Session",
+        filters={"end_time": ["is", "not set"], "start_time": ["<", cutoff]},
+        or_filters=[["last_heartbeat", "<", cutoff], ["last_heartbeat", "is", "not set"]],
+        fields=["name", "session_id", "start_time", "last_heartbeat"],
+        order_by="start_time",
+        limit=STALE_SESSION_BATCH_SIZE
+    )
+    counters = get_session_counters(session.session_id for session in sessions)
+
+    for session in sessions:
+        session_counters = counters.get(session.session_id)
+        last_seen = (session_counters and session_counters.last_heartbeat) or session.last_heartbeat
+        if get_datetime(last_seen or session.start_time) >= cutoff:
+            continue
+
+        close_learning_session(
+            frappe.get_doc("LMS Learning Session", session.name),
+            "idle_timeout",
+            end_time=last_seen or session.start_time,
+            counters=session_counters
+        )
+        frappe.db.commit()
 
 
 def get_student_time_analytics(student=None, course=None, from_date=None, to_date=None):
@@ -57,13 +118,11 @@ def get_student_time_analytics(student=None, course=None, from_date=None, to_dat
         filters["member"] = student
     if course:
         filters["course"] = course
-    if from_date:
-        filters["date"] = [">=", from_date]
-    if to_date:
-        filters["date"] = ["<=", to_date]
+    if from_date or to_date:
+        filters["date"] = ["between", [from_date or "2000-01-01", to_date or "2099-12-31"]]
     
     analytics = frappe.get_all(
-        "LMS Time Analytics",
+        "LMS Member Course Analytics",
         filters=filters,
         fields=["member", "member_name", "course", "course_name", "date", "active_time", "sessions_count"],
         order_by="date desc"
@@ -97,56 +156,213 @@ def get_student_time_analytics(student=None, course=None, from_date=None, to_dat
     return list(result.values())
 
 
+def get_student_time_analytics_page(student=None, course=None, from_date=None, to_date=None,
+                                    sort_by="total_active_time", sort_order="desc", cursor=None,
+                                    page_length=50, include_daily=False):
+    """Get one page of member/course time analytics, sorted on the server with a keyset cursor."""
+    if sort_by not in ANALYTICS_SORT_FIELDS:
+        frappe.throw(_("Cannot sort by {0}").format(sort_by))
+
+    page_length = min(cint(page_length) or 50, 500)
+    descending = (sort_order or "desc").lower() == "desc"
+    values = {
+        "from_date": from_date or "2000-01-01",
+        "to_date": to_date or "2099-12-31",
+        "page_length": page_length + 1
+    }
+
+    conditions = get_analytics_conditions(values, student, course)
+    if conditions is None:
+        return {"data": [], "next_cursor": None}
+
+    keyset = ""
+    if cursor:
+        values["cursor_value"], values["cursor_member"], values["cursor_course"] = decode_cursor(cursor, 3)
+        keyset = "WHERE ({}, t.member, t.course) {} (%(cursor_value)s, %(cursor_member)s, %(cursor_course)s)".format(
+            ANALYTICS_SORT_FIELDS[sort_by], "<" if descending else ">"
+        )
+
+    direction = "DESC" if descending else "ASC"
+    rows = frappe.db.sql("""
+        SELECT * FROM (
+            SELECT
+                t.member, t.member_name, t.course, t.course_name,
+                t.total_active_time, t.total_sessions, t.days_active,
+                COALESCE(e.progress, 0) as completion
+            FROM (
+                SELECT
+                    member, MAX(member_name) as member_name,
+                    course, MAX(course_name) as course_name,
+                    SUM(active_time) as total_active_time,
+                    SUM(sessions_count) as total_sessions,
+                    COUNT(DISTINCT date) as days_active
+                FROM `tabLMS Member Course Analytics`
+                WHERE {conditions}
+                GROUP BY member, course
+            ) t
+            LEFT JOIN `tabLMS Enrollment` e ON e.member = t.member AND e.course = t.course
+        ) t
+        {keyset}
+        ORDER BY {sort_field} {direction}, t.member {direction}, t.course {direction}
+        LIMIT %(page_length)s
+    """.format(
+        conditions=" AND ".join(conditions),
+        keyset=keyset,
+        sort_field=ANALYTICS_SORT_FIELDS[sort_by],
+        direction=direction
+    ), values, as_dict=True)
+
+    next_cursor = None
+    if len(rows) > page_length:
+        rows = rows[:page_length]
+        last = rows[-1]
+        next_cursor = encode_cursor([flt(last[sort_by]), last.member, last.course])
+
+    for row in rows:
+        row.total_active_time = cint(row.total_active_time)
+        row.total_sessions = cint(row.total_sessions)
+        row.completion = cint(row.completion)
+
+    if cint(include_daily) and rows:
+        attach_daily_data(rows, values["from_date"], values["to_date"])
+
+    return {"data": rows, "next_cursor": next_cursor}
+
+
+def get_time_analytics_summary(student=None, course=None, from_date=None, to_date=None):
+    """Get dashboard totals with aggregate queries instead of loading every row."""
+    values = {"from_date": from_date or "2000-01-01", "to_date": to_date or "2099-12-31"}
+    conditions = get_analytics_conditions(values, student, course)
+    if conditions is None:
+        return {"totalTime": 0, "activeStudents": 0, "avgCompletionRate": 0, "avgTimePerStudent": 0}
+
+    totals = frappe.db.sql("""
+        SELECT SUM(active_time) as total_time, COUNT(DISTINCT member) as active_students
+        FROM `tabLMS Member Course Analytics`
+        WHERE {conditions}
+    """.format(conditions=" AND ".join(conditions)), values, as_dict=True)[0]
+
+    enrollment_conditions = [c for c in conditions if not c.startswith("date")]
+    avg_completion = frappe.db.sql("""
+        SELECT AVG(progress)
+        FROM `tabLMS Enrollment`
+        WHERE {conditions}
+    """.format(conditions=" AND ".join(enrollment_conditions) or "1=1"), values)[0][0]
+
+    total_time = cint(totals.total_time)
+    active_students = cint(totals.active_students)
+    return {
+        "totalTime": total_time,
+        "activeStudents": active_students,
+        "avgCompletionRate": round(flt(avg_completion), 1),
+        "avgTimePerStudent": total_time / active_students if active_students > 0 else 0
+    }
+
+
+def get_analytics_conditions(values, student=None, course=None):
+    """Build conditions on member, course and date. Returns None if no course is permitted."""
+    conditions = ["date BETWEEN %(from_date)s AND %(to_date)s"]
+    if student:
+        conditions.append("member = %(student)s")
+        values["student"] = student
+    if isinstance(course, list | tuple):
+        courses = course[1] if course[0] == "in" else course
+        if not courses:
+            return None
+        conditions.append("course IN %(courses)s")
+        values["courses"] = tuple(courses)
+    elif course:
+        conditions.append("course = %(course)s")
+        values["course"] = course
+    return conditions
+
+
+def attach_daily_data(rows, from_date, to_date):
+    """Add per-day detail to member/course rows with a single query."""
+    members = {row.member for row in rows}
+    courses = {row.course for row in rows}
+    daily = frappe.get_all(
+        "LMS Member Course Analytics",
+        filters={
+            "member": ["in", list(members)],
+            "course": ["in", list(courses)],
+            "date": ["between", [from_date, to_date]]
+        },
+        fields=["member", "course", "date", "active_time", "sessions_count"],
+        order_by="date desc"
+    )
+
+    daily_data = {}
+    for day in daily:
+        daily_data.setdefault((day.member, day.course), []).append({
+            "date": day.date,
+            "active_time": day.active_time,
+            "sessions": day.sessions_count
+        })
+
+    for row in rows:
+        row.daily_data = daily_data.get((row.member, row.course), [])
+
+
 def get_course_time_analytics(course, from_date=None, to_date=None):
     """Get time analytics for a specific course."""
-    filters = {"course": course}
-    
-    if from_date:
-        filters["date"] = [">=", from_date]
-    if to_date:
-        filters["date"] = ["<=", to_date]
+    values = {
+        "course": course,
+        "from_date": from_date or "2000-01-01",
+        "to_date": to_date or "2099-12-31"
+    }
     
     # Get chapter/lesson analytics
     unit_analytics = frappe.db.sql("""
         SELECT 
-            chapter, chapter_name, lesson, lesson_name, 
+            chapter, MAX(chapter_name) as chapter_name, lesson, MAX(lesson_name) as lesson_name, 
             SUM(active_time) as total_active_time,
-            SUM(sessions_count) as total_sessions,
-            COUNT(DISTINCT member) as unique_students
-        FROM `tabLMS Time Analytics`
-        WHERE course = %s
-        AND date BETWEEN %s AND %s
+            SUM(sessions_count) as total_sessions
+        FROM `tabLMS Lesson Daily Analytics`
+        WHERE course = %(course)s
+        AND date BETWEEN %(from_date)s AND %(to_date)s
         GROUP BY chapter, lesson
         ORDER BY chapter, lesson
-    """, (course, from_date or '2000-01-01', to_date or '2099-12-31'), as_dict=True)
+    """, values, as_dict=True)
+    
+    # Unique students can't be summed across days, count them over the range
+    unit_students = frappe.db.sql("""
+        SELECT chapter, lesson, COUNT(DISTINCT member) as unique_students
+        FROM `tabLMS Time Analytics`
+        WHERE course = %(course)s
+        AND date BETWEEN %(from_date)s AND %(to_date)s
+        GROUP BY chapter, lesson
+    """, values, as_dict=True)
+    unit_students = {(u.chapter, u.lesson): u.unique_students for u in unit_students}
+    for unit in unit_analytics:
+        unit.unique_students = unit_students.get((unit.chapter, unit.lesson), 0)
     
     # Get student analytics
     student_analytics = frappe.db.sql("""
         SELECT 
-            member, member_name,
+            member, MAX(member_name) as member_name,
             SUM(active_time) as total_active_time,
             SUM(sessions_count) as total_sessions,
             COUNT(DISTINCT date) as days_active
-        FROM `tabLMS Time Analytics`
-        WHERE course = %s
-        AND date BETWEEN %s AND %s
+        FROM `tabLMS Member Course Analytics`
+        WHERE course = %(course)s
+        AND date BETWEEN %(from_date)s AND %(to_date)s
         GROUP BY member
         ORDER BY total_active_time DESC
-    """, (course, from_date or '2000-01-01', to_date or '2099-12-31'), as_dict=True)
+    """, values, as_dict=True)
     
     # Get daily analytics
     daily_analytics = frappe.db.sql("""
         SELECT 
             date,
-            SUM(active_time) as total_active_time,
-            SUM(sessions_count) as total_sessions,
-            COUNT(DISTINCT member) as unique_students
-        FROM `tabLMS Time Analytics`
-        WHERE course = %s
-        AND date BETWEEN %s AND %s
-        GROUP BY date
+            active_time as total_active_time,
+            sessions_count as total_sessions,
+            unique_students
+        FROM `tabLMS Course Daily Analytics`
+        WHERE course = %(course)s
+        AND date BETWEEN %(from_date)s AND %(to_date)s
         ORDER BY date
-    """, (course, from_date or '2000-01-01', to_date or '2099-12-31'), as_dict=True)
+    """, values, as_dict=True)
     
     # Get course completion data
     completion_data = frappe.db.sql("""
@@ -180,7 +396,8 @@ def get_course_time_analytics(course, from_date=None, to_date=None):
         },
         "units": unit_analytics,
         "students": student_analytics,
-        "daily": daily_analytics
+        "daily": daily_analytics,
+        "data_as_of": get_data_as_of()
     }
 
 
@@ -194,13 +411,13 @@ def get_student_course_analytics(student, course=None):
     # Get course-level analytics
     course_analytics = frappe.db.sql("""
         SELECT 
-            course, course_name,
+            course, MAX(course_name) as course_name,
             SUM(active_time) as total_active_time,
             SUM(sessions_count) as total_sessions,
             COUNT(DISTINCT date) as days_active,
             MIN(date) as first_access,
             MAX(date) as last_access
-        FROM `tabLMS Time Analytics`
+        FROM `tabLMS Member Course Analytics`
         WHERE member = %s
         GROUP BY course
         ORDER BY total_active_time DESC
@@ -261,11 +478,10 @@ def get_student_course_analytics(student, course=None):
         daily_activity = frappe.db.sql("""
             SELECT 
                 date,
-                SUM(active_time) as active_time,
-                SUM(sessions_count) as sessions
-            FROM `tabLMS Time Analytics`
+                active_time,
+                sessions_count as sessions
+            FROM `tabLMS Member Course Analytics`
             WHERE member = %s AND course = %s
-            GROUP BY date
             ORDER BY date
         """, (student, course_id), as_dict=True)
         
@@ -290,22 +506,6 @@ def get_student_course_analytics(student, course=None):
 
 
 def aggregate_daily_analytics():
-    """Scheduled task to aggregate analytics data."""
+    """Scheduled task to reconcile yesterday's analytics with its sessions."""
     yesterday = getdate(add_days(now_datetime(), -1))
-    
-    # Find sessions that ended yesterday
-    sessions = frappe.get_all(
-        "LMS Learning Session",
-        filters={
-            "end_time": ["between", [datetime.combine(yesterday, datetime.min.time()), 
-                                     datetime.combine(yesterday, datetime.max.time())]]
-        },
-        fields=["name"]
-    )
-    
-    # Process each session
-    for session_data in sessions:
-        session = frappe.get_doc("LMS Learning Session", session_data.name)
-        update_time_analytics(session)
-    
-    frappe.db.commit()
+    backfill_time_analytics(yesterday, yesterday)
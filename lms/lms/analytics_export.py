@@ -0,0 +1,255 @@
+"""Streaming export of learning analytics."""
+
+import csv
+import io
+
+import frappe
+from frappe import _
+from frappe.desk.doctype.notification_log.notification_log import make_notification_logs
+from frappe.utils import cint, flt
+from werkzeug.wrappers import Response
+
+from lms.lms.analytics import get_analytics_conditions
+
+EXPORT_FORMATS = {
+	"csv": "text/csv",
+	"parquet": "application/vnd.apache.parquet",
+	"arrow": "application/vnd.apache.arrow.stream",
+}
+EXPORT_CHUNK_SIZE = 2000
+# Exports with more rows than this are written to a file in the background
+MAX_STREAMED_ROWS = 5000
+
+EXPORT_FIELDS = [
+	("member", "Student"),
+	("member_name", "Student Name"),
+	("course", "Course"),
+	("course_name", "Course Name"),
+	("total_active_time", "Time Spent (seconds)"),
+	("total_hours", "Time Spent (hours)"),
+	("total_sessions", "Sessions"),
+	("days_active", "Days Active"),
+	("completion", "Completion %"),
+]
+
+
+def export_learning_analytics(student=None, course=None, from_date=None, to_date=None, file_format="csv"):
+	"""Stream the export, or queue it as a background job when it is too large for a request."""
+	if file_format not in EXPORT_FORMATS:
+		frappe.throw(_("Unsupported export format {0}").format(file_format))
+	if file_format != "csv":
+		get_pyarrow()
+
+	filters = {"student": student, "course": course, "from_date": from_date, "to_date": to_date}
+	query, values = get_export_query(**filters)
+
+	# One row past the limit tells a large export apart without counting it. Rows are read as
+	# tuples from a server-side cursor, so no list of row dicts is held in the request.
+	chunks = list(iter_export_rows(f"{query} LIMIT %(limit)s", {**values, "limit": MAX_STREAMED_ROWS + 1}))
+	if sum(len(chunk) for chunk in chunks) > MAX_STREAMED_ROWS:
+		frappe.enqueue(
+			export_analytics_to_file,
+			queue="long",
+			timeout=3600,
+			file_format=file_format,
+			**filters,
+		)
+		return {
+			"status": "queued",
+			"message": _("The export is large and is being prepared. You will be notified when it is ready."),
+		}
+
+	return stream_export(chunks, file_format)
+
+
+def get_export_query(student=None, course=None, from_date=None, to_date=None):
+	values = {"from_date": from_date or "2000-01-01", "to_date": to_date or "2099-12-31"}
+	conditions = get_analytics_conditions(values, student, course) or ["1=0"]
+
+	query = """
+        SELECT
+            t.member, t.member_name, t.course, t.course_name,
+            t.total_active_time, t.total_sessions, t.days_active,
+            COALESCE(e.progress, 0) as completion
+        FROM (
+            SELECT
+                member, MAX(member_name) as member_name,
+                course, MAX(course_name) as course_name,
+                SUM(active_time) as total_active_time,
+                SUM(sessions_count) as total_sessions,
+                COUNT(DISTINCT date) as days_active
+            FROM `tabLMS Member Course Analytics`
+            WHERE {conditions}
+            GROUP BY member, course
+        ) t
+        LEFT JOIN `tabLMS Enrollment` e ON e.member = t.member AND e.course = t.course
+        ORDER BY t.member, t.course
+    """.format(conditions=" AND ".join(conditions))
+
+	return query, values
+
+
+def iter_export_rows(query, values, chunk_size=EXPORT_CHUNK_SIZE):
+	"""Yield export rows in chunks from a server-side cursor."""
+	with frappe.db.unbuffered_cursor():
+		yield from chunk_export_rows(frappe.db.sql(query, values, as_dict=True, as_iterator=True), chunk_size)
+
+
+def chunk_export_rows(rows, chunk_size=EXPORT_CHUNK_SIZE):
+	chunk = []
+	for row in rows:
+		total_active_time = cint(row.total_active_time)
+		chunk.append(
+			(
+				row.member,
+				row.member_name,
+				row.course,
+				row.course_name,
+				total_active_time,
+				round(total_active_time / 3600, 2),
+				cint(row.total_sessions),
+				cint(row.days_active),
+				flt(row.completion),
+			)
+		)
+		if len(chunk) >= chunk_size:
+			yield chunk
+			chunk = []
+
+	if chunk:
+		yield chunk
+
+
+def write_csv(chunks):
+	buffer = io.StringIO()
+	writer = csv.writer(buffer)
+	writer.writerow([label for fieldname, label in EXPORT_FIELDS])
+
+	for chunk in chunks:
+		writer.writerows(chunk)
+		yield buffer.getvalue().encode()
+		buffer.seek(0)
+		buffer.truncate(0)
+
+	if buffer.tell():
+		yield buffer.getvalue().encode()
+
+
+def write_columnar(chunks, file_format):
+	"""Write chunks as Parquet row groups or Arrow record batches, yielding bytes as they are produced."""
+	pa = get_pyarrow()
+	schema = pa.schema(
+		[
+			("member", pa.string()),
+			("member_name", pa.string()),
+			("course", pa.string()),
+			("course_name", pa.string()),
+			("total_active_time", pa.int64()),
+			("total_hours", pa.float64()),
+			("total_sessions", pa.int64()),
+			("days_active", pa.int64()),
+			("completion", pa.float64()),
+		]
+	)
+
+	sink = ChunkSink()
+	if file_format == "parquet":
+		import pyarrow.parquet as pq
+
+		writer = pq.ParquetWriter(sink, schema)
+	else:
+		writer = pa.ipc.new_stream(sink, schema)
+
+	for chunk in chunks:
+		columns = list(zip(*chunk, strict=True))
+		writer.write_table(pa.Table.from_arrays([pa.array(c) for c in columns], schema=schema))
+		yield sink.drain()
+
+	writer.close()
+	yield sink.drain()
+
+
+def write_export(chunks, file_format):
+	if file_format == "csv":
+		return write_csv(chunks)
+	return write_columnar(chunks, file_format)
+
+
+def stream_export(chunks, file_format):
+	"""Stream chunks of rows that were read in the request. The body is written after the
+	request has released its database connection, so it must not read from the database."""
+	return Response(
+		write_export(chunks, file_format),
+		mimetype=EXPORT_FORMATS[file_format],
+		headers={"Content-Disposition": f"attachment; filename=lms_analytics.{file_format}"},
+		direct_passthrough=True,
+	)
+
+
+def export_analytics_to_file(file_format="csv", **filters):
+	"""Background job to write an export to a private file and notify the user."""
+	query, values = get_export_query(**filters)
+	file_name = f"lms_analytics_{frappe.generate_hash(length=8)}.{file_format}"
+
+	with open(frappe.get_site_path("private", "files", file_name), "wb") as f:
+		for data in write_export(iter_export_rows(query, values), file_format):
+			f.write(data)
+
+	file = frappe.get_doc(
+		{
+			"doctype": "File",
+			"file_name": file_name,
+			"file_url": f"/private/files/{file_name}",
+			"is_private": 1,
+		}
+	)
+	file.insert(ignore_permissions=True)
+
+	notification = frappe._dict(
+		{
+			"subject": _("Your learning analytics export is ready"),
+			"document_type": "File",
+			"document_name": file.name,
+			"from_user": frappe.session.user,
+			"type": "Alert",
+			"link": file.file_url,
+		}
+	)
+	make_notification_logs(notification, [frappe.session.user])
+
+
+def get_pyarrow():
+	try:
+		import pyarrow
+	except ImportError:
+		frappe.throw(_("Install pyarrow to export analytics as Parquet or Arrow"))
+
+	return pyarrow
+
+
+class ChunkSink:
+	"""A write-only file object that hands out what has been written since the last drain."""
+
+	def __init__(self):
+		self.buffer = io.BytesIO()
+		self.position = 0
+		self.closed = False
+
+	def write(self, data):
+		self.position += len(data)
+		return self.buffer.write(data)
+
+	def tell(self):
+		return self.position
+
+	def flush(self):
+		pass
+
+	def close(self):
+		self.closed = True
+
+	def drain(self):
+		data = self.buffer.getvalue()
+		self.buffer.seek(0)
+		self.buffer.truncate(0)
+		return data
@@ -0,0 +1,193 @@
+"""Incremental rollup of learning sessions into LMS Time Analytics.
+
+Each day of `LMS Time Analytics` is a pure function of the sessions that started
+on that day, so a day is always rebuilt as a whole with one grouped statement.
+A watermark on the session `modified` timestamp finds the days that changed
+since the last run.
+
+The dashboard cubes (course x day, member x course x day and lesson x day) are
+rebuilt from the same day right after it.
+"""
+
+import frappe
+from frappe.utils import add_days, add_to_date, get_datetime, getdate, now_datetime
+
+WATERMARK_KEY = "lms_time_analytics_watermark"
+DATA_AS_OF_KEY = "lms_analytics_data_as_of"
+# Sessions committed late can carry a `modified` older than the watermark
+WATERMARK_OVERLAP = 10 * 60
+
+
+def rollup_time_analytics():
+	"""Scheduled task to roll up sessions that changed since the last run."""
+	started_at = now_datetime()
+	watermark = frappe.db.get_global(WATERMARK_KEY)
+	if not watermark:
+		seed_watermark()
+		frappe.db.commit()
+		return 0
+
+	since = add_to_date(get_datetime(watermark), seconds=-WATERMARK_OVERLAP)
+
+	dates = frappe.db.sql_list(
+		"""
+        SELECT DISTINCT DATE(start_time)
+        FROM `tabLMS Learning Session`
+        WHERE modified > %s
+        AND end_time IS NOT NULL
+        """,
+		(since,),
+	)
+
+	for date in sorted(dates):
+		rebuild_time_analytics_for_date(date)
+
+	frappe.db.set_global(WATERMARK_KEY, str(started_at))
+	frappe.db.set_global(DATA_AS_OF_KEY, str(started_at))
+	frappe.db.commit()
+
+	return len(dates)
+
+
+def seed_watermark():
+	"""Start the watermark now and rebuild the days of the sessions before it in a background job."""
+	started_at = now_datetime()
+	first_date = frappe.db.sql(
+		"""
+        SELECT MIN(DATE(start_time))
+        FROM `tabLMS Learning Session`
+        WHERE end_time IS NOT NULL
+        """
+	)[0][0]
+
+	frappe.db.set_global(WATERMARK_KEY, str(started_at))
+	if first_date:
+		enqueue_backfill(first_date, getdate(started_at))
+
+
+def enqueue_backfill(from_date, to_date):
+	frappe.enqueue(
+		backfill_time_analytics,
+		queue="long",
+		timeout=3600,
+		from_date=getdate(from_date),
+		to_date=getdate(to_date),
+		job_id=f"lms:backfill_time_analytics:{getdate(from_date)}:{getdate(to_date)}",
+		deduplicate=True,
+		enqueue_after_commit=True,
+	)
+
+
+def backfill_time_analytics(from_date, to_date):
+	"""Rebuild LMS Time Analytics for every day in a date range."""
+	date = getdate(from_date)
+	to_date = getdate(to_date)
+
+	while date <= to_date:
+		rebuild_time_analytics_for_date(date)
+		date = getdate(add_days(date, 1))
+
+
+def get_data_as_of():
+	"""Get the time up to which sessions have been rolled up."""
+	return frappe.db.get_global(DATA_AS_OF_KEY)
+
+
+def rebuild_time_analytics_for_date(date):
+	"""Replace the LMS Time Analytics rows of a day with a fresh aggregate of its sessions.
+
+	Row names are derived from the grouping key, so running this twice gives the same rows.
+	"""
+	date = getdate(date)
+	next_date = getdate(add_days(date, 1))
+	timestamp = now_datetime()
+
+	frappe.db.delete("LMS Time Analytics", {"date": date})
+	frappe.db.sql(
+		"""
+        INSERT INTO `tabLMS Time Analytics` (
+            name, creation, modified, owner, modified_by, docstatus,
+            member, member_name, course, course_name,
+            chapter, chapter_name, lesson, lesson_name,
+            date, active_time, sessions_count
+        )
+        SELECT
+            MD5(CONCAT_WS('|', member, course, COALESCE(chapter, ''), COALESCE(lesson, ''), %(date)s)),
+            %(timestamp)s, %(timestamp)s, 'Administrator', 'Administrator', 0,
+            member, MAX(member_name), course, MAX(course_name),
+            COALESCE(chapter, ''), MAX(chapter_name), COALESCE(lesson, ''), MAX(lesson_name),
+            %(date)s, SUM(active_time), COUNT(*)
+        FROM `tabLMS Learning Session`
+        WHERE start_time >= %(date)s
+        AND start_time < %(next_date)s
+        AND end_time IS NOT NULL
+        GROUP BY member, course, COALESCE(chapter, ''), COALESCE(lesson, '')
+        """,
+		{"date": date, "next_date": next_date, "timestamp": timestamp},
+	)
+
+	rebuild_cubes_for_date(date, timestamp)
+	frappe.db.commit()
+
+
+def rebuild_cubes_for_date(date, timestamp):
+	"""Rebuild the dashboard cubes of a day from its LMS Time Analytics rows."""
+	values = {"date": date, "timestamp": timestamp}
+
+	frappe.db.delete("LMS Course Daily Analytics", {"date": date})
+	frappe.db.sql(
+		"""
+        INSERT INTO `tabLMS Course Daily Analytics` (
+            name, creation, modified, owner, modified_by, docstatus,
+            course, course_name, date, active_time, sessions_count, unique_students
+        )
+        SELECT
+            MD5(CONCAT_WS('|', course, %(date)s)),
+            %(timestamp)s, %(timestamp)s, 'Administrator', 'Administrator', 0,
+            course, MAX(course_name), %(date)s, SUM(active_time), SUM(sessions_count),
+            COUNT(DISTINCT member)
+        FROM `tabLMS Time Analytics`
+        WHERE date = %(date)s
+        GROUP BY course
+        """,
+		values,
+	)
+
+	frappe.db.delete("LMS Member Course Analytics", {"date": date})
+	frappe.db.sql(
+		"""
+        INSERT INTO `tabLMS Member Course Analytics` (
+            name, creation, modified, owner, modified_by, docstatus,
+            member, member_name, course, course_name, date, active_time, sessions_count
+        )
+        SELECT
+            MD5(CONCAT_WS('|', member, course, %(date)s)),
+            %(timestamp)s, %(timestamp)s, 'Administrator', 'Administrator', 0,
+            member, MAX(member_name), course, MAX(course_name), %(date)s,
+            SUM(active_time), SUM(sessions_count)
+        FROM `tabLMS Time Analytics`
+        WHERE date = %(date)s
+        GROUP BY member, course
+        """,
+		values,
+	)
+
+	frappe.db.delete("LMS Lesson Daily Analytics", {"date": date})
+	frappe.db.sql(
+		"""
+        INSERT INTO `tabLMS Lesson Daily Analytics` (
+            name, creation, modified, owner, modified_by, docstatus,
+            course, course_name, chapter, chapter_name, lesson, lesson_name,
+            date, active_time, sessions_count, unique_students
+        )
+        SELECT
+            MD5(CONCAT_WS('|', course, chapter, lesson, %(date)s)),
+            %(timestamp)s, %(timestamp)s, 'Administrator', 'Administrator', 0,
+            course, MAX(course_name), chapter, MAX(chapter_name), lesson, MAX(lesson_name),
+            %(date)s, SUM(active_time), SUM(sessions_count), COUNT(DISTINCT member)
+        FROM `tabLMS Time Analytics`
+        WHERE date = %(date)s
+        GROUP BY course, chapter, lesson
+        """,
+		values,
+	)
@@ -0,0 +1,197 @@
+"""Quiz answer keys.
+
+The answer key of a quiz is compiled from the quiz and its questions with a single query. It
+holds the quiz settings and, for every question in order, its marks, options, a bitmask of
+the correct options and the accepted answers in the normalized form they are matched in,
+so that grading and rendering a quiz do not read the question tables.
+
+Compiled keys are kept in Redis and in process memory under a version per quiz. Saving the
+quiz or one of its questions bumps the version once the change is committed, so every
+process compiles or fetches the new key on its next use at the cost of a single read. A
+version that is missing, because it was cleared or evicted, is started from the current time
+in nanoseconds, so it never matches a key that a process compiled for an earlier version.
+"""
+
+import time
+
+import frappe
+from frappe import _
+from frappe.utils import cint, cstr, flt
+
+from lms.lms.answer_matching import normalize_answer
+
+ANSWER_KEY = "lms:quiz_answer_key:{0}:{1}"
+ANSWER_KEY_VERSION = "lms:quiz_answer_key_version:{0}"
+ANSWER_KEY_TTL = 24 * 60 * 60
+OPTIONS = range(1, 5)
+
+# Compiled keys of this process by site and quiz, with the version they were compiled for
+_answer_keys = {}
+
+
+def get_answer_key(quiz):
+	version = get_answer_key_version(quiz)
+	cached = _answer_keys.get((frappe.local.site, quiz))
+	if cached and cached[0] == version:
+		return cached[1]
+
+	cache = frappe.cache()
+	key = ANSWER_KEY.format(quiz, version)
+	answer_key = cache.get_value(key)
+	if answer_key is None:
+		answer_key = build_answer_key(quiz)
+		cache.set_value(key, answer_key, expires_in_sec=ANSWER_KEY_TTL)
+
+	_answer_keys[(frappe.local.site, quiz)] = (version, answer_key)
+	return answer_key
+
+
+def get_answer_key_version(quiz):
+	cache = frappe.cache()
+	key = cache.make_key(ANSWER_KEY_VERSION.format(quiz))
+	version = cache.get(key)
+	if version is None:
+		version = cache.pipeline().set(key, time.time_ns(), nx=True).get(key).execute()[1]
+	return cint(version)
+
+
+def clear_answer_key(quiz):
+	"""Compile the answer key of the quiz again on its next use, once the transaction is committed."""
+
+	def bump():
+		cache = frappe.cache()
+		key = cache.make_key(ANSWER_KEY_VERSION.format(quiz))
+		cache.pipeline().set(key, time.time_ns(), nx=True).incr(key).execute()
+
+	frappe.db.after_commit.add(bump)
+
+
+def clear_answer_keys_for_question(question):
+	for quiz in frappe.get_all(
+		"LMS Quiz Question", {"question": question, "parenttype": "LMS Quiz"}, pluck="parent", distinct=True
+	):
+		clear_answer_key(quiz)
+
+
+def build_answer_key(quiz):
+	option_fields = ", ".join(
+		f"q.option_{num}, q.is_correct_{num}, q.explanation_{num}, q.possibility_{num}" for num in OPTIONS
+	)
+	rows = frappe.db.sql(
+		f"""
+		SELECT z.name AS quiz, z.title, z.total_marks, z.passing_percentage, z.lesson, z.course,
+			z.max_attempts, z.limit_questions_to, z.show_answers, z.show_submission_history,
+			z.enable_negative_marking, z.marks_to_cut,
+			qq.question AS question_name, qq.marks, qq.idx,
+			q.question, q.type, q.multiple, {option_fields}
+		FROM `tabLMS Quiz` z
+		LEFT JOIN `tabLMS Quiz Question` qq
+			ON qq.parent = z.name AND qq.parenttype = 'LMS Quiz' AND qq.parentfield = 'questions'
+		LEFT JOIN `tabLMS Question` q ON q.name = qq.question
+		WHERE z.name = %s
+		ORDER BY qq.idx
+		""",
+		quiz,
+		as_dict=True,
+	)
+	if not rows:
+		frappe.throw(_("Quiz {0} does not exist.").format(quiz), frappe.DoesNotExistError)
+
+	quiz_row = rows[0]
+	answer_key = frappe._dict(
+		{
+			"quiz": quiz_row.quiz,
+			"title": quiz_row.title,
+			"total_marks": cint(quiz_row.total_marks),
+			"passing_percentage": flt(quiz_row.passing_percentage),
+			"lesson": quiz_row.lesson,
+			"course": quiz_row.course,
+			"max_attempts": cint(quiz_row.max_attempts),
+			"limit_questions_to": cint(quiz_row.limit_questions_to),
+			"show_answers": cint(quiz_row.show_answers),
+			"show_submission_history": cint(quiz_row.show_submission_history),
+			"marks_to_cut": cint(quiz_row.marks_to_cut) if quiz_row.enable_negative_marking else 0,
+			"questions": {},
+		}
+	)
+
+	for row in rows:
+		if row.question_name:
+			question = compile_question(row)
+			question.idx = row.idx
+			question.marks = cint(row.marks)
+			answer_key.questions[row.question_name] = question
+
+	return answer_key
+
+
+def get_compiled_question(question):
+	"""Compiles a question on its own, for checks that are not made against a quiz."""
+	fields = ["question", "type", "multiple"]
+	for num in OPTIONS:
+		fields += [f"option_{num}", f"is_correct_{num}", f"explanation_{num}", f"possibility_{num}"]
+
+	row = frappe.db.get_value("LMS Question", question, fields, as_dict=True)
+	if not row:
+		frappe.throw(_("Question {0} does not exist.").format(question), frappe.DoesNotExistError)
+
+	return compile_question(row)
+
+
+def compile_question(row):
+	correct_mask = 0
+	for num in OPTIONS:
+		if cint(row[f"is_correct_{num}"]):
+			correct_mask |= 1 << (num - 1)
+
+	possibilities = [row[f"possibility_{num}"] for num in OPTIONS]
+	return frappe._dict(
+		{
+			"question": row.question,
+			"type": row.type,
+			"multiple": cint(row.multiple),
+			"options": [cstr(row[f"option_{num}"]) for num in OPTIONS],
+			"explanations": [row[f"explanation_{num}"] for num in OPTIONS],
+			"correct_mask": correct_mask,
+			"possibilities": possibilities,
+			"normalized_possibilities": [
+				normalize_answer(possibility) for possibility in possibilities if possibility
+			],
+		}
+	)
+
+
+def get_selected_mask(question, answers):
+	selected_mask = 0
+	for num, option in enumerate(question.options):
+		if option and option in answers:
+			selected_mask |= 1 << num
+	return selected_mask
+
+
+def get_stored_answer_mask(question, answer):
+	"""The options of a stored answer, which are joined by commas that options may contain."""
+	answer = answer or ""
+	selected_mask = 0
+	for num, option in enumerate(question.options):
+		if option and (
+			answer == option
+			or answer.startswith(option + ",")
+			or answer.endswith("," + option)
+			or f",{option}," in answer
+		):
+			selected_mask |= 1 << num
+	return selected_mask
+
+
+def get_question_fields(question):
+	"""Returns a compiled question with the fields of LMS Question, for rendering."""
+	details = frappe._dict(
+		{"question": question.question, "type": question.type, "multiple": question.multiple}
+	)
+	for idx, num in enumerate(OPTIONS):
+		details[f"option_{num}"] = question.options[idx]
+		details[f"is_correct_{num}"] = cint(question.correct_mask & (1 << idx) > 0)
+		details[f"explanation_{num}"] = question.explanations[idx]
+		details[f"possibility_{num}"] = question.possibilities[idx]
+	return details
@@ -0,0 +1,91 @@
+"""Matching of typed quiz answers.
+
+An answer to a User Input question is accepted when its `fuzz.token_sort_ratio` with one of
+the possible answers of the question is above 85. Answers and possibilities are compared in
+their normalized form, with their tokens sorted, which answer keys store for possibilities.
+
+Matchers take lists of normalized answers and possibilities and return, for every answer,
+whether it matches each possibility. The default matcher scores the whole matrix at once
+with rapidfuzz when it is installed. Its score can only be higher than the one of
+fuzzywuzzy, so pairs it rejects are rejected by fuzzywuzzy too and only the few pairs it
+accepts are confirmed with fuzzywuzzy, which keeps every decision identical. A site can set
+another matcher with the `lms_answer_matcher` site config key or hook.
+"""
+
+import frappe
+from frappe.utils import cstr
+from fuzzywuzzy import fuzz
+from fuzzywuzzy import utils as fuzz_utils
+
+try:
+	from rapidfuzz import fuzz as rapidfuzz_fuzz
+	from rapidfuzz import process as rapidfuzz_process
+except ImportError:
+	rapidfuzz_fuzz = rapidfuzz_process = None
+
+MATCH_THRESHOLD = 85
+# Scores below this can not round above the threshold, whatever the float error
+REJECT_BELOW = MATCH_THRESHOLD + 0.4
+
+
+def normalize_answer(answer):
+	"""The form `fuzz.token_sort_ratio` compares strings in."""
+	return " ".join(sorted(fuzz_utils.full_process(cstr(answer), force_ascii=True).split())).strip()
+
+
+def matches(answer, possibilities):
+	"""Whether the normalized answer matches one of the normalized possibilities."""
+	return any(match_answers([answer], possibilities)[0]) if possibilities else False
+
+
+def match_answers(answers, possibilities):
+	"""Returns a row for every normalized answer with whether it matches each possibility."""
+	if not answers or not possibilities:
+		return [[False] * len(possibilities) for answer in answers]
+
+	return get_matcher()(answers, possibilities)
+
+
+def get_matcher():
+	matcher = frappe.conf.get("lms_answer_matcher")
+	if not matcher:
+		hooks = frappe.get_hooks("lms_answer_matcher")
+		matcher = hooks[-1] if hooks else None
+
+	if matcher:
+		return frappe.get_attr(matcher)
+
+	return rapidfuzz_matcher if rapidfuzz_process else fuzzywuzzy_matcher
+
+
+def is_match(answer, possibility):
+	"""The decision of `fuzz.token_sort_ratio` for strings that are already normalized."""
+	return fuzz.ratio(possibility, answer) > MATCH_THRESHOLD
+
+
+def fuzzywuzzy_matcher(answers, possibilities):
+	return [[is_match(answer, possibility) for possibility in possibilities] for answer in answers]
+
+
+def rapidfuzz_matcher(answers, possibilities):
+	scores = rapidfuzz_process.cdist(
+		answers,
+		possibilities,
+		scorer=rapidfuzz_fuzz.ratio,
+		score_cutoff=REJECT_BELOW,
+		workers=-1,
+	)
+
+	decisions = []
+	for i, answer in enumerate(answers):
+		row = []
+		for j, possibility in enumerate(possibilities):
+			if answer == possibility:
+				row.append(True)
+			elif not answer or not possibility or not scores[i][j]:
+				row.append(False)
+			else:
+				row.append(is_match(answer, possibility))
+		decisions.append(row)
+
+	return decisions
@@ -27,8 +27,14 @@ from frappe.utils import (
 )
 from frappe.utils.response import Response
 
+from lms.lms.catalog import clear_catalog_cache
+from lms.lms.course_outline import clear_completed_lessons, clear_outline_cache
+from lms.lms.course_statistics import reconcile_course_statistics, update_lesson_count
 from lms.lms.doctype.course_lesson.course_lesson import save_progress
-from lms.lms.utils import get_average_rating, get_lesson_count, get_courses as utils_get_courses
+from lms.lms.facets import FACET_DOCTYPES, get_facets
+from lms.lms.loaders import get_user_details, prime
+from lms.lms.seats import has_seats_left
+from lms.lms.utils import get_batches, get_courses as utils_get_courses
 
 
 @frappe.whitelist()
@@ -205,9 +211,7 @@ def validate_billing_access(billing_type, name):
 			access = False
 			message = _("You are already enrolled for this batch.")
 
-		seat_count = frappe.get_cached_value("LMS Batch", name, "seat_count")
-		number_of_students = frappe.db.count("LMS Batch Enrollment", {"batch": name})
-		if seat_count <= number_of_students:
+		if not has_seats_left(name):
 			access = False
 			message = _("Batch is sold out.")
 
@@ -406,15 +410,25 @@ def get_certified_participants(filters=None, start=0, page_length=100):
 		page_length=page_length,
 	)
 
+	members = [participant.member for participant in participants]
+	certificate_counts = {}
+	if members:
+		certificate_counts = dict(
+			frappe.get_all(
+				"LMS Certificate",
+				{"member": ["in", members]},
+				["member", "count(name) as count"],
+				group_by="member",
+				as_list=True,
+			)
+		)
+
+	prime("User", members)
 	for participant in participants:
-		count = frappe.db.count("LMS Certificate", {"member": participant.member})
-		details = frappe.db.get_value(
-			"User",
-			participant.member,
-			["full_name", "user_image", "username", "country", "headline"],
-			as_dict=1,
+		details = get_user_details(
+			participant.member, ["full_name", "user_image", "username", "country", "headline"]
 		)
-		details["certificate_count"] = count
+		details["certificate_count"] = certificate_counts.get(participant.member, 0)
 		participant.update(details)
 
 	return participants
@@ -575,10 +589,14 @@ def delete_lesson(lesson, chapter):
 	chapter.save()
 
 	# Delete progress
+	clear_completed_lessons(
+		chapter.course, frappe.get_all("LMS Course Progress", {"lesson": lesson}, pluck="member")
+	)
 	frappe.db.delete("LMS Course Progress", {"lesson": lesson})
 
 	# Delete Lesson
 	frappe.db.delete("Course Lesson", lesson)
+	clear_outline_cache(chapter.course)
 
 
 @frappe.whitelist()
@@ -589,6 +607,8 @@ def update_lesson_index(lesson, sourceChapter, targetChapter, idx):
 	if not hasMoved:
 		update_target_chapter(lesson, targetChapter, idx)
 
+	clear_outline_cache(frappe.db.get_value("Course Chapter", sourceChapter, "course"))
+
 
 def update_source_chapter(lesson, chapter, idx, hasMoved=False):
 	lessons = frappe.get_all(
@@ -658,23 +678,38 @@ def update_chapter_index(chapter, course, idx):
 	for i, chapter_name in enumerate(chapters):
 		frappe.db.set_value("Chapter Reference", {"chapter": chapter_name, "parent": course}, "idx", i + 1)
 
+	clear_outline_cache(course)
+
 
 @frappe.whitelist(allow_guest=True)
 def get_categories(doctype, filters):
-	categoryOptions = []
+	if isinstance(filters, str):
+		filters = json.loads(filters)
+
+	if doctype in FACET_DOCTYPES and filters == {"published": 1}:
+		return get_facets(doctype).category
 
 	categories = frappe.get_all(
 		doctype,
 		filters,
 		pluck="category",
+		distinct=True,
 	)
-	categories = list(set(categories))
 
-	for category in categories:
-		if category:
-			categoryOptions.append({"label": category, "value": category})
+	return [{"label": category, "value": category} for category in categories if category]
+
 
-	return categoryOptions
+@frappe.whitelist(allow_guest=True)
+def get_catalog(doctype, filters=None, start=0):
+	"""Returns a page of courses or batches along with the facets of the catalog."""
+	if doctype == "LMS Course":
+		items = utils_get_courses(filters, start)
+	elif doctype == "LMS Batch":
+		items = get_batches(filters, start)
+	else:
+		frappe.throw(_("Catalog is only available for courses and batches"))
+
+	return {"items": items, "facets": get_facets(doctype)}
 
 
 @frappe.whitelist()
@@ -898,21 +933,8 @@ def get_new_gateway_fields(doctype):
 
 
 def update_course_statistics():
-	courses = frappe.get_all("LMS Course", fields=["name"])
-
-	for course in courses:
-		lessons = get_lesson_count(course.name)
-
-		enrollments = frappe.db.count("LMS Enrollment", {"course": course.name, "member_type": "Student"})
-
-		avg_rating = get_average_rating(course.name) or 0
-		avg_rating = flt(avg_rating, frappe.get_system_settings("float_precision") or 3)
-
-		frappe.db.set_value(
-			"LMS Course",
-			course.name,
-			{"lessons": lessons, "enrollments": enrollments, "rating": avg_rating},
-		)
+	if reconcile_course_statistics():
+		clear_catalog_cache()
 
 
 @frappe.whitelist()
@@ -1144,21 +1166,33 @@ def add_lesson(title, chapter, course, idx):
 		}
 	)
 	lesson_reference.insert()
+	clear_outline_cache(course)
+	update_lesson_count(course)
 
 
 @frappe.whitelist()
 def delete_chapter(chapter):
 	chapterInfo = frappe.db.get_value(
-		"Course Chapter", chapter, ["is_scorm_package", "scorm_package_path"], as_dict=True
+		"Course Chapter", chapter, ["is_scorm_package", "scorm_package_path", "course"], as_dict=True
 	)
 
 	if chapterInfo.is_scorm_package:
 		delete_scorm_package(chapterInfo.scorm_package_path)
 
+	lessons = frappe.get_all("Course Lesson", {"chapter": chapter}, pluck="name")
+	if lessons:
+		clear_completed_lessons(
+			chapterInfo.course,
+			frappe.get_all("LMS Course Progress", {"lesson": ["in", lessons]}, pluck="member"),
+		)
+		frappe.db.delete("LMS Course Progress", {"lesson": ["in", lessons]})
+
 	frappe.db.delete("Chapter Reference", {"chapter": chapter})
 	frappe.db.delete("Lesson Reference", {"parent": chapter})
 	frappe.db.delete("Course Lesson", {"chapter": chapter})
 	frappe.db.delete("Course Chapter", chapter)
+	clear_outline_cache(chapterInfo.course)
+	update_lesson_count(chapterInfo.course)
 
 
 def delete_scorm_package(scorm_package_path):
@@ -1299,10 +1333,9 @@ def get_notifications(filters):
 		order_by="creation desc",
 	)
 
+	prime("User", [notification.from_user for notification in notifications])
 	for notification in notifications:
-		from_user_details = frappe.db.get_value(
-			"User", notification.from_user, ["full_name", "user_image"], as_dict=1
-		)
+		from_user_details = get_user_details(notification.from_user, ["full_name", "user_image"])
 		notification.update(from_user_details)
 
 	return notifications
@@ -0,0 +1,173 @@
+"""Batch course enrollments.
+
+Every member of a batch is enrolled in every course of the batch. The (member, course) pairs
+that have no LMS Enrollment yet are found with one anti-join and inserted with multi-row
+inserts instead of checking and saving one pair at a time. Syncs with more pairs than a web
+request should write are left to a background job that reports its progress on the batch.
+
+Bulk inserts skip the hooks of LMS Enrollment, so the enrollment counts of the courses and
+the caches that depend on them are updated here, and the badges and program progress of the
+new enrollments are updated by queue jobs, a chunk of enrollments each.
+"""
+
+import frappe
+from frappe import _
+from frappe.utils import now
+
+from lms.lms.catalog import clear_catalog_cache
+from lms.lms.course_statistics import add_enrollments
+from lms.lms.doctype.lms_badge.lms_badge import process_badges_for_docs
+from lms.lms.doctype.lms_enrollment.lms_enrollment import update_program_progress
+from lms.lms.gradebook import clear_gradebook_cache
+
+ENROLLMENT_FIELDS = [
+	"name",
+	"creation",
+	"modified",
+	"owner",
+	"modified_by",
+	"docstatus",
+	"member",
+	"course",
+	"member_type",
+	"role",
+	"progress",
+	"member_name",
+	"member_username",
+	"member_image",
+]
+INSERT_CHUNK_SIZE = 500
+# Syncs with more missing enrollments than this run in the background
+SYNC_INLINE_LIMIT = 1000
+
+
+def get_missing_enrollments(courses, batch=None, members=None, limit=None):
+	"""Returns the (member, course) pairs, with the details of the member, that are not enrolled
+	yet. Members are the members of the batch unless they are given."""
+	if not courses or not (batch or members):
+		return []
+
+	if members:
+		source = "SELECT name AS member FROM `tabUser` WHERE name IN %(members)s"
+	else:
+		source = "SELECT DISTINCT member FROM `tabLMS Batch Enrollment` WHERE batch = %(batch)s"
+
+	return frappe.db.sql(
+		f"""
+		SELECT m.member, c.name AS course, u.full_name, u.username, u.user_image
+		FROM ({source}) m
+		JOIN `tabUser` u ON u.name = m.member
+		JOIN `tabLMS Course` c ON c.name IN %(courses)s
+		LEFT JOIN `tabLMS Enrollment` e ON e.member = m.member AND e.course = c.name
+		WHERE e.name IS NULL
+		ORDER BY m.member, c.name
+		{"LIMIT %(limit)s" if limit else ""}
+		""",
+		{"batch": batch, "members": tuple(members or ()), "courses": tuple(courses), "limit": limit},
+		as_dict=True,
+	)
+
+
+def insert_enrollments(missing):
+	"""Insert student enrollments for the (member, course) pairs."""
+	if not missing:
+		return
+
+	timestamp, user = now(), frappe.session.user
+	rows = [
+		(
+			frappe.generate_hash(length=10),
+			timestamp,
+			timestamp,
+			user,
+			user,
+			0,
+			row.member,
+			row.course,
+			"Student",
+			"Member",
+			0,
+			row.full_name,
+			row.username,
+			row.user_image,
+		)
+		for row in missing
+	]
+	frappe.db.bulk_insert("LMS Enrollment", ENROLLMENT_FIELDS, rows, chunk_size=INSERT_CHUNK_SIZE)
+
+	names = [row[0] for row in rows]
+	for start in range(0, len(names), INSERT_CHUNK_SIZE):
+		frappe.enqueue(
+			process_enrollment_hooks,
+			queue="long",
+			enrollments=names[start : start + INSERT_CHUNK_SIZE],
+			enqueue_after_commit=True,
+			now=frappe.flags.in_test,
+		)
+
+	added = {}
+	for row in missing:
+		added[row.course] = added.get(row.course, 0) + 1
+	for course, count in added.items():
+		add_enrollments(course, count)
+
+	clear_catalog_cache()
+
+
+def process_enrollment_hooks(enrollments):
+	"""Queue job to award the badges of new enrollments and update the progress of the programs
+	of their members, which the hooks of LMS Enrollment do for enrollments saved one by one."""
+	process_badges_for_docs("LMS Enrollment", enrollments)
+	for member in frappe.get_all(
+		"LMS Enrollment", {"name": ["in", enrollments]}, pluck="member", distinct=True
+	):
+		update_program_progress(member)
+
+
+def enroll_batch_members(batch, courses):
+	"""Enroll the members of the batch in the courses, in the background when there are many
+	enrollments to insert."""
+	missing = get_missing_enrollments(courses, batch=batch, limit=SYNC_INLINE_LIMIT + 1)
+	if len(missing) > SYNC_INLINE_LIMIT:
+		frappe.enqueue(
+			sync_batch_enrollments,
+			queue="long",
+			batch=batch,
+			job_id=f"lms:sync_batch_enrollments:{batch}",
+			deduplicate=True,
+			enqueue_after_commit=True,
+		)
+		frappe.msgprint(_("Members of the batch are being enrolled in its courses in the background."))
+		return
+
+	insert_enrollments(missing)
+	if missing:
+		clear_gradebook_cache(batch)
+
+
+def enroll_member(batch, member):
+	"""Enroll a new member of the batch in its courses."""
+	courses = frappe.get_all("Batch Course", {"parent": batch}, pluck="course")
+	insert_enrollments(get_missing_enrollments(courses, members=[member]))
+
+
+def sync_batch_enrollments(batch):
+	"""Background job to enroll the members of a batch in its courses, a chunk per commit."""
+	courses = frappe.get_all("Batch Course", {"parent": batch}, pluck="course")
+	missing = get_missing_enrollments(courses, batch=batch)
+	total = len(missing)
+
+	for start in range(0, total, INSERT_CHUNK_SIZE):
+		insert_enrollments(missing[start : start + INSERT_CHUNK_SIZE])
+		frappe.db.commit()
+
+		done = min(start + INSERT_CHUNK_SIZE, total)
+		frappe.publish_progress(
+			done * 100 / total,
+			title=_("Enrolling Batch Members"),
+			doctype="LMS Batch",
+			docname=batch,
+			description=_("{0} of {1} enrollments created").format(done, total),
+		)
+
+	clear_gradebook_cache(batch)
@@ -0,0 +1,355 @@
+"""Bulk enrollment.
+
+Enrolls a list of users, given by email as a JSON list or as CSV, in a course or a batch. Rows
+are validated a chunk at a time with set-based queries, valid rows are inserted with
+multi-row inserts and the confirmation emails, live class invitations and badges of batch
+members, which the skipped hooks of LMS Batch Enrollment would have handled, are sent from
+queue jobs, a few hundred members each. Rows that can not be enrolled are reported with
+their row number once every chunk has been processed.
+
+Large imports run in the background, publish their progress to the user who started them
+and keep their result in the cache for a day.
+"""
+
+import json
+
+import frappe
+from frappe import _
+from frappe.utils import cstr, now, validate_email_address
+from frappe.utils.csvutils import read_csv_content
+
+from lms.lms.batch_sync import get_missing_enrollments, insert_enrollments
+from lms.lms.catalog import clear_catalog_cache
+from lms.lms.doctype.lms_badge.lms_badge import process_badges_for_docs
+from lms.lms.doctype.lms_batch_enrollment.lms_batch_enrollment import send_confirmation_email
+from lms.lms.gradebook import clear_gradebook_cache
+from lms.lms.seats import take_seats
+
+BULK_ENROLLMENT_KEY = "lms:bulk_enrollment:{0}"
+BULK_ENROLLMENT_RESULT_TTL = 24 * 60 * 60
+CHUNK_SIZE = 1000
+# Imports with more rows than this run in the background
+INLINE_LIMIT = 500
+NOTIFICATION_CHUNK_SIZE = 200
+
+BATCH_ENROLLMENT_FIELDS = [
+	"name",
+	"creation",
+	"modified",
+	"owner",
+	"modified_by",
+	"docstatus",
+	"member",
+	"member_name",
+	"member_username",
+	"batch",
+	"confirmation_email_sent",
+]
+PARTICIPANT_FIELDS = [
+	"name",
+	"creation",
+	"modified",
+	"owner",
+	"modified_by",
+	"docstatus",
+	"parent",
+	"parenttype",
+	"parentfield",
+	"idx",
+	"reference_doctype",
+	"reference_docname",
+	"email",
+]
+
+
+@frappe.whitelist()
+def bulk_enroll(members, course=None, batch=None):
+	"""Enroll the users in the course or batch. `members` is a JSON list of emails or CSV with
+	the email in the first column."""
+	frappe.only_for(["Moderator", "Batch Evaluator"])
+	validate_target(course, batch)
+	rows = parse_members(members)
+
+	if len(rows) <= INLINE_LIMIT:
+		return enroll_members(rows, course=course, batch=batch)
+
+	job_id = frappe.generate_hash(length=10)
+	frappe.enqueue(
+		run_bulk_enrollment,
+		queue="long",
+		timeout=3600,
+		job_id=BULK_ENROLLMENT_KEY.format(job_id),
+		rows=rows,
+		course=course,
+		batch=batch,
+		result_id=job_id,
+		enqueue_after_commit=True,
+	)
+	return {"job_id": job_id, "total": len(rows)}
+
+
+@frappe.whitelist()
+def get_bulk_enrollment_result(job_id):
+	"""Returns the result of a background import, or None while it is running."""
+	frappe.only_for(["Moderator", "Batch Evaluator"])
+	return frappe.cache().get_value(BULK_ENROLLMENT_KEY.format(job_id))
+
+
+def run_bulk_enrollment(rows, course=None, batch=None, result_id=None):
+	"""Background job for large imports."""
+	result = enroll_members(rows, course=course, batch=batch, publish_progress=True)
+	frappe.cache().set_value(
+		BULK_ENROLLMENT_KEY.format(result_id), result, expires_in_sec=BULK_ENROLLMENT_RESULT_TTL
+	)
+	frappe.publish_realtime("lms_bulk_enrollment", {"job_id": result_id, **result}, user=frappe.session.user)
+
+
+def validate_target(course, batch):
+	if bool(course) == bool(batch):
+		frappe.throw(_("Please select either a course or a batch."))
+
+	if course and not frappe.db.exists("LMS Course", course):
+		frappe.throw(_("Course {0} does not exist.").format(course))
+	if batch and not frappe.db.exists("LMS Batch", batch):
+		frappe.throw(_("Batch {0} does not exist.").format(batch))
+
+
+def parse_members(members):
+	"""Returns the (row number, email) of every row. Rows are numbered from 1 as in the file."""
+	if isinstance(members, str):
+		try:
+			members = json.loads(members)
+		except ValueError:
+			members = [row[0] if row else "" for row in read_csv_content(members)]
+		else:
+			if not isinstance(members, list):
+				frappe.throw(_("Members must be a list of emails or CSV with an email in each row."))
+
+	rows = [(idx, cstr(member).strip().lower()) for idx, member in enumerate(members, 1)]
+	# A header row is not an error
+	if rows and rows[0][1] in ("email", "member", "user"):
+		rows = rows[1:]
+
+	return [(idx, email) for idx, email in rows if email]
+
+
+def enroll_members(rows, course=None, batch=None, publish_progress=False):
+	"""Enroll the members of the rows a chunk at a time. Returns the number of members enrolled
+	and the rows that were not."""
+	result = {"total": len(rows), "enrolled": 0, "errors": []}
+	seen = set()
+
+	for start in range(0, len(rows), CHUNK_SIZE):
+		chunk = []
+		for idx, email in rows[start : start + CHUNK_SIZE]:
+			if email in seen:
+				result["errors"].append(get_error(idx, email, _("Duplicate row")))
+			else:
+				seen.add(email)
+				chunk.append((idx, email))
+
+		valid, errors = validate_rows(chunk, course, batch)
+		if batch:
+			enrolled, full = enroll_in_batch(valid, batch)
+			errors += [get_error(idx, user.name, _("The batch is full.")) for idx, user in full]
+		else:
+			enrolled = enroll_in_course(valid, course)
+
+		result["enrolled"] += enrolled
+		result["errors"] += errors
+
+		if publish_progress:
+			frappe.db.commit()
+			done = min(start + CHUNK_SIZE, len(rows))
+			frappe.publish_progress(
+				done * 100 / len(rows),
+				title=_("Enrolling Members"),
+				description=_("{0} of {1} rows processed").format(done, len(rows)),
+			)
+
+	result["errors"].sort(key=lambda error: error["row"])
+	return result
+
+
+def validate_rows(rows, course, batch):
+	"""Returns the (row number, user) of the rows that can be enrolled and the errors of the rest."""
+	emails = [email for idx, email in rows]
+	users = {}
+	if emails:
+		users = {
+			user.name.lower(): user
+			for user in frappe.get_all(
+				"User",
+				{"name": ["in", emails]},
+				["name", "full_name", "username", "user_image", "enabled"],
+			)
+		}
+
+	if batch:
+		enrolled = frappe.get_all(
+			"LMS Batch Enrollment", {"batch": batch, "member": ["in", emails or [""]]}, pluck="member"
+		)
+	else:
+		enrolled = frappe.get_all(
+			"LMS Enrollment", {"course": course, "member": ["in", emails or [""]]}, pluck="member"
+		)
+	enrolled = {member.lower() for member in enrolled}
+
+	valid, errors = [], []
+	for idx, email in rows:
+		user = users.get(email)
+		if not validate_email_address(email):
+			errors.append(get_error(idx, email, _("Invalid email address")))
+		elif not user:
+			errors.append(get_error(idx, email, _("User does not exist")))
+		elif not user.enabled:
+			errors.append(get_error(idx, email, _("User is disabled")))
+		elif email in enrolled:
+			errors.append(get_error(idx, email, _("Already enrolled")))
+		else:
+			valid.append((idx, user))
+
+	return valid, errors
+
+
+def get_error(idx, email, error):
+	return {"row": idx, "member": email, "error": error}
+
+
+def enroll_in_course(rows, course):
+	insert_enrollments(
+		[
+			frappe._dict(
+				{
+					"member": user.name,
+					"course": course,
+					"full_name": user.full_name,
+					"username": user.username,
+					"user_image": user.user_image,
+				}
+			)
+			for idx, user in rows
+		]
+	)
+	return len(rows)
+
+
+def enroll_in_batch(rows, batch):
+	"""Insert the batch enrollments of the rows there are seats for, enroll them in the courses
+	of the batch and queue their notifications. Returns the number enrolled and the rows left out."""
+	seats = take_seats(batch, len(rows)) if rows else 0
+	rows, full = rows[:seats], rows[seats:]
+	if not rows:
+		return 0, full
+
+	timestamp, owner = now(), frappe.session.user
+	frappe.db.bulk_insert(
+		"LMS Batch Enrollment",
+		BATCH_ENROLLMENT_FIELDS,
+		[
+			(
+				frappe.generate_hash(length=10),
+				timestamp,
+				timestamp,
+				owner,
+				owner,
+				0,
+				user.name,
+				user.full_name,
+				user.username,
+				batch,
+				0,
+			)
+			for idx, user in rows
+		],
+	)
+
+	members = [user.name for idx, user in rows]
+	courses = frappe.get_all("Batch Course", {"parent": batch}, pluck="course")
+	insert_enrollments(get_missing_enrollments(courses, members=members))
+
+	for start in range(0, len(members), NOTIFICATION_CHUNK_SIZE):
+		frappe.enqueue(
+			send_batch_notifications,
+			queue="long",
+			batch=batch,
+			members=members[start : start + NOTIFICATION_CHUNK_SIZE],
+			enqueue_after_commit=True,
+			now=frappe.flags.in_test,
+		)
+
+	clear_gradebook_cache(batch)
+	clear_catalog_cache()
+	return len(rows), full
+
+
+def send_batch_notifications(batch, members):
+	"""Queue job to send the confirmation emails of new batch members, add them to the events
+	of the live classes of the batch and award the badges of their batch enrollments."""
+	add_members_to_live_classes(batch, members)
+
+	enrollments = frappe.get_all(
+		"LMS Batch Enrollment",
+		{"batch": batch, "member": ["in", members]},
+		["name", "member", "member_name", "batch", "confirmation_email_sent"],
+	)
+	for enrollment in enrollments:
+		enrollment.doctype = "LMS Batch Enrollment"
+		send_confirmation_email(enrollment)
+
+	process_badges_for_docs("LMS Batch Enrollment", [enrollment.name for enrollment in enrollments])
+
+
+def add_members_to_live_classes(batch, members):
+	events = frappe.get_all(
+		"LMS Live Class", {"batch_name": batch, "event": ["is", "set"]}, pluck="event", distinct=True
+	)
+	if not events:
+		return
+
+	invited = {
+		(participant.parent, participant.reference_docname)
+		for participant in frappe.get_all(
+			"Event Participants",
+			{"parent": ["in", events], "reference_doctype": "User", "reference_docname": ["in", members]},
+			["parent", "reference_docname"],
+		)
+	}
+	last_idx = dict(
+		frappe.get_all(
+			"Event Participants",
+			{"parent": ["in", events]},
+			["parent", "max(idx)"],
+			group_by="parent",
+			as_list=True,
+		)
+	)
+
+	timestamp, owner = now(), frappe.session.user
+	participants = []
+	for event in events:
+		idx = last_idx.get(event) or 0
+		for member in members:
+			if (event, member) in invited:
+				continue
+
+			idx += 1
+			participants.append(
+				(
+					frappe.generate_hash(length=10),
+					timestamp,
+					timestamp,
+					owner,
+					owner,
+					0,
+					event,
+					"Event",
+					"event_participants",
+					idx,
+					"User",
+					member,
+					member,
+				)
+			)
+
+	frappe.db.bulk_insert("Event Participants", PARTICIPANT_FIELDS, participants)
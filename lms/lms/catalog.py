@@ -0,0 +1,134 @@
+"""Catalog cards.
+
+Builds the cards of a page of courses or batches with a fixed number of queries, whatever
+the size of the page. Pages shown to guests are the same for every guest apart from the
+prices, which depend on the visitor's country, so they are cached without prices under a
+key that carries a catalog version. Any change to a course or batch, a new or removed
+enrollment and any change to the seats of a batch bumps the version once it is committed.
+"""
+
+import hashlib
+
+import frappe
+from frappe.query_builder import DocType
+from frappe.utils import cint, fmt_money, getdate
+
+CATALOG_KEY = "lms:catalog:{0}:{1}:{2}"
+CATALOG_VERSION_KEY = "lms:catalog_version"
+CATALOG_CACHE_TTL = 5 * 60
+# Saving these only changes the catalog when one of the fields changed
+CATALOG_FIELDS = {
+	"LMS Enrollment": ("member", "course"),
+	"LMS Batch Enrollment": ("member", "batch"),
+}
+
+INSTRUCTOR_FIELDS = ["name", "username", "full_name", "user_image", "first_name"]
+
+
+def get_catalog_page(page, build, **kwargs):
+	"""Returns `build(**kwargs)`, from the cache when the user is a guest."""
+	if frappe.session.user != "Guest":
+		return build(**kwargs)
+
+	cache = frappe.cache()
+	args = hashlib.md5(frappe.as_json(kwargs).encode()).hexdigest()
+	key = CATALOG_KEY.format(page, get_catalog_version(), args)
+
+	cards = cache.get_value(key)
+	if cards is None:
+		cards = build(**kwargs)
+		cache.set_value(key, cards, expires_in_sec=CATALOG_CACHE_TTL)
+
+	return cards
+
+
+def get_catalog_version():
+	cache = frappe.cache()
+	return frappe.safe_decode(cache.get(cache.make_key(CATALOG_VERSION_KEY))) or 0
+
+
+def clear_catalog_cache(doc=None, method=None):
+	if (
+		doc
+		and method == "on_update"
+		and doc.doctype in CATALOG_FIELDS
+		and not any(doc.has_value_changed(field) for field in CATALOG_FIELDS[doc.doctype])
+	):
+		return
+
+	frappe.db.after_commit.add(bump_catalog_version)
+
+
+def bump_catalog_version():
+	cache = frappe.cache()
+	cache.incr(cache.make_key(CATALOG_VERSION_KEY))
+
+
+def set_course_cards(courses):
+	instructors = get_instructors_by_parent("LMS Course", [course.name for course in courses])
+	for course in courses:
+		course.instructors = instructors.get(course.name, [])
+
+	return courses
+
+
+def set_batch_cards(batches):
+	instructors = get_instructors_by_parent("LMS Batch", [batch.name for batch in batches])
+
+	for batch in batches:
+		batch.instructors = instructors.get(batch.name, [])
+		if batch.seat_count:
+			batch.seats_left = max(batch.seat_count - cint(batch.seats_taken), 0)
+
+	return batches
+
+
+def set_course_prices(courses):
+	from lms.lms.utils import convert_prices
+
+	paid_courses = [course for course in courses if course.paid_course and course.published == 1]
+	prices = convert_prices(
+		[(course.course_price, course.currency, course.amount_usd) for course in paid_courses]
+	)
+	for course, (amount, currency) in zip(paid_courses, prices, strict=True):
+		course.amount, course.currency = amount, currency
+		course.price = fmt_money(course.amount, 0, course.currency)
+
+	return courses
+
+
+def set_batch_prices(batches):
+	from lms.lms.utils import convert_prices
+
+	paid_batches = [batch for batch in batches if batch.paid_batch and batch.start_date >= getdate()]
+	prices = convert_prices([(batch.amount, batch.currency, batch.amount_usd) for batch in paid_batches])
+	for batch, (amount, currency) in zip(paid_batches, prices, strict=True):
+		batch.amount, batch.currency = amount, currency
+		batch.price = fmt_money(batch.amount, 0, batch.currency)
+
+	return batches
+
+
+def get_instructors_by_parent(doctype, names):
+	"""Returns the instructors of every course or batch, in order, keyed by its name."""
+	if not names:
+		return {}
+
+	CourseInstructor = DocType("Course Instructor")
+	User = DocType("User")
+	rows = (
+		frappe.qb.from_(CourseInstructor)
+		.join(User)
+		.on(User.name == CourseInstructor.instructor)
+		.select(CourseInstructor.parent, *[User[field] for field in INSTRUCTOR_FIELDS])
+		.where(CourseInstructor.parenttype == doctype)
+		.where(CourseInstructor.parent.isin(names))
+		.orderby(CourseInstructor.idx)
+		.run(as_dict=True)
+	)
+
+	instructors = {}
+	for row in rows:
+		instructors.setdefault(row.pop("parent"), []).append(row)
+
+	return instructors
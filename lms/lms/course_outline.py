@@ -0,0 +1,220 @@
+"""Cached course outline.
+
+The outline of a course holds its chapters, their lessons with numbers and icons, and the
+prev/next links between lessons. It is built with a fixed number of queries and cached in
+Redis under a key that carries a per-course version. Anything that changes the outline bumps
+the version, so a stale outline is never read and simply expires. A version that is missing,
+because it was never set or was evicted, is started from the current time in nanoseconds
+rather than from 0, so it cannot lead back to an outline cached under an earlier version.
+"""
+
+import time
+
+import frappe
+from frappe.query_builder import DocType
+
+OUTLINE_KEY = "lms:course_outline:{0}:{1}"
+OUTLINE_VERSION_KEY = "lms:course_outline_version:{0}"
+OUTLINE_CACHE_TTL = 24 * 60 * 60
+
+COMPLETED_LESSONS_KEY = "lms:completed_lessons:{0}:{1}"
+COMPLETED_LESSONS_TTL = 10 * 60
+# Stored with the completed lessons, so that a set that was loaded but is empty can be told
+# apart from one that was only written to after it had expired
+LOADED_MARKER = ""
+
+LESSON_FIELDS = [
+	"name",
+	"title",
+	"include_in_preview",
+	"creation",
+	"youtube",
+	"quiz_id",
+	"question",
+	"file_type",
+	"instructor_notes",
+	"course",
+]
+
+
+def get_outline(course):
+	"""Returns the cached outline of the course. Callers must not modify it."""
+	cache = frappe.cache()
+	key = OUTLINE_KEY.format(course, get_outline_version(course))
+
+	outline = cache.get_value(key)
+	if outline is None:
+		outline = build_outline(course)
+		cache.set_value(key, outline, expires_in_sec=OUTLINE_CACHE_TTL)
+
+	return outline
+
+
+def get_outline_version(course):
+	cache = frappe.cache()
+	key = cache.make_key(OUTLINE_VERSION_KEY.format(course))
+	version = cache.get(key)
+	if version is None:
+		version = cache.pipeline().set(key, time.time_ns(), nx=True).get(key).execute()[1]
+	return frappe.safe_decode(version)
+
+
+def clear_outline_cache(course):
+	if not course:
+		return
+
+	cache = frappe.cache()
+	key = cache.make_key(OUTLINE_VERSION_KEY.format(course))
+	cache.pipeline().set(key, time.time_ns(), nx=True).incr(key).execute()
+
+
+def clear_outline_cache_for_doc(doc, method=None):
+	"""Hook for documents that are part of a course outline."""
+	if doc.doctype == "LMS Course":
+		course = doc.name
+	elif doc.doctype in ("Course Chapter", "Course Lesson"):
+		course = doc.course
+	else:
+		return
+
+	clear_outline_cache(course)
+
+
+def build_outline(course):
+	from lms.lms.utils import get_lesson_icon
+
+	ChapterReference = DocType("Chapter Reference")
+	Chapter = DocType("Course Chapter")
+	chapters = (
+		frappe.qb.from_(ChapterReference)
+		.join(Chapter)
+		.on(Chapter.name == ChapterReference.chapter)
+		.select(
+			ChapterReference.idx,
+			Chapter.name,
+			Chapter.title,
+			Chapter.is_scorm_package,
+			Chapter.launch_file,
+			Chapter.scorm_package,
+		)
+		.where(ChapterReference.parent == course)
+		.orderby(ChapterReference.idx)
+		.run(as_dict=True)
+	)
+
+	lessons = []
+	if chapters:
+		LessonReference = DocType("Lesson Reference")
+		Lesson = DocType("Course Lesson")
+		lessons = (
+			frappe.qb.from_(LessonReference)
+			.join(Lesson)
+			.on(Lesson.name == LessonReference.lesson)
+			.select(
+				LessonReference.parent.as_("reference_parent"),
+				LessonReference.idx.as_("reference_idx"),
+				*[Lesson[field] for field in LESSON_FIELDS],
+				Lesson.body.as_("icon_body"),
+				Lesson.content.as_("icon_content"),
+			)
+			.where(LessonReference.parent.isin([chapter.name for chapter in chapters]))
+			.orderby(LessonReference.idx)
+			.run(as_dict=True)
+		)
+
+	scorm_packages = {}
+	package_names = [chapter.scorm_package for chapter in chapters if chapter.is_scorm_package]
+	if package_names:
+		packages = frappe.get_all(
+			"File", {"name": ["in", package_names]}, ["name", "file_name", "file_size", "file_url"]
+		)
+		scorm_packages = {package.name: package for package in packages}
+
+	lessons_by_chapter = {}
+	for lesson in lessons:
+		lessons_by_chapter.setdefault(lesson.pop("reference_parent"), []).append(lesson)
+
+	numbers = []
+	lesson_index = {}
+	for chapter in chapters:
+		chapter.lessons = lessons_by_chapter.get(chapter.name, [])
+		for lesson in chapter.lessons:
+			idx = lesson.pop("reference_idx")
+			lesson.number = f"{chapter.idx}.{idx}"
+			# Only the icon is kept of the lesson's body and content
+			lesson.icon = get_lesson_icon(lesson.pop("icon_body"), lesson.pop("icon_content"))
+			numbers.append((chapter.idx, idx))
+			lesson_index.setdefault(lesson.name, f"{chapter.idx}-{idx}")
+
+		if chapter.is_scorm_package:
+			chapter.scorm_package = scorm_packages.get(chapter.scorm_package)
+
+	numbers = [f"{chapter}.{lesson}" for chapter, lesson in sorted(numbers)]
+	neighbours = {
+		number: {
+			"prev": numbers[i - 1] if i > 0 else None,
+			"next": numbers[i + 1] if i + 1 < len(numbers) else None,
+		}
+		for i, number in enumerate(numbers)
+	}
+
+	return frappe._dict(
+		{
+			"chapters": chapters,
+			"lesson_count": len(numbers),
+			"lesson_index": lesson_index,
+			"neighbours": neighbours,
+		}
+	)
+
+
+def get_completed_lessons(course, member=None):
+	"""Returns the set of lessons of the course the member has completed."""
+	member = member or frappe.session.user
+	cache = frappe.cache()
+	key = get_completed_lessons_key(course, member)
+
+	pipe = cache.pipeline(transaction=False)
+	pipe.smembers(key)
+	lessons = {frappe.safe_decode(lesson) for lesson in pipe.execute()[0]}
+	if LOADED_MARKER in lessons:
+		lessons.discard(LOADED_MARKER)
+		return lessons
+
+	lessons = set(
+		frappe.get_all(
+			"LMS Course Progress",
+			{"course": course, "member": member, "status": "Complete"},
+			pluck="lesson",
+		)
+	)
+
+	pipe = cache.pipeline()
+	pipe.sadd(key, LOADED_MARKER, *lessons)
+	pipe.expire(key, COMPLETED_LESSONS_TTL)
+	pipe.execute()
+
+	return lessons
+
+
+def set_lesson_completion(course, lesson, member, is_complete):
+	"""Keep the cached completed lessons of a member in step with a progress write."""
+	cache = frappe.cache()
+	key = get_completed_lessons_key(course, member)
+
+	if is_complete:
+		# Without the loaded marker the set is reloaded from the database on the next read
+		cache.pipeline().sadd(key, lesson).expire(key, COMPLETED_LESSONS_TTL).execute()
+	else:
+		cache.pipeline().srem(key, lesson).execute()
+
+
+def clear_completed_lessons(course, members):
+	"""Reload the completed lessons of the members in the course once the transaction is committed."""
+	keys = [COMPLETED_LESSONS_KEY.format(member, course) for member in set(members)]
+	if keys:
+		frappe.db.after_commit.add(lambda: frappe.cache().delete_value(keys))
+
+
+def get_completed_lessons_key(course, member):
+	return frappe.cache().make_key(COMPLETED_LESSONS_KEY.format(member, course))
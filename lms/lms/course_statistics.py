@@ -0,0 +1,133 @@
+"""Course statistics.
+
+The `lessons`, `enrollments` and `rating` of a course are kept up to date from the hooks of
+the documents they are counted from. Enrollments are counted with atomic increments, while
+the lesson count and the rating of a single course are recomputed with one query each, as
+rows can move between chapters and ratings can change. An hourly job reconciles every course
+with grouped queries and only writes the ones that drifted.
+"""
+
+import frappe
+from frappe.utils import cint, flt
+
+from lms.lms.utils import get_rating_scale
+
+
+def update_enrollment_count(doc, method=None):
+	"""Hook to count the student enrollments of a course."""
+	deltas = {}
+	if method == "after_insert":
+		deltas[doc.course] = is_counted(doc)
+	elif method == "on_trash":
+		deltas[doc.course] = -is_counted(doc)
+	else:
+		before = doc.get_doc_before_save()
+		if not before:
+			# Inserts are counted in after_insert
+			return
+		deltas[before.course] = -is_counted(before)
+		deltas[doc.course] = deltas.get(doc.course, 0) + is_counted(doc)
+
+	for course, delta in deltas.items():
+		add_enrollments(course, delta)
+
+
+def add_enrollments(course, delta):
+	if course and delta:
+		frappe.db.sql(
+			"""UPDATE `tabLMS Course`
+			SET enrollments = GREATEST(enrollments + %s, 0)
+			WHERE name = %s""",
+			(delta, course),
+		)
+
+
+def is_counted(enrollment):
+	return 1 if enrollment.member_type == "Student" else 0
+
+
+def update_lesson_count_for_doc(doc, method=None):
+	"""Hook for courses, to count their lessons again when their chapters change. Chapter and
+	lesson references are saved through their parents, whose hooks are the ones that run."""
+	before = doc.get_doc_before_save()
+	if before and [row.chapter for row in before.chapters] == [row.chapter for row in doc.chapters]:
+		return
+
+	update_lesson_count(doc.name)
+
+
+def update_lesson_count(course):
+	if not course:
+		return
+
+	lessons = frappe.db.sql(
+		"""
+		SELECT COUNT(*)
+		FROM `tabChapter Reference` cr
+		JOIN `tabLesson Reference` lr ON lr.parent = cr.chapter
+		WHERE cr.parent = %s
+		""",
+		course,
+	)[0][0]
+	frappe.db.set_value("LMS Course", course, "lessons", lessons, update_modified=False)
+
+
+def update_rating_for_doc(doc, method=None):
+	"""Hook for course reviews."""
+	update_rating(doc.course)
+
+
+def update_rating(course):
+	if not course:
+		return
+
+	average = frappe.db.sql("SELECT AVG(rating) FROM `tabLMS Course Review` WHERE course = %s", course)[0][0]
+	frappe.db.set_value("LMS Course", course, "rating", get_course_rating(average), update_modified=False)
+
+
+def get_course_rating(average):
+	"""Converts the average of the stored ratings, which are fractions of 1, to the rating scale."""
+	return flt(flt(average) * get_rating_scale(), frappe.get_system_settings("float_precision") or 3)
+
+
+def reconcile_course_statistics():
+	"""Recount the statistics of every course with grouped queries and write those that differ.
+	Returns the number of courses that were corrected."""
+	lessons = dict(
+		frappe.db.sql(
+			"""
+			SELECT cr.parent, COUNT(*)
+			FROM `tabChapter Reference` cr
+			JOIN `tabLesson Reference` lr ON lr.parent = cr.chapter
+			GROUP BY cr.parent
+			"""
+		)
+	)
+	enrollments = dict(
+		frappe.db.sql(
+			"""
+			SELECT course, COUNT(*)
+			FROM `tabLMS Enrollment`
+			WHERE member_type = 'Student'
+			GROUP BY course
+			"""
+		)
+	)
+	ratings = dict(frappe.db.sql("SELECT course, AVG(rating) FROM `tabLMS Course Review` GROUP BY course"))
+
+	corrected = 0
+	for course in frappe.get_all("LMS Course", fields=["name", "lessons", "enrollments", "rating"]):
+		values = {
+			"lessons": cint(lessons.get(course.name)),
+			"enrollments": cint(enrollments.get(course.name)),
+			"rating": get_course_rating(ratings.get(course.name)),
+		}
+		if (
+			cint(course.lessons) != values["lessons"]
+			or cint(course.enrollments) != values["enrollments"]
+			or flt(course.rating) != values["rating"]
+		):
+			frappe.db.set_value("LMS Course", course.name, values, update_modified=False)
+			corrected += 1
+
+	return corrected
@@ -4,14 +4,14 @@
 import frappe
 from frappe.model.document import Document
 
-from lms.lms.api import update_course_statistics
+from lms.lms.course_statistics import update_lesson_count
 from lms.lms.utils import get_course_progress
 
 
 class CourseChapter(Document):
 	def on_update(self):
 		self.recalculate_course_progress()
-		update_course_statistics()
+		update_lesson_count(self.course)
 
 	def recalculate_course_progress(self):
 		previous_lessons = self.get_doc_before_save() and self.get_doc_before_save().as_dict().lessons
@@ -9,6 +9,7 @@ from frappe.model.document import Document
 from frappe.realtime import get_website_room
 from frappe.utils.telemetry import capture
 
+from lms.lms.course_outline import set_lesson_completion
 from lms.lms.utils import get_course_progress
 
 from ...md import find_macros
@@ -101,6 +102,7 @@ def save_progress(lesson, course, scorm_details=None):
 				"scorm_content": "" if scorm_details.is_complete else scorm_details.scorm_content,
 			},
 		)
+		set_lesson_completion(course, lesson, frappe.session.user, scorm_details.is_complete)
 
 	progress = get_course_progress(course)
 	capture_progress_for_analytics(progress, course)
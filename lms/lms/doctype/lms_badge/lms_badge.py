@@ -87,3 +87,21 @@ def process_badges(doc, state):
 		"LMS Badge", doc.doctype, dict(reference_doctype=doc.doctype, enabled=1)
 	):
 		frappe.get_doc("LMS Badge", d.get("name")).apply(doc)
+
+
+def process_badges_for_docs(doctype, names):
+	"""Applies the badges of the doctype to documents that were inserted in bulk, without the
+	hooks that would have applied them."""
+	badges = [
+		frappe.get_doc("LMS Badge", d.get("name"))
+		for d in frappe.cache_manager.get_doctype_map(
+			"LMS Badge", doctype, dict(reference_doctype=doctype, enabled=1)
+		)
+	]
+	if not badges:
+		return
+
+	for name in names:
+		doc = frappe.get_doc(doctype, name)
+		for badge in badges:
+			badge.apply(doc)
@@ -11,6 +11,7 @@ from frappe import _
 from frappe.model.document import Document
 from frappe.utils import add_days, cint, format_datetime, get_time, nowdate
 
+from lms.lms.batch_sync import enroll_batch_members
 from lms.lms.utils import (
 	generate_slug,
 	get_assignment_details,
@@ -83,21 +84,22 @@ class LMSBatch(Document):
 			frappe.throw(_("Evaluation end date cannot be less than the batch end date."))
 
 	def validate_membership(self):
-		members = frappe.get_all("LMS Batch Enrollment", {"batch": self.name}, pluck="member")
-		for course in self.courses:
-			for member in members:
-				if not frappe.db.exists("LMS Enrollment", {"course": course.course, "member": member}):
-					enrollment = frappe.new_doc("LMS Enrollment")
-					enrollment.course = course.course
-					enrollment.member = member
-					enrollment.save()
+		if not self.is_new():
+			enroll_batch_members(self.name, [row.course for row in self.courses])
 
 	def validate_seats_left(self):
 		if cint(self.seat_count) < 0:
 			frappe.throw(_("Seat count cannot be negative."))
 
-		students = frappe.db.count("LMS Batch Enrollment", {"batch": self.name})
-		if cint(self.seat_count) and cint(self.seat_count) < students:
+		# Seats are taken outside of this document, so the counter is read under a row lock
+		# and never written back from a stale copy
+		self.seats_taken = 0
+		if not self.is_new():
+			self.seats_taken = cint(
+				frappe.db.get_value("LMS Batch", self.name, "seats_taken", for_update=True)
+			)
+
+		if cint(self.seat_count) and cint(self.seat_count) < self.seats_taken:
 			frappe.throw(_("There are no seats available in this batch."))
 
 	def validate_timetable(self):
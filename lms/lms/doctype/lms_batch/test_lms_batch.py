@@ -1,9 +1,162 @@
 # Copyright (c) 2022, Frappe and Contributors
 # See license.txt
 
-# import frappe
-from frappe.tests import UnitTestCase
+import threading
+
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+from frappe.utils import add_days, nowdate
+
+from lms.lms.doctype.lms_course.test_lms_course import new_course, new_user
+from lms.lms.seats import take_seat
 
 
 class TestLMSBatch(UnitTestCase):
 	pass
+
+
+class TestLMSBatchSeats(IntegrationTestCase):
+	def setUp(self):
+		self.batch = frappe.get_doc(
+			{
+				"doctype": "LMS Batch",
+				"title": "Test Seat Inventory",
+				"start_date": add_days(nowdate(), 10),
+				"end_date": add_days(nowdate(), 20),
+				"start_time": "10:00:00",
+				"end_time": "12:00:00",
+				"timezone": "Asia/Kolkata",
+				"description": "Test Seat Inventory",
+				"batch_details": "Test Seat Inventory",
+				"seat_count": 5,
+				"instructors": [{"instructor": "Administrator"}],
+			}
+		).insert()
+		# Seats are taken from other connections, which only see committed rows
+		frappe.db.commit()
+
+	def tearDown(self):
+		frappe.delete_doc("LMS Batch", self.batch.name, force=True)
+		frappe.db.commit()
+
+	def test_concurrent_seats_are_not_oversold(self):
+		site = frappe.local.site
+		results = []
+
+		def take():
+			frappe.init(site=site)
+			frappe.connect()
+			try:
+				results.append(take_seat(self.batch.name))
+				frappe.db.commit()
+			finally:
+				frappe.destroy()
+
+		threads = [threading.Thread(target=take) for i in range(25)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+
+		self.assertEqual(results.count(True), 5)
+		self.assertEqual(frappe.db.get_value("LMS Batch", self.batch.name, "seats_taken"), 5)
+
+
+class TestLMSBatchEnrollmentSync(IntegrationTestCase):
+	def setUp(self):
+		self.courses = [new_course(f"Test Batch Sync Course {num}").name for num in (1, 2)]
+		self.members = [new_user("Test", f"batch_sync_{num}@test.com").name for num in range(3)]
+		self.batch = frappe.get_doc(
+			{
+				"doctype": "LMS Batch",
+				"title": "Test Batch Sync",
+				"start_date": add_days(nowdate(), 10),
+				"end_date": add_days(nowdate(), 20),
+				"start_time": "10:00:00",
+				"end_time": "12:00:00",
+				"timezone": "Asia/Kolkata",
+				"description": "Test Batch Sync",
+				"batch_details": "Test Batch Sync",
+				"instructors": [{"instructor": "Administrator"}],
+				"courses": [{"course": self.courses[0]}],
+			}
+		).insert()
+
+		for member in self.members:
+			frappe.get_doc(
+				{"doctype": "LMS Batch Enrollment", "batch": self.batch.name, "member": member}
+			).insert()
+
+		# Already enrolled in the course that is added to the batch
+		frappe.get_doc(
+			{"doctype": "LMS Enrollment", "member": self.members[0], "course": self.courses[1]}
+		).insert()
+
+	def tearDown(self):
+		frappe.db.delete("LMS Enrollment", {"course": ["in", self.courses]})
+		frappe.db.delete("LMS Batch Enrollment", {"batch": self.batch.name})
+		frappe.delete_doc("LMS Batch", self.batch.name, force=True)
+		for course in self.courses:
+			frappe.delete_doc("LMS Course", course, force=True)
+
+	def get_enrolled(self, course):
+		return sorted(frappe.get_all("LMS Enrollment", {"course": course}, pluck="member"))
+
+	def test_members_are_enrolled_in_their_batch_courses(self):
+		self.assertEqual(self.get_enrolled(self.courses[0]), sorted(self.members))
+		self.assertEqual(frappe.db.get_value("LMS Course", self.courses[0], "enrollments"), 3)
+
+	def test_added_course_enrolls_only_missing_members(self):
+		self.assertEqual(self.get_enrolled(self.courses[1]), [self.members[0]])
+		self.assertEqual(frappe.db.get_value("LMS Course", self.courses[1], "enrollments"), 1)
+
+		self.batch.append("courses", {"course": self.courses[1]})
+		self.batch.save()
+
+		self.assertEqual(self.get_enrolled(self.courses[1]), sorted(self.members))
+		self.assertEqual(frappe.db.get_value("LMS Course", self.courses[1], "enrollments"), 3)
+
+	def test_synced_enrollments_run_enrollment_hooks(self):
+		badge = frappe.get_doc(
+			{
+				"doctype": "LMS Badge",
+				"title": "Test Batch Sync Badge",
+				"description": "Test Batch Sync Badge",
+				"image": "/assets/lms/images/course-home.png",
+				"reference_doctype": "LMS Enrollment",
+				"event": "New",
+				"condition": f"doc.course == '{self.courses[1]}'",
+				"user_field": "member",
+				"grant_only_once": 1,
+				"enabled": 1,
+			}
+		).insert()
+		frappe.cache_manager.clear_doctype_map("LMS Badge", "LMS Enrollment")
+		program = frappe.get_doc(
+			{
+				"doctype": "LMS Program",
+				"title": "Test Batch Sync Program",
+				"program_courses": [{"course": course} for course in self.courses],
+				"program_members": [{"member": self.members[1]}],
+			}
+		).insert()
+		frappe.db.set_value(
+			"LMS Enrollment", {"member": self.members[1], "course": self.courses[0]}, "progress", 100
+		)
+
+		try:
+			self.batch.append("courses", {"course": self.courses[1]})
+			self.batch.save()
+
+			self.assertEqual(
+				sorted(frappe.get_all("LMS Badge Assignment", {"badge": badge.name}, pluck="member")),
+				sorted(self.members[1:]),
+			)
+			self.assertEqual(
+				frappe.db.get_value("LMS Program Member", {"parent": program.name}, "progress"), 50
+			)
+		finally:
+			frappe.db.delete("LMS Badge Assignment", {"badge": badge.name})
+			frappe.delete_doc("LMS Badge", badge.name, force=True)
+			frappe.cache_manager.clear_doctype_map("LMS Badge", "LMS Enrollment")
+			frappe.delete_doc("LMS Program", program.name, force=True)
@@ -8,11 +8,23 @@ from frappe import _
 from frappe.email.doctype.email_template.email_template import get_email_template
 from frappe.model.document import Document
 
+from lms.lms.batch_sync import enroll_member
+from lms.lms.gradebook import clear_gradebook_cache
+from lms.lms.seats import claim_seat, release_seat
+
 
 class LMSBatchEnrollment(Document):
+	def before_insert(self):
+		claim_seat(self.batch, self.member)
+
 	def after_insert(self):
 		send_confirmation_email(self)
 		self.add_member_to_live_class()
+		clear_gradebook_cache(self.batch)
+
+	def on_trash(self):
+		release_seat(self.batch)
+		clear_gradebook_cache(self.batch)
 
 	def validate(self):
 		self.validate_duplicate_members()
@@ -26,17 +38,7 @@ class LMSBatchEnrollment(Document):
 			frappe.throw(_("Member already enrolled in this batch"))
 
 	def validate_course_enrollment(self):
-		courses = frappe.get_all("Batch Course", filters={"parent": self.batch}, fields=["course"])
-
-		for course in courses:
-			if not frappe.db.exists(
-				"LMS Enrollment",
-				{"course": course.course, "member": self.member},
-			):
-				enrollment = frappe.new_doc("LMS Enrollment")
-				enrollment.course = course.course
-				enrollment.member = self.member
-				enrollment.save()
+		enroll_member(self.batch, self.member)
 
 	def add_member_to_live_class(self):
 		live_classes = frappe.get_all("LMS Live Class", {"batch_name": self.batch}, ["name", "event"])
@@ -0,0 +1,13 @@
+# Copyright (c) 2026, Frappe and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class LMSCourseDailyAnalytics(Document):
+	"""Learning time per course and day, rebuilt by the analytics rollup."""
+
+
+def on_doctype_update():
+	frappe.db.add_index("LMS Course Daily Analytics", ["course", "date"])
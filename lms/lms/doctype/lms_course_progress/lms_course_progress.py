@@ -4,11 +4,18 @@
 import frappe
 from frappe.model.document import Document
 
+from lms.lms.course_outline import set_lesson_completion
 from lms.lms.doctype.lms_enrollment.lms_enrollment import update_program_progress
 from lms.lms.utils import get_course_progress
 
 
 class LMSCourseProgress(Document):
+	def on_update(self):
+		set_lesson_completion(self.course, self.lesson, self.member, self.status == "Complete")
+
+	def on_trash(self):
+		set_lesson_completion(self.course, self.lesson, self.member, False)
+
 	def after_delete(self):
 		progress = get_course_progress(self.course, self.member)
 		membership = frappe.db.get_value(
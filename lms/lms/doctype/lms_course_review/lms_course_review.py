@@ -5,6 +5,8 @@ import frappe
 from frappe.model.document import Document
 from frappe.utils import cint
 
+from lms.lms.utils import get_rating_scale
+
 
 class LMSCourseReview(Document):
 	def validate(self):
@@ -17,12 +19,12 @@ class LMSCourseReview(Document):
 
 @frappe.whitelist()
 def submit_review(rating, review, course):
-	out_of_ratings = frappe.db.get_all(
-		"DocField", {"parent": "LMS Course Review", "fieldtype": "Rating"}, ["options"]
-	)
-	out_of_ratings = (len(out_of_ratings) and out_of_ratings[0].options) or 5
-	rating = cint(rating) / out_of_ratings
+	rating = cint(rating) / get_rating_scale()
 	frappe.get_doc(
 		{"doctype": "LMS Course Review", "rating": rating, "review": review, "course": course}
 	).save(ignore_permissions=True)
 	return "OK"
+
+
+def on_doctype_update():
+	frappe.db.add_index("LMS Course Review", ["course", "rating"])
@@ -104,3 +104,7 @@ def update_current_membership(batch, course, member):
 	current_membership = frappe.get_all("LMS Enrollment", {"batch_old": batch, "member": member})
 	if len(current_membership):
 		frappe.db.set_value("LMS Enrollment", current_membership[0].name, "is_current", 1)
+
+
+def on_doctype_update():
+	frappe.db.add_index("LMS Enrollment", ["member", "course"])
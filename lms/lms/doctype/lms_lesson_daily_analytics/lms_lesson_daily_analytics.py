@@ -0,0 +1,13 @@
+# Copyright (c) 2026, Frappe and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class LMSLessonDailyAnalytics(Document):
+	"""Learning time per lesson and day, rebuilt by the analytics rollup."""
+
+
+def on_doctype_update():
+	frappe.db.add_index("LMS Lesson Daily Analytics", ["course", "date"])
@@ -0,0 +1,14 @@
+# Copyright (c) 2026, Frappe and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class LMSMemberCourseAnalytics(Document):
+	"""Learning time per member, course and day, rebuilt by the analytics rollup."""
+
+
+def on_doctype_update():
+	frappe.db.add_index("LMS Member Course Analytics", ["course", "date"])
+	frappe.db.add_index("LMS Member Course Analytics", ["member", "date"])
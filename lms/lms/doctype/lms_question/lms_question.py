@@ -5,6 +5,7 @@ import frappe
 from frappe import _
 from frappe.model.document import Document
 
+from lms.lms.answer_key import clear_answer_keys_for_question
 from lms.lms.utils import has_course_instructor_role, has_course_moderator_role
 
 
@@ -77,6 +78,8 @@ def update_question_title(question):
 		for row in question_rows:
 			frappe.db.set_value("LMS Quiz Question", row, "question_detail", question.question)
 
+		clear_answer_keys_for_question(question.name)
+
 
 def get_correct_options(question):
 	correct_options = []
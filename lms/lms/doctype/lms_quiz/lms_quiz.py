@@ -11,8 +11,15 @@ from frappe.core.doctype.file.utils import get_random_filename
 from frappe.model.document import Document
 from frappe.utils import cint, comma_and, cstr
 from frappe.utils.file_manager import safe_b64decode
-from fuzzywuzzy import fuzz
 
+from lms.lms.answer_key import (
+	clear_answer_key,
+	get_answer_key,
+	get_compiled_question,
+	get_selected_mask,
+	get_stored_answer_mask,
+)
+from lms.lms.answer_matching import matches, normalize_answer
 from lms.lms.doctype.course_lesson.course_lesson import save_progress
 from lms.lms.utils import (
 	generate_slug,
@@ -68,6 +75,9 @@ class LMSQuiz(Document):
 			else:
 				self.show_answers = 0
 
+	def on_update(self):
+		clear_answer_key(self.name)
+
 	def autoname(self):
 		if not self.name:
 			self.name = generate_slug(self.title, "LMS Quiz")
@@ -99,74 +109,123 @@ def set_total_marks(questions):
 
 @frappe.whitelist()
 def quiz_summary(quiz, results):
+	"""Grades an attempt sent as results, with the selected options joined by commas. Whether
+	they are correct is not taken from the results: the answers are graded by `submit_quiz`."""
 	results = results and json.loads(results)
-	percentage = 0
-
-	quiz_details = frappe.db.get_value(
-		"LMS Quiz",
-		quiz,
-		[
-			"name",
-			"total_marks",
-			"passing_percentage",
-			"lesson",
-			"course",
-			"enable_negative_marking",
-			"marks_to_cut",
-		],
-		as_dict=1,
-	)
+	answer_key = get_answer_key(quiz)
+	answers = []
+
+	for result in results or []:
+		question = answer_key.questions.get(result.get("question_name"))
+		answer = result.get("answer")
+		if question and question.type == "Choices":
+			selected_mask = get_stored_answer_mask(question, cstr(answer))
+			answer = [option for num, option in enumerate(question.options) if selected_mask & (1 << num)]
+		answers.append({"question_name": result.get("question_name"), "answer": answer})
+
+	return submit_quiz(quiz, answers)
+
+
+@frappe.whitelist()
+def submit_quiz(quiz, answers):
+	"""Grades the answer sheet of an attempt against the answer key of the quiz and creates
+	the submission. `answers` is a list of the question and the selected options or the
+	answer typed for it."""
+	answers = json.loads(answers) if isinstance(answers, str) else answers
+	answer_key = get_answer_key(quiz)
+	results = []
+
+	for question_name, answer in get_answer_sheet(answer_key, answers).items():
+		question = answer_key.questions[question_name]
+		if question.type == "Choices":
+			answer = answer if isinstance(answer, list) else [answer]
+			results.append(
+				{
+					"question_name": question_name,
+					"answer": ",".join(cstr(option) for option in answer),
+					"is_correct": grade_choices(question, answer),
+				}
+			)
+			continue
+
+		answer = cstr(answer[0] if isinstance(answer, list) and answer else answer)
+		if question.type == "User Input":
+			results.append(
+				{
+					"question_name": question_name,
+					"answer": answer,
+					"is_correct": grade_input(question, answer),
+				}
+			)
+		else:
+			results.append({"question_name": question_name, "answer": answer})
+
+	return submit_results(answer_key, results)
+
+
+def get_answer_sheet(answer_key, answers):
+	"""Returns the answer to each question of the quiz by question. Answers to questions that
+	are not in the quiz are ignored, and a question answered twice is rejected, so that the
+	score of an attempt cannot exceed the total marks."""
+	answer_sheet = {}
+	for row in answers or []:
+		question_name = row.get("question_name")
+		if question_name not in answer_key.questions:
+			continue
+		if question_name in answer_sheet:
+			frappe.throw(_("Question {0} has been answered more than once.").format(question_name))
+		answer_sheet[question_name] = row.get("answer")
+
+	limit = cint(answer_key.get("limit_questions_to"))
+	if limit and len(answer_sheet) > limit:
+		frappe.throw(_("This quiz can only be answered for {0} questions.").format(limit))
+
+	return answer_sheet
+
 
-	data = process_results(results, quiz_details)
+def submit_results(answer_key, results):
+	data = process_results(results, answer_key)
 	results = data["results"]
 	score = data["score"]
 	is_open_ended = data["is_open_ended"]
 
-	score_out_of = quiz_details.total_marks
+	score_out_of = answer_key.total_marks
 	percentage = (score / score_out_of) * 100 if score_out_of else 0
-	submission = create_submission(quiz, results, score_out_of, quiz_details.passing_percentage)
+	submission = create_submission(answer_key.quiz, results, score_out_of, answer_key.passing_percentage)
 
-	save_progress_after_quiz(quiz_details, percentage)
+	save_progress_after_quiz(answer_key, percentage)
 
 	return {
 		"score": score,
 		"score_out_of": score_out_of,
 		"submission": submission.name,
-		"pass": percentage == quiz_details.passing_percentage,
+		"pass": percentage >= answer_key.passing_percentage,
 		"percentage": percentage,
 		"is_open_ended": is_open_ended,
 	}
 
 
-def process_results(results, quiz_details):
+def get_key_question(answer_key, question_name):
+	question = answer_key.questions.get(question_name)
+	if not question:
+		frappe.throw(_("Question {0} is not part of this quiz.").format(question_name))
+	return question
+
+
+def process_results(results, answer_key):
 	score = 0
 	is_open_ended = False
 
 	for result in results:
-		question_details = frappe.db.get_value(
-			"LMS Quiz Question",
-			{"parent": quiz_details.name, "question": result["question_name"]},
-			["question", "marks", "question_detail", "type"],
-			as_dict=1,
-		)
-
-		result["question_name"] = question_details.question
-		result["question"] = question_details.question_detail
-		result["marks_out_of"] = question_details.marks
+		question = get_key_question(answer_key, result["question_name"])
+		result["question"] = question.question
+		result["marks_out_of"] = question.marks
 
-		if question_details.type != "Open Ended":
-			if len(result["is_correct"]) > 0:
-				correct = result["is_correct"][0]
-				for point in result["is_correct"]:
-					correct = correct and point
-				result["is_correct"] = correct
+		if question.type != "Open Ended":
+			if result["is_correct"]:
+				marks = question.marks
 			else:
-				result["is_correct"] = 0
-
-			if correct:
-				marks = question_details.marks
-			else:
-				marks = -quiz_details.marks_to_cut if quiz_details.enable_negative_marking else 0
+				marks = -answer_key.marks_to_cut
 
 			result["marks"] = marks
 			score += marks
@@ -185,6 +244,16 @@ def process_results(results, quiz_details):
 	}
 
 
+def grade_choices(question, answers):
+	"""An answer is correct when options are selected and all of them are correct."""
+	selected_mask = get_selected_mask(question, answers)
+	return cint(selected_mask and not selected_mask & ~question.correct_mask)
+
+
+def grade_input(question, answer):
+	return cint(matches(normalize_answer(answer), question.normalized_possibilities))
+
+
 def _save_file(match):
 	data = match.group(1).split("data:")[1]
 	headers, content = data.split(",")
@@ -269,8 +338,14 @@ def get_question_details(question):
 
 
 @frappe.whitelist()
-def check_answer(question, type, answers):
+def check_answer(question, type, answers, quiz=None):
 	answers = json.loads(answers)
+	# Questions of a quiz are checked against its answer key
+	if quiz:
+		question = get_key_question(get_answer_key(quiz), question)
+	else:
+		question = get_compiled_question(question)
+
 	if type == "Choices":
 		return check_choice_answers(question, answers)
 	else:
@@ -278,18 +353,15 @@ def check_answer(question, type, answers):
 
 
 def check_choice_answers(question, answers):
-	fields = ["multiple"]
+	"""Returns, for every option, whether it was selected and correct, or 2 when a correct
+	option was not selected."""
+	selected_mask = get_selected_mask(question, answers)
 	is_correct = []
-	for num in range(1, 5):
-		fields.append(f"option_{cstr(num)}")
-		fields.append(f"is_correct_{cstr(num)}")
-
-	question_details = frappe.db.get_value("LMS Question", question, fields, as_dict=1)
-
-	for num in range(1, 5):
-		if question_details[f"option_{num}"] in answers:
-			is_correct.append(question_details[f"is_correct_{num}"])
-		elif question_details[f"is_correct_{num}"]:
+	for num in range(4):
+		correct = question.correct_mask & (1 << num)
+		if selected_mask & (1 << num):
+			is_correct.append(1 if correct else 0)
+		elif correct:
 			is_correct.append(2)
 		else:
 			is_correct.append(0)
@@ -298,14 +370,4 @@ def check_choice_answers(question, answers):
 
 
 def check_input_answers(question, answer):
-	fields = []
-	for num in range(1, 5):
-		fields.append(f"possibility_{cstr(num)}")
-
-	question_details = frappe.db.get_value("LMS Question", question, fields, as_dict=1)
-	for num in range(1, 5):
-		current_possibility = question_details[f"possibility_{num}"]
-		if current_possibility and fuzz.token_sort_ratio(current_possibility, answer) > 85:
-			return 1
-
-	return 0
+	return grade_input(question, answer)
@@ -2,10 +2,15 @@
 # See license.txt
 
 # import frappe
+import json
 import unittest
 
 import frappe
 
+from lms.lms.answer_key import build_answer_key
+from lms.lms.doctype.lms_quiz.lms_quiz import quiz_summary, submit_quiz
+from lms.lms.regrade import regrade_quiz_submissions
+
 
 class TestLMSQuiz(unittest.TestCase):
 	@classmethod
@@ -39,7 +44,81 @@ class TestLMSQuiz(unittest.TestCase):
 		question.type = "User Input"
 		self.assertRaises(frappe.ValidationError, question.save)
 
+	def test_submit_quiz(self):
+		choice = frappe.get_doc(
+			{
+				"doctype": "LMS Question",
+				"question": "Question Grading Choice",
+				"type": "Choices",
+				"option_1": "Yes",
+				"is_correct_1": 1,
+				"option_2": "No",
+			}
+		).save()
+		text = frappe.get_doc(
+			{
+				"doctype": "LMS Question",
+				"question": "Question Grading Input",
+				"type": "User Input",
+				"possibility_1": "Paris",
+			}
+		).save()
+
+		quiz = frappe.get_doc("LMS Quiz", "test-quiz")
+		quiz.append("questions", {"question": choice.name, "marks": 2})
+		quiz.append("questions", {"question": text.name, "marks": 3})
+		quiz.save()
+
+		result = submit_quiz(
+			quiz.name,
+			[
+				{"question_name": choice.name, "answer": ["No"]},
+				{"question_name": text.name, "answer": "paris"},
+			],
+		)
+		self.assertEqual(result["score"], 3)
+		self.assertEqual(result["score_out_of"], 5)
+		self.assertEqual(frappe.db.get_value("LMS Quiz Submission", result["submission"], "score"), 3)
+
+		# Results that claim to be correct are graded on the server all the same
+		summary = quiz_summary(
+			quiz.name,
+			json.dumps(
+				[
+					{"question_name": choice.name, "answer": "No", "is_correct": [1]},
+					{"question_name": text.name, "answer": "paris", "is_correct": [1]},
+				]
+			),
+		)
+		self.assertEqual(summary["score"], 3)
+
+		# A question cannot be scored more than once, and questions of other quizzes are ignored
+		self.assertRaises(
+			frappe.ValidationError,
+			submit_quiz,
+			quiz.name,
+			[
+				{"question_name": text.name, "answer": "paris"},
+				{"question_name": text.name, "answer": "paris"},
+			],
+		)
+		partial = submit_quiz(
+			quiz.name,
+			[
+				{"question_name": text.name, "answer": "paris"},
+				{"question_name": "not-a-question", "answer": "paris"},
+			],
+		)
+		self.assertEqual(partial["score"], 3)
+
+		# The submission is graded again once the correct option is fixed
+		frappe.db.set_value("LMS Question", choice.name, {"is_correct_1": 0, "is_correct_2": 1})
+		regrade_quiz_submissions(quiz.name, answer_key=build_answer_key(quiz.name))
+		self.assertEqual(frappe.db.get_value("LMS Quiz Submission", result["submission"], "score"), 5)
+
 	@classmethod
 	def tearDownClass(cls) -> None:
+		frappe.db.delete("LMS Quiz Submission", {"quiz": "test-quiz"})
+		frappe.db.delete("LMS Quiz Question", {"parent": "test-quiz"})
 		frappe.db.delete("LMS Quiz", "test-quiz")
 		frappe.db.delete("LMS Question")
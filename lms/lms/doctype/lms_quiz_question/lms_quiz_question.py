@@ -4,6 +4,11 @@
 # import frappe
 from frappe.model.document import Document
 
+from lms.lms.answer_key import clear_answer_key
+
 
 class LMSQuizQuestion(Document):
-	pass
+	def on_trash(self):
+		# Rows deleted on their own do not save the quiz, so its answer key is not cleared on update
+		if self.parenttype == "LMS Quiz":
+			clear_answer_key(self.parent)
@@ -73,3 +73,7 @@ class LMSQuizSubmission(Document):
 
 class MaximumAttemptsExceededError(frappe.DuplicateEntryError):
 	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("LMS Quiz Submission", ["quiz", "modified"])
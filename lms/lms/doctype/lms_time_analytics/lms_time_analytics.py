@@ -53,3 +53,7 @@ class LMSTimeAnalytics(Document):
             "days_active": 0,
             "unique_students": 0
         }
+
+
+def on_doctype_update():
+    frappe.db.add_index("LMS Time Analytics", ["course", "date"])
@@ -0,0 +1,143 @@
+"""Currency exchange rates.
+
+Rates are fetched by a scheduled job from a rate provider and stored in a Redis hash, with a
+copy in the database that survives a cache flush. Requests read them through a short-lived
+in-process cache and never call the provider, so a slow or failing upstream only means that
+the last known rates are used.
+
+The provider is a function that takes a list of source currencies and a target currency and
+returns a dict of source currency to rate. It can be replaced with the
+`lms_exchange_rate_provider` hook or site config key, e.g. with `fixture_provider`, which
+reads the rates from the `lms_exchange_rates` site config key and works offline.
+"""
+
+import json
+import time
+
+import frappe
+import requests
+from frappe.utils import flt
+
+RATES_KEY = "lms:exchange_rates:{0}"
+LAST_KNOWN_RATES_KEY = "lms_exchange_rates_{0}"
+REFRESH_JOB_ID = "lms_refresh_exchange_rates"
+TARGET_CURRENCY = "USD"
+PROCESS_CACHE_TTL = 5 * 60
+PROVIDER_TIMEOUT = 10
+
+DEFAULT_PROVIDER = "lms.lms.exchange_rates.frankfurter_provider"
+
+# (site, target) -> (expires at, rates)
+_rates_cache = {}
+
+
+def get_exchange_rate(source, target=TARGET_CURRENCY):
+	"""Returns the last known rate to convert the source currency into the target, or None."""
+	if source == target:
+		return 1
+	return get_exchange_rates(target).get(source)
+
+
+def get_exchange_rates(target=TARGET_CURRENCY):
+	"""Returns a dict of source currency to the rate that converts it into the target currency."""
+	key = (frappe.local.site, target)
+	cached = _rates_cache.get(key)
+	if cached and cached[0] > time.monotonic():
+		return cached[1]
+
+	rates = load_rates(target)
+	_rates_cache[key] = (time.monotonic() + PROCESS_CACHE_TTL, rates)
+	return rates
+
+
+def load_rates(target):
+	rates = frappe.cache().hgetall(RATES_KEY.format(target))
+	if rates:
+		return rates
+
+	rates = get_last_known_rates(target)
+	if rates:
+		write_rates_to_cache(target, rates)
+	else:
+		# Nothing has been fetched yet, get the rates in the background instead of waiting here
+		frappe.enqueue(refresh_exchange_rates, job_id=REFRESH_JOB_ID, deduplicate=True)
+
+	return rates
+
+
+def refresh_exchange_rates():
+	"""Scheduled job to fetch the rates of every currency that a course or batch is priced in."""
+	sources = [currency for currency in get_price_currencies() if currency != TARGET_CURRENCY]
+	if not sources:
+		return
+
+	rates = get_last_known_rates(TARGET_CURRENCY)
+	try:
+		fetched = get_provider()(sources, TARGET_CURRENCY)
+	except Exception:
+		frappe.log_error(title="Exchange rates could not be refreshed")
+		fetched = {}
+
+	rates.update({currency: flt(rate) for currency, rate in fetched.items() if flt(rate) > 0})
+	if not rates:
+		return
+
+	frappe.db.set_global(LAST_KNOWN_RATES_KEY.format(TARGET_CURRENCY), json.dumps(rates))
+	frappe.db.commit()
+	write_rates_to_cache(TARGET_CURRENCY, rates)
+	_rates_cache.pop((frappe.local.site, TARGET_CURRENCY), None)
+
+
+def get_price_currencies():
+	currencies = set(
+		frappe.get_all("LMS Course", {"paid_course": 1}, pluck="currency", distinct=True)
+		+ frappe.get_all("LMS Course", {"paid_certificate": 1}, pluck="currency", distinct=True)
+		+ frappe.get_all("LMS Batch", {"paid_batch": 1}, pluck="currency", distinct=True)
+	)
+	return sorted(currency for currency in currencies if currency)
+
+
+def get_last_known_rates(target):
+	rates = frappe.db.get_global(LAST_KNOWN_RATES_KEY.format(target))
+	return json.loads(rates) if rates else {}
+
+
+def write_rates_to_cache(target, rates):
+	cache = frappe.cache()
+	key = RATES_KEY.format(target)
+	cache.delete_value(key)
+	for currency, rate in rates.items():
+		cache.hset(key, currency, rate)
+
+
+def get_provider():
+	provider = frappe.conf.get("lms_exchange_rate_provider")
+	if not provider:
+		hooks = frappe.get_hooks("lms_exchange_rate_provider")
+		provider = hooks[-1] if hooks else DEFAULT_PROVIDER
+
+	return frappe.get_attr(provider)
+
+
+def frankfurter_provider(sources, target):
+	rates = {}
+	for source in sources:
+		try:
+			response = requests.get(
+				"https://api.frankfurter.app/latest",
+				params={"from": source, "to": target},
+				timeout=PROVIDER_TIMEOUT,
+			)
+			response.raise_for_status()
+			rates[source] = response.json()["rates"][target]
+		except Exception:
+			# Keep the last known rate of this currency and carry on with the others
+			frappe.log_error(title=f"Exchange rate for {source} could not be fetched")
+
+	return rates
+
+
+def fixture_provider(sources, target):
+	"""Reads the rates into USD from the `lms_exchange_rates` site config key."""
+	rates = frappe.conf.get("lms_exchange_rates") or {}
+	return {source: rates[source] for source in sources if source in rates}
@@ -0,0 +1,173 @@
+"""Catalog facets.
+
+Counts of published courses and batches per category, tag, price type, certification and
+upcoming status, kept in a Redis hash per doctype. Saving or deleting a course or batch
+applies the difference between its old and new facets once the transaction is committed,
+and the counts are rebuilt from grouped queries when the hash is missing and every night.
+"""
+
+import frappe
+from frappe.utils import cint, getdate
+
+FACETS_KEY = "lms:catalog_facets:{0}"
+FACETS_TTL = 2 * 24 * 60 * 60
+
+FACET_DOCTYPES = ("LMS Course", "LMS Batch")
+
+
+def get_facets(doctype):
+	"""Returns the facet counts of the published documents of a doctype."""
+	counts = get_facet_counts(doctype)
+	facets = frappe._dict({"category": [], "tags": [], "price": {"paid": 0, "free": 0}})
+	facets.certification = counts.pop("certification", 0)
+	facets.upcoming = counts.pop("upcoming", 0)
+
+	for facet, count in sorted(counts.items()):
+		if count <= 0:
+			continue
+
+		kind, value = facet.split(":", 1)
+		if kind == "category":
+			facets.category.append({"label": value, "value": value, "count": count})
+		elif kind == "tag":
+			facets.tags.append({"label": value, "value": value, "count": count})
+		elif kind == "price":
+			facets.price[value] = count
+
+	return facets
+
+
+def get_facet_counts(doctype):
+	cache = frappe.cache()
+	key = cache.make_key(FACETS_KEY.format(doctype))
+
+	counts = cache.pipeline(transaction=False).hgetall(key).execute()[0]
+	if not counts:
+		return rebuild_facets(doctype)
+
+	return {frappe.safe_decode(facet): cint(count) for facet, count in counts.items() if facet != b"_"}
+
+
+def get_doc_facets(doc):
+	"""Returns the facets a document counts towards, none when it is not published."""
+	if not doc or not doc.get("published"):
+		return []
+
+	facets = []
+	if doc.get("category"):
+		facets.append(f"category:{doc.category}")
+
+	if doc.doctype == "LMS Course":
+		facets += [f"tag:{tag}" for tag in get_tags(doc.tags)]
+		paid, certification, upcoming = doc.paid_course, doc.enable_certification, doc.upcoming
+	else:
+		paid, certification = doc.paid_batch, doc.certification
+		upcoming = doc.start_date and getdate(doc.start_date) >= getdate()
+
+	facets.append("price:paid" if paid else "price:free")
+	if certification:
+		facets.append("certification")
+	if upcoming:
+		facets.append("upcoming")
+
+	return facets
+
+
+def get_tags(tags):
+	return {tag.strip() for tag in (tags or "").split(",") if tag.strip()}
+
+
+def update_facets(doc, method=None):
+	"""Hook to apply the change in the facets of a course or batch to the counts."""
+	if doc.doctype not in FACET_DOCTYPES:
+		return
+
+	if method == "on_trash":
+		old, new = get_doc_facets(doc), []
+	else:
+		old, new = get_doc_facets(doc.get_doc_before_save()), get_doc_facets(doc)
+
+	deltas = {}
+	for facet in old:
+		deltas[facet] = deltas.get(facet, 0) - 1
+	for facet in new:
+		deltas[facet] = deltas.get(facet, 0) + 1
+	deltas = {facet: delta for facet, delta in deltas.items() if delta}
+	if not deltas:
+		return
+
+	doctype = doc.doctype
+
+	def apply():
+		cache = frappe.cache()
+		key = cache.make_key(FACETS_KEY.format(doctype))
+		if not cache.pipeline(transaction=False).exists(key).execute()[0]:
+			# Counts are rebuilt as a whole on the next read
+			return
+
+		pipe = cache.pipeline()
+		for facet, delta in deltas.items():
+			pipe.hincrby(key, facet, delta)
+		pipe.execute()
+
+	frappe.db.after_commit.add(apply)
+
+
+def rebuild_all_facets():
+	"""Scheduled job to correct any drift and move batches that have started out of upcoming."""
+	for doctype in FACET_DOCTYPES:
+		rebuild_facets(doctype)
+
+
+def rebuild_facets(doctype):
+	"""Recount the facets of a doctype with grouped queries and replace the cached counts."""
+	counts = {}
+	values = {"today": getdate()}
+
+	categories = frappe.db.sql(
+		f"""
+		SELECT category, COUNT(*)
+		FROM `tab{doctype}`
+		WHERE published = 1 AND IFNULL(category, '') != ''
+		GROUP BY category
+		"""
+	)
+	for category, count in categories:
+		counts[f"category:{category}"] = count
+
+	if doctype == "LMS Course":
+		paid, certification, upcoming = "paid_course = 1", "enable_certification = 1", "upcoming = 1"
+		# Tags are a comma separated list, so only the courses that have some are read
+		for tags in frappe.get_all(doctype, {"published": 1, "tags": ["is", "set"]}, pluck="tags"):
+			for tag in get_tags(tags):
+				counts[f"tag:{tag}"] = counts.get(f"tag:{tag}", 0) + 1
+	else:
+		paid, certification, upcoming = "paid_batch = 1", "certification = 1", "start_date >= %(today)s"
+
+	total, paid_count, certification_count, upcoming_count = frappe.db.sql(
+		f"""
+		SELECT COUNT(*), SUM({paid}), SUM({certification}), SUM({upcoming})
+		FROM `tab{doctype}`
+		WHERE published = 1
+		""",
+		values,
+	)[0]
+	counts.update(
+		{
+			"price:paid": cint(paid_count),
+			"price:free": cint(total) - cint(paid_count),
+			"certification": cint(certification_count),
+			"upcoming": cint(upcoming_count),
+		}
+	)
+
+	cache = frappe.cache()
+	key = cache.make_key(FACETS_KEY.format(doctype))
+	pipe = cache.pipeline()
+	pipe.delete(key)
+	# A placeholder keeps the hash in place when nothing is published
+	pipe.hset(key, mapping={"_": 0, **counts})
+	pipe.expire(key, FACETS_TTL)
+	pipe.execute()
+
+	return counts
@@ -0,0 +1,138 @@
+"""Offline GeoIP lookup.
+
+Resolves an IP address to a country from a local database, without a network call. The
+database is set with the `lms_geoip_database` site config key, relative to the site folder,
+and defaults to `private/geoip/country.mmdb`. It can be either
+
+- a MaxMind style `.mmdb` file, read through a memory map when `maxminddb` is installed, or
+- a CSV of IP ranges with rows of `start_ip,end_ip,country_code`, e.g. the DB-IP lite
+  country database, which is loaded once into sorted arrays and searched with bisect.
+
+Lookups are cached per IP, so the workers have to be restarted after the database is
+replaced. Without a database every lookup returns None.
+"""
+
+import csv
+import ipaddress
+import os
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+
+import frappe
+
+DEFAULT_DATABASE = "private/geoip/country.mmdb"
+COUNTRY_NAMES_KEY = "lms:country_names"
+
+# path -> reader, None when the database can not be read
+_databases = {}
+
+
+def get_country(ip):
+	"""Returns the name of the Country doctype record of the IP address, or None."""
+	code = get_country_code(ip)
+	if not code:
+		return None
+
+	return get_country_names().get(code.lower())
+
+
+def get_country_code(ip):
+	"""Returns the ISO country code of the IP address, or None."""
+	if not ip:
+		return None
+	return lookup(get_database_path(), ip)
+
+
+@lru_cache(maxsize=8192)
+def lookup(path, ip):
+	reader = get_database(path)
+	if not reader:
+		return None
+
+	try:
+		return reader.get_country_code(ip)
+	except ValueError:
+		# Not a valid IP address
+		return None
+
+
+def get_database_path():
+	return os.path.abspath(frappe.get_site_path(frappe.conf.get("lms_geoip_database") or DEFAULT_DATABASE))
+
+
+def get_database(path):
+	if path not in _databases:
+		_databases[path] = open_database(path)
+	return _databases[path]
+
+
+def open_database(path):
+	if not os.path.exists(path):
+		return None
+
+	if path.endswith(".mmdb"):
+		try:
+			import maxminddb
+		except ImportError:
+			frappe.log_error(title="Install maxminddb to read the GeoIP database")
+			return None
+
+		return MMDBReader(maxminddb.open_database(path, maxminddb.MODE_MMAP))
+
+	return RangeReader(path)
+
+
+def get_country_names():
+	"""Returns a dict of lowercase country code to the name of the Country record."""
+
+	def generator():
+		countries = frappe.get_all("Country", fields=["name", "code"])
+		return {country.code.lower(): country.name for country in countries if country.code}
+
+	return frappe.cache().get_value(COUNTRY_NAMES_KEY, generator=generator)
+
+
+class MMDBReader:
+	def __init__(self, reader):
+		self.reader = reader
+
+	def get_country_code(self, ip):
+		record = self.reader.get(ip) or {}
+		country = record.get("country") or record.get("registered_country") or {}
+		return country.get("iso_code")
+
+
+class RangeReader:
+	"""Sorted IP ranges with their country codes, one set of arrays per IP version."""
+
+	def __init__(self, path):
+		ranges = {4: [], 6: []}
+		with open(path, newline="") as f:
+			for row in csv.reader(f):
+				if len(row) < 3:
+					continue
+				try:
+					start, end = ipaddress.ip_address(row[0].strip()), ipaddress.ip_address(row[1].strip())
+				except ValueError:
+					# Header or comment
+					continue
+				ranges[start.version].append((int(start), int(end), row[2].strip().upper()))
+
+		self.tables = {}
+		for version, rows in ranges.items():
+			rows.sort()
+			# IPv4 addresses fit in compact unsigned arrays, IPv6 ones need Python ints
+			starts = array("L", (row[0] for row in rows)) if version == 4 else [row[0] for row in rows]
+			ends = array("L", (row[1] for row in rows)) if version == 4 else [row[1] for row in rows]
+			self.tables[version] = (starts, ends, [row[2] for row in rows])
+
+	def get_country_code(self, ip):
+		address = ipaddress.ip_address(ip)
+		starts, ends, codes = self.tables[address.version]
+		value = int(address)
+
+		index = bisect_right(starts, value) - 1
+		if index >= 0 and value <= ends[index]:
+			return codes[index] or None
+		return None
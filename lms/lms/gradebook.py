@@ -0,0 +1,233 @@
+"""Batch gradebook.
+
+Builds the student x course/assessment matrix of a batch with a fixed number of set-based
+queries. Large batches are served from a short-lived cached snapshot.
+"""
+
+import frappe
+from frappe.utils import cint, flt, format_datetime
+
+from lms.lms.loaders import get_user_details, prime
+
+GRADEBOOK_KEY = "lms:batch_gradebook:{0}"
+GRADEBOOK_CACHE_TTL = 5 * 60
+# Smaller batches are cheap enough to build on every request
+GRADEBOOK_CACHE_THRESHOLD = 100
+
+SUBMISSION_DOCTYPES = {
+	"LMS Quiz": ("LMS Quiz Submission", "quiz"),
+	"LMS Assignment": ("LMS Assignment Submission", "assignment"),
+	"LMS Programming Exercise": ("LMS Programming Exercise Submission", "exercise"),
+}
+
+
+def get_gradebook(batch, start=0, page_length=None):
+	"""Returns the students of the batch with their course and assessment progress, best first."""
+	cache = frappe.cache()
+	key = GRADEBOOK_KEY.format(batch)
+
+	students = cache.get_value(key)
+	if students is None:
+		students = build_gradebook(batch)
+		if len(students) >= GRADEBOOK_CACHE_THRESHOLD:
+			cache.set_value(key, students, expires_in_sec=GRADEBOOK_CACHE_TTL)
+
+	start = cint(start)
+	if page_length:
+		return students[start : start + cint(page_length)]
+	return students[start:]
+
+
+def clear_gradebook_cache(batch):
+	frappe.cache().delete_value(GRADEBOOK_KEY.format(batch))
+
+
+def clear_gradebook_cache_for_batch(doc, method=None):
+	"""Hook for batches and the courses and assessments that are their columns. The rows of
+	those tables are also deleted on their own, without saving the batch."""
+	batch = doc.name if doc.doctype == "LMS Batch" else doc.parent
+	if batch:
+		frappe.db.after_commit.add(lambda: clear_gradebook_cache(batch))
+
+
+def clear_gradebook_cache_for_doc(doc, method=None):
+	"""Hook for the progress and submissions of members that gradebooks are built from."""
+	if doc.doctype == "LMS Enrollment" and method == "on_update" and not doc.has_value_changed("progress"):
+		return
+
+	if doc.doctype in ("LMS Enrollment", "LMS Course Progress"):
+		batches = frappe.db.sql_list(
+			"""
+			SELECT DISTINCT be.batch
+			FROM `tabLMS Batch Enrollment` be
+			JOIN `tabBatch Course` bc ON bc.parent = be.batch AND bc.parenttype = 'LMS Batch'
+			WHERE be.member = %s AND bc.course = %s
+			""",
+			(doc.member, doc.course),
+		)
+	else:
+		assessment_type, docfield = next(
+			(assessment_type, docfield)
+			for assessment_type, (doctype, docfield) in SUBMISSION_DOCTYPES.items()
+			if doctype == doc.doctype
+		)
+		batches = frappe.db.sql_list(
+			"""
+			SELECT DISTINCT be.batch
+			FROM `tabLMS Batch Enrollment` be
+			JOIN `tabLMS Assessment` a ON a.parent = be.batch AND a.parenttype = 'LMS Batch'
+			WHERE be.member = %s AND a.assessment_type = %s AND a.assessment_name = %s
+			""",
+			(doc.member, assessment_type, doc.get(docfield)),
+		)
+
+	if batches:
+		keys = [GRADEBOOK_KEY.format(batch) for batch in batches]
+		frappe.db.after_commit.add(lambda: frappe.cache().delete_value(keys))
+
+
+def build_gradebook(batch):
+	enrollments = frappe.get_all("LMS Batch Enrollment", {"batch": batch}, ["member", "name"])
+	if not enrollments:
+		return []
+
+	members = [enrollment.member for enrollment in enrollments]
+	batch_courses = frappe.get_all("Batch Course", {"parent": batch}, ["course", "title"])
+	assessments = frappe.get_all(
+		"LMS Assessment",
+		filters={"parent": batch},
+		fields=["name", "assessment_type", "assessment_name"],
+	)
+
+	course_progress = get_course_progress(members, [course.course for course in batch_courses])
+	assessment_details = get_assessment_details(assessments)
+	submissions = get_submissions(members, assessments, assessment_details)
+
+	prime("User", members)
+	students = []
+	for enrollment in enrollments:
+		detail = get_user_details(
+			enrollment.member, ["full_name", "email", "username", "last_active", "user_image"]
+		)
+		detail.last_active = format_datetime(detail.last_active, "dd MMM YY")
+		detail.name = enrollment.name
+		detail.courses = frappe._dict()
+		detail.assessments = frappe._dict()
+		courses_completed = 0
+		assessments_completed = 0
+
+		for course in batch_courses:
+			progress = course_progress.get((enrollment.member, course.course))
+			detail.courses[course.title] = progress
+			if progress == 100:
+				courses_completed += 1
+
+		for assessment in assessments:
+			key = (assessment.assessment_type, assessment.assessment_name)
+			title = assessment_details.get(key, {}).get("title")
+			assessment_info = submissions.get((key, enrollment.member)) or get_not_attempted(
+				assessment.assessment_type
+			)
+			detail.assessments[title] = assessment_info
+			if assessment_info.result == "Pass":
+				assessments_completed += 1
+
+		detail.courses_completed = courses_completed
+		detail.assessments_completed = assessments_completed
+		total = len(batch_courses) + len(assessments)
+		detail.progress = flt(((courses_completed + assessments_completed) / total * 100), 2) if total else 0
+		students.append(detail)
+
+	return sorted(students, key=lambda x: x.progress, reverse=True)
+
+
+def get_course_progress(members, courses):
+	if not courses:
+		return {}
+
+	enrollments = frappe.get_all(
+		"LMS Enrollment",
+		{"member": ["in", members], "course": ["in", courses]},
+		["member", "course", "progress"],
+	)
+	return {(enrollment.member, enrollment.course): enrollment.progress for enrollment in enrollments}
+
+
+def get_assessment_details(assessments):
+	"""Returns titles, and passing percentages for quizzes, keyed by (type, name)."""
+	details = {}
+	names_by_type = {}
+	for assessment in assessments:
+		names_by_type.setdefault(assessment.assessment_type, []).append(assessment.assessment_name)
+
+	for doctype, names in names_by_type.items():
+		fields = ["name", "title"]
+		if doctype == "LMS Quiz":
+			fields.append("passing_percentage")
+
+		for row in frappe.get_all(doctype, {"name": ["in", names]}, fields):
+			details[(doctype, row.name)] = row
+
+	return details
+
+
+def get_submissions(members, assessments, assessment_details):
+	"""Returns the submission that counts for every (assessment, member): the best quiz attempt
+	and the latest assignment or programming exercise submission."""
+	submissions = {}
+	names_by_type = {}
+	for assessment in assessments:
+		names_by_type.setdefault(assessment.assessment_type, []).append(assessment.assessment_name)
+
+	for assessment_type, names in names_by_type.items():
+		if assessment_type not in SUBMISSION_DOCTYPES:
+			continue
+
+		doctype, docfield = SUBMISSION_DOCTYPES[assessment_type]
+		if assessment_type == "LMS Quiz":
+			fields, order_by = ["percentage"], "percentage desc"
+		else:
+			fields, order_by = ["status"], "creation desc"
+
+		rows = frappe.get_all(
+			doctype,
+			{docfield: ["in", names], "member": ["in", members]},
+			["name", "member", docfield, *fields],
+			order_by=order_by,
+		)
+
+		for row in rows:
+			key = ((assessment_type, row[docfield]), row.member)
+			if key in submissions:
+				continue
+
+			if assessment_type == "LMS Quiz":
+				passing_percentage = assessment_details.get(key[0], {}).get("passing_percentage")
+				status = row.percentage
+				result = "Pass" if row.percentage >= cint(passing_percentage) else "Failed"
+			elif assessment_type == "LMS Programming Exercise":
+				status = row.status
+				result = "Pass" if row.status == "Passed" else "Failed"
+			else:
+				status = result = row.status
+
+			submissions[key] = frappe._dict(
+				{
+					"status": status,
+					"result": result,
+					"assessment": row[docfield],
+					"type": assessment_type,
+					"submission": row.name,
+				}
+			)
+
+	return submissions
+
+
+def get_not_attempted(assessment_type):
+	return frappe._dict(
+		{
+			"status": 0 if assessment_type == "LMS Quiz" else "Not Attempted",
+			"result": "Failed",
+		}
+	)
@@ -0,0 +1,287 @@
+"""Buffered ingestion of learning heartbeats.
+
+Heartbeats are appended to a Redis list on the request path and written to
+`LMS Learning Heartbeat` in bulk by a scheduled flush job. Running active and
+idle counters are kept per session as the heartbeats arrive.
+"""
+
+import json
+
+import frappe
+from frappe import _
+from frappe.utils import cint, get_datetime, now, now_datetime, time_diff_in_seconds
+
+BUFFER_KEY = "lms:learning_heartbeat_buffer"
+SESSION_META_KEY = "lms:learning_session_meta:{0}"
+FLUSH_STATS_KEY = "lms:learning_heartbeat_flush_stats"
+FLUSH_LOCK_KEY = "lms:learning_heartbeat_flush_lock"
+SESSION_COUNTERS_KEY = "lms:learning_session_counters:{0}"
+SESSION_COUNTERS_TTL = 2 * 24 * 60 * 60
+FLUSH_BATCH_SIZE = 5000
+HEARTBEAT_INTERVAL = 15
+
+HEARTBEAT_FIELDS = (
+	"name",
+	"creation",
+	"modified",
+	"owner",
+	"modified_by",
+	"docstatus",
+	"session_id",
+	"member",
+	"course",
+	"unit_type",
+	"unit_id",
+	"timestamp",
+	"is_focused",
+	"is_visible",
+	"idle_ms",
+)
+
+
+def cache_session_meta(session):
+	"""Cache the member and unit of a session so heartbeats don't have to read it."""
+	meta = {
+		"member": session.member,
+		"course": session.course,
+		"unit_type": "lesson" if session.lesson else "chapter" if session.chapter else "course",
+		"unit_id": session.lesson or session.chapter or session.course,
+	}
+	frappe.cache().set_value(
+		SESSION_META_KEY.format(session.session_id), meta, expires_in_sec=SESSION_COUNTERS_TTL
+	)
+	return meta
+
+
+def get_session_meta(session_id):
+	"""Get the cached meta of a session, loading it once from the database on a miss."""
+	meta = frappe.cache().get_value(SESSION_META_KEY.format(session_id))
+	if meta:
+		return meta
+
+	session = frappe.db.get_value(
+		"LMS Learning Session",
+		{"session_id": session_id},
+		["session_id", "member", "course", "chapter", "lesson"],
+		as_dict=True,
+	)
+	if not session:
+		return None
+
+	return cache_session_meta(session)
+
+
+def forget_session_meta(session_id):
+	"""Drop a session from the meta cache once it has ended."""
+	frappe.cache().delete_value(SESSION_META_KEY.format(session_id))
+
+
+def buffer_heartbeat(session_id, is_focused, is_visible, idle_ms=0):
+	"""Append a heartbeat to the ingestion buffer."""
+	meta = get_session_meta(session_id)
+	if not meta:
+		frappe.throw(_("Learning session {0} does not exist").format(session_id), frappe.DoesNotExistError)
+
+	if meta["member"] != frappe.session.user:
+		frappe.throw(_("Not permitted"), frappe.PermissionError)
+
+	timestamp = now()
+	entry = {
+		"name": frappe.generate_hash(length=10),
+		"session_id": session_id,
+		"member": meta["member"],
+		"course": meta["course"],
+		"unit_type": meta["unit_type"],
+		"unit_id": meta["unit_id"],
+		"timestamp": timestamp,
+		"is_focused": cint(is_focused),
+		"is_visible": cint(is_visible),
+		"idle_ms": cint(idle_ms),
+	}
+
+	cache = frappe.cache()
+	counters_key = get_counters_key(session_id)
+	counter = "active_time" if entry["is_focused"] and entry["is_visible"] else "idle_time"
+
+	try:
+		pipe = cache.pipeline()
+		pipe.rpush(cache.make_key(BUFFER_KEY), json.dumps(entry))
+		pipe.hincrby(counters_key, counter, HEARTBEAT_INTERVAL)
+		pipe.hincrby(counters_key, "heartbeats", 1)
+		pipe.hset(counters_key, "last_heartbeat", timestamp)
+		pipe.expire(counters_key, SESSION_COUNTERS_TTL)
+		pipe.execute()
+	except Exception:
+		# Redis is unavailable, don't lose the heartbeat
+		frappe.log_error(title=_("Heartbeat buffer unavailable"))
+		insert_heartbeats([entry])
+		add_to_session_times(session_id, counter, timestamp)
+
+	return entry
+
+
+def add_to_session_times(session_id, field, timestamp):
+	"""Add a heartbeat to the times stored on an open session, when its running counters can't be kept."""
+	frappe.db.sql(
+		f"""
+        UPDATE `tabLMS Learning Session`
+        SET `{field}` = COALESCE(`{field}`, 0) + %s, last_heartbeat = %s
+        WHERE session_id = %s AND end_time IS NULL
+        """,
+		(HEARTBEAT_INTERVAL, timestamp, session_id),
+	)
+
+
+def get_counters_key(session_id):
+	return frappe.cache().make_key(SESSION_COUNTERS_KEY.format(session_id))
+
+
+def get_session_counters(session_ids):
+	"""Get the running counters of sessions, keyed by session id. Sessions without counters are left out."""
+	session_ids = list(session_ids)
+	if not session_ids:
+		return {}
+
+	pipe = frappe.cache().pipeline(transaction=False)
+	for session_id in session_ids:
+		pipe.hgetall(get_counters_key(session_id))
+
+	counters = {}
+	for session_id, values in zip(session_ids, pipe.execute(), strict=True):
+		if not values:
+			continue
+
+		values = {frappe.safe_decode(key): frappe.safe_decode(value) for key, value in values.items()}
+		counters[session_id] = frappe._dict(
+			active_time=cint(values.get("active_time")),
+			idle_time=cint(values.get("idle_time")),
+			heartbeats=cint(values.get("heartbeats")),
+			last_heartbeat=values.get("last_heartbeat"),
+		)
+
+	return counters
+
+
+def clear_session_counters(session_id):
+	frappe.cache().delete_value(SESSION_COUNTERS_KEY.format(session_id))
+
+
+def checkpoint_session_counters(session_ids):
+	"""Copy running counters onto open session rows, so they survive a Redis eviction."""
+	for session_id, counters in get_session_counters(session_ids).items():
+		frappe.db.set_value(
+			"LMS Learning Session",
+			{"session_id": session_id, "end_time": ("is", "not set")},
+			{
+				"active_time": counters.active_time,
+				"idle_time": counters.idle_time,
+				"last_heartbeat": counters.last_heartbeat,
+			},
+			update_modified=False,
+		)
+
+
+def get_row(entry):
+	"""Convert a buffered entry to a row for `HEARTBEAT_FIELDS`."""
+	return (
+		entry["name"],
+		entry["timestamp"],
+		entry["timestamp"],
+		entry["member"],
+		entry["member"],
+		0,
+		entry["session_id"],
+		entry["member"],
+		entry["course"],
+		entry["unit_type"],
+		entry["unit_id"],
+		entry["timestamp"],
+		entry["is_focused"],
+		entry["is_visible"],
+		entry["idle_ms"],
+	)
+
+
+def insert_heartbeats(entries):
+	"""Insert heartbeats with multi-row inserts. Entries carry their own names, so replays are no-ops."""
+	frappe.db.bulk_insert(
+		"LMS Learning Heartbeat",
+		HEARTBEAT_FIELDS,
+		[get_row(entry) for entry in entries],
+		ignore_duplicates=True,
+	)
+
+
+def flush_heartbeat_buffer(batch_size=FLUSH_BATCH_SIZE):
+	"""Scheduled task to write buffered heartbeats to the database."""
+	cache = frappe.cache()
+
+	# Overlapping flushes would trim entries the other one has not inserted yet
+	lock = cache.lock(cache.make_key(FLUSH_LOCK_KEY), timeout=300)
+	if not lock.acquire(blocking=False):
+		return 0
+
+	try:
+		return _flush(cache, cint(batch_size))
+	finally:
+		lock.release()
+
+
+def _flush(cache, batch_size):
+	flushed = 0
+	oldest = None
+
+	while True:
+		raw_entries = cache.lrange(BUFFER_KEY, 0, batch_size - 1)
+		if not raw_entries:
+			break
+
+		entries = [json.loads(raw) for raw in raw_entries]
+		insert_heartbeats(entries)
+		frappe.db.commit()
+
+		# Trim only after the commit, so a failed flush leaves the entries in the buffer
+		cache.ltrim(BUFFER_KEY, len(raw_entries), -1)
+
+		checkpoint_session_counters({entry["session_id"] for entry in entries})
+		frappe.db.commit()
+
+		flushed += len(entries)
+		oldest = oldest or entries[0]["timestamp"]
+
+		if len(raw_entries) < batch_size:
+			break
+
+	stats = get_flush_stats()
+	stats["last_flush_at"] = now()
+	stats["last_flush_count"] = flushed
+	stats["last_flush_lag"] = time_diff_in_seconds(now_datetime(), get_datetime(oldest)) if oldest else 0
+	stats["total_flushed"] = cint(stats.get("total_flushed")) + flushed
+	cache.set_value(FLUSH_STATS_KEY, stats)
+
+	return flushed
+
+
+def get_flush_stats():
+	return frappe.cache().get_value(FLUSH_STATS_KEY) or {}
+
+
+def get_buffer_stats():
+	"""Get buffer depth and flush lag counters for the ingestion pipeline."""
+	cache = frappe.cache()
+	stats = get_flush_stats()
+
+	oldest_pending_age = 0
+	head = cache.lrange(BUFFER_KEY, 0, 0)
+	if head:
+		oldest = json.loads(head[0])["timestamp"]
+		oldest_pending_age = time_diff_in_seconds(now_datetime(), get_datetime(oldest))
+
+	return {
+		"buffer_depth": cache.llen(BUFFER_KEY),
+		"oldest_pending_age": oldest_pending_age,
+		"last_flush_at": stats.get("last_flush_at"),
+		"last_flush_count": cint(stats.get("last_flush_count")),
+		"last_flush_lag": stats.get("last_flush_lag") or 0,
+		"total_flushed": cint(stats.get("total_flushed")),
+	}
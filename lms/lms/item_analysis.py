@@ -0,0 +1,234 @@
+"""Quiz item analysis.
+
+The latest submission of every member of a quiz is loaded into dense member x question
+matrices, with one query, of how correct each answer was, the marks it got and the options
+it selected. Open ended answers count as correct in proportion to their marks. From them
+the difficulty (p-value) and the point-biserial discrimination of every question, how often
+each option was chosen and the distribution of scores are computed with array operations.
+
+The matrices are cached per quiz and brought up to date on every read with the submissions
+modified since the previous one, so new submissions are picked up without reading the
+rest again. They are rebuilt when the questions of the quiz change, when a submission is
+deleted, and after a regrade, which can change results without touching their submissions.
+"""
+
+import frappe
+import numpy as np
+from frappe.utils import cint, strip_html
+
+from lms.lms.answer_key import OPTIONS, get_answer_key, get_stored_answer_mask
+
+ITEM_ANALYSIS_KEY = "lms:quiz_item_analysis:{0}"
+ITEM_ANALYSIS_TTL = 24 * 60 * 60
+SCORE_BINS = 10
+
+
+@frappe.whitelist()
+def get_item_analysis(quiz):
+	"""Returns the statistics of every question of the quiz and the distribution of scores."""
+	frappe.only_for(["Moderator", "Course Creator", "Batch Evaluator"])
+	answer_key = get_answer_key(quiz)
+	return compute_statistics(answer_key, get_matrices(answer_key))
+
+
+def get_matrices(answer_key):
+	"""Returns the cached matrices of the quiz, updated with the submissions modified since."""
+	cache = frappe.cache()
+	key = ITEM_ANALYSIS_KEY.format(answer_key.quiz)
+	questions = list(answer_key.questions)
+
+	matrices = cache.get_value(key)
+	if matrices is None or matrices["questions"] != questions:
+		matrices = new_matrices(questions)
+
+	if load_submissions(answer_key, matrices):
+		cache.set_value(key, matrices, expires_in_sec=ITEM_ANALYSIS_TTL)
+
+	return matrices
+
+
+def clear_item_analysis(quiz):
+	frappe.cache().delete_value(ITEM_ANALYSIS_KEY.format(quiz))
+
+
+def clear_item_analysis_for_doc(doc, method=None):
+	"""Hook for deleted submissions, which are not seen by loading the ones modified since."""
+
+	def clear():
+		clear_item_analysis(doc.quiz)
+
+	frappe.db.after_commit.add(clear)
+
+
+def new_matrices(questions):
+	return {
+		"questions": questions,
+		"members": {},
+		"submissions": [],
+		"correct": np.empty((0, len(questions)), dtype=np.float32),
+		"marks": np.empty((0, len(questions)), dtype=np.float32),
+		"selected": np.zeros((0, len(questions)), dtype=np.uint8),
+		"since": None,
+	}
+
+
+def load_submissions(answer_key, matrices):
+	"""Load the results of the submissions modified since the last load. Returns whether any was."""
+	# Submissions are read past the (modified, name) of the last one that was loaded
+	since = matrices["since"]
+	keyset = ""
+	if since:
+		keyset = """AND (s.modified > %(modified)s
+			OR (s.modified = %(modified)s AND s.name > %(name)s))"""
+
+	rows = frappe.db.sql(
+		f"""
+		SELECT s.name, s.member, s.creation, s.modified,
+			r.question_name, r.answer, r.is_correct, r.marks, r.marks_out_of
+		FROM `tabLMS Quiz Submission` s
+		JOIN `tabLMS Quiz Result` r
+			ON r.parent = s.name AND r.parenttype = 'LMS Quiz Submission'
+		WHERE s.quiz = %(quiz)s {keyset}
+		ORDER BY s.creation, s.name
+		""",
+		{"quiz": answer_key.quiz, "modified": since and since[0], "name": since and since[1]},
+		as_dict=True,
+	)
+	if not rows:
+		return False
+
+	columns = {question: idx for idx, question in enumerate(matrices["questions"])}
+	members = matrices["members"]
+
+	# Rows of members that are new to the matrices
+	new_members = {row.member for row in rows if row.member not in members}
+	for member in sorted(new_members):
+		members[member] = len(matrices["submissions"])
+		matrices["submissions"].append(None)
+
+	grow = len(new_members)
+	if grow:
+		width = len(columns)
+		matrices["correct"] = np.vstack([matrices["correct"], np.full((grow, width), np.nan, np.float32)])
+		matrices["marks"] = np.vstack([matrices["marks"], np.full((grow, width), np.nan, np.float32)])
+		matrices["selected"] = np.vstack([matrices["selected"], np.zeros((grow, width), np.uint8)])
+
+	for row in rows:
+		idx = members[row.member]
+		# Only the latest submission of a member is counted
+		submission = (row.creation, row.name)
+		current = matrices["submissions"][idx]
+		if current and current > submission:
+			continue
+		if current != submission:
+			matrices["submissions"][idx] = submission
+			matrices["correct"][idx] = np.nan
+			matrices["marks"][idx] = np.nan
+			matrices["selected"][idx] = 0
+
+		column = columns.get(row.question_name)
+		if column is None:
+			continue
+
+		question = answer_key.questions[row.question_name]
+		if question.type == "Open Ended":
+			correct = cint(row.marks) / cint(row.marks_out_of) if cint(row.marks_out_of) else 0
+		else:
+			correct = cint(row.is_correct)
+
+		matrices["correct"][idx, column] = correct
+		matrices["marks"][idx, column] = cint(row.marks)
+		if question.type == "Choices":
+			matrices["selected"][idx, column] = get_stored_answer_mask(question, row.answer)
+
+	matrices["since"] = max((row.modified, row.name) for row in rows)
+	return True
+
+
+def compute_statistics(answer_key, matrices):
+	correct, marks, selected = matrices["correct"], matrices["marks"], matrices["selected"]
+	answered = ~np.isnan(correct)
+	attempts = answered.sum(axis=0)
+	with np.errstate(invalid="ignore", divide="ignore"):
+		p_values = np.nansum(correct, axis=0) / attempts
+		discrimination = get_discrimination(correct, marks, answered)
+		option_counts = [((selected >> (num - 1)) & 1).sum(axis=0) for num in OPTIONS]
+
+	questions = []
+	for column, name in enumerate(matrices["questions"]):
+		question = answer_key.questions[name]
+		row = {
+			"question": name,
+			"title": strip_html(question.question or ""),
+			"type": question.type,
+			"marks": question.marks,
+			"attempts": int(attempts[column]),
+			"p_value": to_float(p_values[column]),
+			"discrimination": to_float(discrimination[column]),
+			"options": [],
+		}
+		if question.type == "Choices":
+			for idx, option in enumerate(question.options):
+				if option:
+					count = int(option_counts[idx][column])
+					row["options"].append(
+						{
+							"idx": idx + 1,
+							"option": option,
+							"is_correct": cint(question.correct_mask & (1 << idx) > 0),
+							"count": count,
+							"frequency": count / row["attempts"] if row["attempts"] else None,
+						}
+					)
+		questions.append(row)
+
+	return {
+		"quiz": answer_key.quiz,
+		"submissions": len(matrices["submissions"]),
+		"questions": questions,
+		"scores": get_score_distribution(marks, answer_key.total_marks),
+	}
+
+
+def get_discrimination(correct, marks, answered):
+	"""Point-biserial correlation of every question with the rest of the score, that is the
+	score without the marks of the question, over the members who answered it."""
+	weights = answered.astype(np.float64)
+	item = np.nan_to_num(correct).astype(np.float64)
+	item_marks = np.nan_to_num(marks).astype(np.float64)
+	rest = item_marks.sum(axis=1, keepdims=True) - item_marks
+
+	count = weights.sum(axis=0)
+	mean_item = (item * weights).sum(axis=0) / count
+	mean_rest = (rest * weights).sum(axis=0) / count
+	covariance = (item * rest * weights).sum(axis=0) / count - mean_item * mean_rest
+	variance_item = (item**2 * weights).sum(axis=0) / count - mean_item**2
+	variance_rest = (rest**2 * weights).sum(axis=0) / count - mean_rest**2
+
+	denominator = np.sqrt(np.clip(variance_item, 0, None) * np.clip(variance_rest, 0, None))
+	return np.where(denominator > 1e-12, covariance / denominator, np.nan)
+
+
+def get_score_distribution(marks, total_marks):
+	if not marks.shape[0]:
+		return {"mean": None, "median": None, "std": None, "min": None, "max": None, "distribution": []}
+
+	scores = np.nansum(marks, axis=1, dtype=np.float64)
+	percentages = np.clip(scores / total_marks * 100, 0, 100) if total_marks else np.zeros_like(scores)
+	counts, edges = np.histogram(percentages, bins=SCORE_BINS, range=(0, 100))
+
+	return {
+		"mean": to_float(scores.mean()),
+		"median": to_float(np.median(scores)),
+		"std": to_float(scores.std()),
+		"min": float(scores.min()),
+		"max": float(scores.max()),
+		"distribution": [
+			{"range": f"{int(edges[i])}-{int(edges[i + 1])}", "count": int(count)}
+			for i, count in enumerate(counts)
+		],
+	}
+
+
+def to_float(value):
+	return None if np.isnan(value) else round(float(value), 4)
@@ -1,19 +1,25 @@
 """API methods for learning analytics."""
 
 import json
-import csv
-import io
 import frappe
 from frappe import _
 from frappe.utils import cint, flt, get_datetime, now, getdate, add_days
-from frappe.utils.response import Response
 
 from lms.lms.analytics import (
-    update_time_analytics, 
+    close_learning_session,
     get_student_time_analytics, 
+    get_student_time_analytics_page,
+    get_time_analytics_summary,
     get_course_time_analytics,
     get_student_course_analytics
 )
+from lms.lms.analytics_export import export_learning_analytics
+from lms.lms.analytics_rollup import enqueue_backfill, get_data_as_of
+from lms.lms.heartbeat_buffer import (
+    buffer_heartbeat,
+    cache_session_meta,
+    get_buffer_stats
+)
 
 
 @frappe.whitelist()
@@ -56,6 +62,7 @@ def track_learning_session_start(course_id, unit_type, unit_id, session_id=None)
         "idle_time": 0
     })
     session.insert(ignore_permissions=True)
+    cache_session_meta(session)
     
     return {"session_id": session_id}
 
@@ -64,21 +71,7 @@ def track_learning_session_start(course_id, unit_type, unit_id, session_id=None)
 def track_learning_heartbeat(session_id, is_focused, is_visible, idle_ms=0):
     """Track a learning heartbeat."""
     try:
-        session = frappe.get_doc("LMS Learning Session", {"session_id": session_id})
-        
-        heartbeat = frappe.get_doc({
-            "doctype": "LMS Learning Heartbeat",
-            "session_id": session_id,
-            "member": frappe.session.user,
-            "course": session.course,
-            "unit_type": "lesson" if session.lesson else "chapter" if session.chapter else "course",
-            "unit_id": session.lesson or session.chapter or session.course,
-            "timestamp": now(),
-            "is_focused": is_focused,
-            "is_visible": is_visible,
-            "idle_ms": idle_ms
-        })
-        heartbeat.insert(ignore_permissions=True)
+        buffer_heartbeat(session_id, is_focused, is_visible, idle_ms)
         
         return {"status": "success"}
     except Exception as e:
@@ -91,65 +84,16 @@ def track_learning_session_end(session_id, end_reason="navigate"):
     """End a learning session."""
     try:
         session = frappe.get_doc("LMS Learning Session", {"session_id": session_id})
-        session.end_time = now()
-        session.end_reason = end_reason
-        
-        # Calculate active and idle time from heartbeats
-        heartbeats = frappe.get_all(
-            "LMS Learning Heartbeat",
-            filters={"session_id": session_id},
-            fields=["timestamp", "is_focused", "is_visible", "idle_ms"],
-            order_by="timestamp"
-        )
-        
-        active_time = 0
-        idle_time = 0
-        
-        if heartbeats:
-            # Calculate time based on heartbeat intervals (15 seconds each)
-            for i, heartbeat in enumerate(heartbeats):
-                # Each heartbeat represents ~15 seconds of activity
-                interval = 15  # seconds
-                
-                if heartbeat.is_focused and heartbeat.is_visible:
-                    # User was active during this interval
-                    active_time += interval
-                else:
-                    # User was idle/unfocused during this interval
-                    idle_time += interval
-            
-            # If no heartbeats were active, calculate from start to end time
-            if active_time == 0 and len(heartbeats) > 0:
-                total_time = (get_datetime(session.end_time) - 
-                             get_datetime(session.start_time)).total_seconds()
-                active_time = max(0, total_time - idle_time)
-        else:
-            # No heartbeats - calculate from session duration
-            total_time = (get_datetime(session.end_time) - 
-                         get_datetime(session.start_time)).total_seconds()
-            # Assume active if session was short (< 5 minutes)
-            if total_time < 300:
-                active_time = total_time
-            else:
-                # For longer sessions without heartbeats, be conservative
-                active_time = min(total_time, 60)  # Cap at 1 minute
-        
-        session.active_time = int(active_time)
-        session.idle_time = int(idle_time)
-        session.save(ignore_permissions=True)
+        close_learning_session(session, end_reason)
         
-        # Update aggregates
-        update_time_analytics(session)
-        
-        return {"status": "success", "active_time": int(active_time), "idle_time": int(idle_time)}
+        return {"status": "success", "active_time": session.active_time, "idle_time": session.idle_time}
     except Exception as e:
         frappe.log_error(f"Error ending session: {str(e)}")
         return {"status": "error", "message": str(e)}
 
 
-@frappe.whitelist()
-def get_admin_analytics(from_date=None, to_date=None, course=None, student=None):
-    """Get analytics data for admin dashboard."""
+def get_permitted_course_filter(course=None):
+    """Get the course filter the current user is allowed to see analytics for."""
     if not frappe.has_permission("LMS Course", "read"):
         frappe.throw(_("Not permitted"), frappe.PermissionError)
     
@@ -162,6 +106,14 @@ def get_admin_analytics(from_date=None, to_date=None, course=None, student=None)
         elif not course:
             course = ["in", courses]
     
+    return course
+
+
+@frappe.whitelist()
+def get_admin_analytics(from_date=None, to_date=None, course=None, student=None):
+    """Get analytics data for admin dashboard."""
+    course = get_permitted_course_filter(course)
+    
     # Set default date range if not provided
     if not from_date:
         from_date = getdate(add_days(now(), -30))
@@ -208,20 +160,48 @@ def get_admin_analytics(from_date=None, to_date=None, course=None, student=None)
     }
     
     # Enrich analytics data with completion percentage
+    progress = {(e.member, e.course): cint(e.progress) for e in enrollments}
     for item in analytics_data:
-        for e in enrollments:
-            if e.course == item["course"] and e.member == item["member"]:
-                item["completion"] = cint(e.progress)
-                break
-        else:
-            item["completion"] = 0
+        item["completion"] = progress.get((item["member"], item["course"]), 0)
     
     return {
         "summary": summary,
-        "data": analytics_data
+        "data": analytics_data,
+        "data_as_of": get_data_as_of()
     }
 
 
+@frappe.whitelist()
+def get_admin_analytics_page(from_date=None, to_date=None, course=None, student=None,
+                             sort_by="total_active_time", sort_order="desc", cursor=None,
+                             page_length=50, include_daily=0):
+    """Get one page of analytics data for admin dashboard."""
+    course = get_permitted_course_filter(course)
+    
+    # Set default date range if not provided
+    if not from_date:
+        from_date = getdate(add_days(now(), -30))
+    if not to_date:
+        to_date = getdate(now())
+    
+    page = get_student_time_analytics_page(
+        student=student,
+        course=course,
+        from_date=from_date,
+        to_date=to_date,
+        sort_by=sort_by,
+        sort_order=sort_order,
+        cursor=cursor,
+        page_length=page_length,
+        include_daily=include_daily
+    )
+    # Totals don't change between pages, only send them with the first one
+    if not cursor:
+        page["summary"] = get_time_analytics_summary(student, course, from_date, to_date)
+    page["data_as_of"] = get_data_as_of()
+    return page
+
+
 @frappe.whitelist()
 def get_course_analytics(course, from_date=None, to_date=None):
     """Get analytics data for a specific course."""
@@ -269,52 +249,32 @@ def get_student_analytics(student, course=None):
 @frappe.whitelist()
 def export_analytics_csv(from_date=None, to_date=None, course=None, student=None):
     """Export analytics data as CSV."""
-    if not frappe.has_permission("LMS Course", "read"):
-        frappe.throw(_("Not permitted"), frappe.PermissionError)
-    
-    # Get analytics data
-    analytics_data = get_student_time_analytics(
+    return export_analytics(from_date, to_date, course, student, "csv")
+
+
+@frappe.whitelist()
+def export_analytics(from_date=None, to_date=None, course=None, student=None, file_format="csv"):
+    """Export analytics data as CSV, Parquet or Arrow."""
+    course = get_permitted_course_filter(course)
+    return export_learning_analytics(
         student=student,
         course=course,
         from_date=from_date,
-        to_date=to_date
-    )
-    
-    # Prepare CSV data
-    f = io.StringIO()
-    writer = csv.writer(f)
-    
-    # Write header
-    writer.writerow([
-        "Student", "Student Name", "Course", "Course Name", 
-        "Time Spent (seconds)", "Time Spent (hours)", "Sessions", 
-        "Days Active", "Completion %"
-    ])
-    
-    # Write data rows
-    for item in analytics_data:
-        writer.writerow([
-            item["member"],
-            item["member_name"],
-            item["course"],
-            item["course_name"],
-            item["total_active_time"],
-            round(item["total_active_time"] / 3600, 2),
-            item["total_sessions"],
-            item["days_active"],
-            item.get("completion", 0)
-        ])
-    
-    # Prepare response
-    f.seek(0)
-    frappe.response["result"] = f.read()
-    frappe.response["type"] = "csv"
-    frappe.response["doctype"] = "LMS-Analytics-Export"
-    
-    return Response(
-        frappe.response["result"],
-        mimetype="text/csv",
-        headers={
-            "Content-Disposition": "attachment; filename=lms_analytics.csv"
-        }
+        to_date=to_date,
+        file_format=file_format
     )
+
+
+@frappe.whitelist()
+def get_heartbeat_ingestion_stats():
+    """Get buffer depth and flush lag of the heartbeat ingestion pipeline."""
+    frappe.only_for("System Manager")
+    return get_buffer_stats()
+
+
+@frappe.whitelist()
+def rebuild_time_analytics(from_date, to_date):
+    """Rebuild LMS Time Analytics for a date range in the background."""
+    frappe.only_for("System Manager")
+    enqueue_backfill(from_date, to_date)
+    return {"status": "queued"}
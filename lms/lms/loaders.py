@@ -0,0 +1,91 @@
+"""Request-scoped batch loaders.
+
+List endpoints often need a few fields of a User, course, chapter or lesson for every row
+they return. A loader collects the names it is asked for, fetches them with one `IN (...)`
+query and serves repeated names from memory until the end of the request.
+"""
+
+import frappe
+
+LOADER_FIELDS = {
+	"User": [
+		"name",
+		"username",
+		"full_name",
+		"first_name",
+		"user_image",
+		"email",
+		"last_active",
+		"country",
+		"headline",
+	],
+	"LMS Course": ["name", "title"],
+	"Course Chapter": ["name", "title", "course"],
+	"Course Lesson": ["name", "title", "course", "chapter"],
+}
+
+
+class Loader:
+	def __init__(self, doctype):
+		self.doctype = doctype
+		self.fields = LOADER_FIELDS[doctype]
+		self.records = {}
+		self.pending = set()
+
+	def prime(self, names):
+		"""Queue names to be fetched together by the next load."""
+		self.pending.update(name for name in names if name and name not in self.records)
+
+	def load(self, name, fields=None):
+		"""Get a copy of the record with only the given fields, or None if it does not exist."""
+		self.prime([name])
+		self.dispatch()
+
+		record = self.records.get(name)
+		if record is None:
+			return None
+		return frappe._dict({field: record.get(field) for field in fields or self.fields})
+
+	def load_many(self, names, fields=None):
+		self.prime(names)
+		return [self.load(name, fields) for name in names]
+
+	def dispatch(self):
+		if not self.pending:
+			return
+
+		names = list(self.pending)
+		self.pending.clear()
+
+		for record in frappe.get_all(self.doctype, {"name": ["in", names]}, self.fields):
+			self.records[record.name] = record
+
+		for name in names:
+			self.records.setdefault(name, None)
+
+
+def get_loader(doctype):
+	if not hasattr(frappe.local, "lms_loaders"):
+		frappe.local.lms_loaders = {}
+
+	if doctype not in frappe.local.lms_loaders:
+		frappe.local.lms_loaders[doctype] = Loader(doctype)
+
+	return frappe.local.lms_loaders[doctype]
+
+
+def prime(doctype, names):
+	get_loader(doctype).prime(names)
+
+
+def get_user_details(user, fields):
+	return get_loader("User").load(user, fields)
+
+
+def get_users_details(users, fields):
+	return get_loader("User").load_many(users, fields)
+
+
+def get_title(doctype, name):
+	record = get_loader(doctype).load(name, ["title"])
+	return record.title if record else None
@@ -1,4 +1,7 @@
 import frappe
+from frappe import _
+
+from lms.lms.seats import hold_seat
 
 
 def get_payment_gateway():
@@ -31,6 +34,9 @@ def get_payment_link(
 ):
 	payment_gateway = get_payment_gateway()
 	address = frappe._dict(address)
+
+	if doctype == "LMS Batch" and not payment_for_certificate and not hold_seat(docname):
+		frappe.throw(_("Batch is sold out."))
 	amount_with_gst = total_amount if total_amount != amount else 0
 
 	payment = record_payment(
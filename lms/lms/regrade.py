@@ -0,0 +1,254 @@
+"""Quiz regrading.
+
+Grades every submission of a quiz again against its current answer key, after a correct
+option or the marks of a question were changed. Submissions are read a chunk at a time by
+name, typed answers of the whole chunk are matched at once, spread over a process pool
+when there are many, and only the results and submissions whose grade changed are written
+with bulk updates. Members are notified once, however many of their submissions changed.
+
+Open ended answers are graded by hand and keep their marks.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import frappe
+from frappe import _
+from frappe.desk.doctype.notification_log.notification_log import make_notification_logs
+from frappe.utils import cint
+
+from lms.lms.answer_key import get_answer_key, get_stored_answer_mask
+from lms.lms.answer_matching import get_matcher, normalize_answer
+from lms.lms.gradebook import clear_gradebook_cache
+from lms.lms.item_analysis import clear_item_analysis
+
+CHUNK_SIZE = 500
+# Chunks with fewer typed answers than this are matched in this process
+POOL_THRESHOLD = 2000
+POOL_TASK_SIZE = 500
+
+
+@frappe.whitelist()
+def regrade_quiz(quiz):
+	"""Regrade the submissions of the quiz in the background."""
+	frappe.only_for(["Moderator", "Course Creator"])
+	if not frappe.db.exists("LMS Quiz", quiz):
+		frappe.throw(_("Quiz {0} does not exist.").format(quiz), frappe.DoesNotExistError)
+
+	frappe.enqueue(
+		regrade_quiz_submissions,
+		queue="long",
+		timeout=3600,
+		quiz=quiz,
+		job_id=f"lms:regrade_quiz:{quiz}",
+		deduplicate=True,
+		enqueue_after_commit=True,
+	)
+	frappe.msgprint(_("The submissions of this quiz are being regraded in the background."))
+
+
+def regrade_quiz_submissions(quiz, answer_key=None, chunk_size=CHUNK_SIZE):
+	"""Regrade every submission of the quiz. Returns the number of submissions read and updated."""
+	answer_key = answer_key or get_answer_key(quiz)
+	total = frappe.db.count("LMS Quiz Submission", {"quiz": quiz})
+	changes = {}
+	done = updated = 0
+
+	with get_pool() as pool:
+		last_name = ""
+		while True:
+			submissions = frappe.db.sql(
+				"""
+				SELECT name, member, score, score_out_of, percentage
+				FROM `tabLMS Quiz Submission`
+				WHERE quiz = %s AND name > %s
+				ORDER BY name
+				LIMIT %s
+				""",
+				(quiz, last_name, chunk_size),
+				as_dict=True,
+			)
+			if not submissions:
+				break
+
+			last_name = submissions[-1].name
+			for submission in regrade_chunk(answer_key, submissions, pool):
+				changes.setdefault(submission.member, []).append(submission)
+				updated += 1
+
+			frappe.db.commit()
+			done += len(submissions)
+			if total:
+				frappe.publish_progress(
+					done * 100 / total,
+					title=_("Regrading Quiz"),
+					doctype="LMS Quiz",
+					docname=quiz,
+					description=_("{0} of {1} submissions regraded").format(done, total),
+				)
+
+	clear_gradebooks(quiz)
+	clear_item_analysis(quiz)
+	notify_members(answer_key, changes)
+	return {"submissions": done, "updated": updated}
+
+
+def regrade_chunk(answer_key, submissions, pool=None):
+	"""Regrade the results of the submissions and write those that changed. Returns the
+	submissions whose score changed."""
+	results = frappe.db.sql(
+		"""
+		SELECT name, parent, question_name, answer, is_correct, marks, marks_out_of
+		FROM `tabLMS Quiz Result`
+		WHERE parenttype = 'LMS Quiz Submission' AND parent IN %s
+		""",
+		[tuple(submission.name for submission in submissions)],
+		as_dict=True,
+	)
+
+	typed = [
+		result
+		for result in results
+		if result.question_name in answer_key.questions
+		and answer_key.questions[result.question_name].type == "User Input"
+	]
+	matched = match_typed_answers(answer_key, typed, pool)
+
+	result_updates = {}
+	scores = {}
+	for result in results:
+		question = answer_key.questions.get(result.question_name)
+		is_correct, marks = cint(result.is_correct), cint(result.marks)
+
+		if question and question.type != "Open Ended":
+			if question.type == "Choices":
+				is_correct = is_choice_answer_correct(question, result.answer)
+			else:
+				is_correct = cint(matched[result.name])
+			marks = question.marks if is_correct else -answer_key.marks_to_cut
+
+		marks_out_of = question.marks if question else cint(result.marks_out_of)
+		if (is_correct, marks, marks_out_of) != (
+			cint(result.is_correct),
+			cint(result.marks),
+			cint(result.marks_out_of),
+		):
+			result_updates[result.name] = {
+				"is_correct": is_correct,
+				"marks": marks,
+				"marks_out_of": marks_out_of,
+			}
+
+		scores[result.parent] = scores.get(result.parent, 0) + marks
+
+	if result_updates:
+		frappe.db.bulk_update("LMS Quiz Result", result_updates, update_modified=False)
+
+	changed = []
+	submission_updates = {}
+	for submission in submissions:
+		score = scores.get(submission.name, 0)
+		score_out_of = answer_key.total_marks
+		percentage = cint(score / score_out_of * 100) if score_out_of else 0
+		if (score, score_out_of, percentage) == (
+			cint(submission.score),
+			cint(submission.score_out_of),
+			cint(submission.percentage),
+		):
+			continue
+
+		submission_updates[submission.name] = {
+			"score": score,
+			"score_out_of": score_out_of,
+			"percentage": percentage,
+		}
+		if score != cint(submission.score):
+			changed.append(frappe._dict({**submission, "old_score": cint(submission.score), "score": score}))
+
+	if submission_updates:
+		frappe.db.bulk_update("LMS Quiz Submission", submission_updates)
+
+	return changed
+
+
+def is_choice_answer_correct(question, answer):
+	selected_mask = get_stored_answer_mask(question, answer)
+	return cint(selected_mask and not selected_mask & ~question.correct_mask)
+
+
+def match_typed_answers(answer_key, results, pool=None):
+	"""Returns whether each typed answer matches its question, by result name."""
+	by_question = {}
+	for result in results:
+		by_question.setdefault(result.question_name, []).append(result)
+
+	tasks, answers, possibilities = [], [], []
+	for question_name, question_results in by_question.items():
+		for start in range(0, len(question_results), POOL_TASK_SIZE):
+			task = question_results[start : start + POOL_TASK_SIZE]
+			tasks.append(task)
+			answers.append([normalize_answer(result.answer) for result in task])
+			possibilities.append(answer_key.questions[question_name].normalized_possibilities)
+
+	matchers = [get_matcher()] * len(tasks)
+	if pool and len(results) >= POOL_THRESHOLD:
+		decisions = pool.map(match_any, matchers, answers, possibilities)
+	else:
+		decisions = map(match_any, matchers, answers, possibilities)
+
+	matched = {}
+	for task, task_decisions in zip(tasks, decisions, strict=True):
+		for result, decision in zip(task, task_decisions, strict=True):
+			matched[result.name] = decision
+
+	return matched
+
+
+def match_any(matcher, answers, possibilities):
+	"""Whether each answer matches one of the possibilities. Runs in the pool's processes."""
+	if not possibilities:
+		return [False] * len(answers)
+
+	return [any(row) for row in matcher(answers, possibilities)]
+
+
+def get_pool():
+	# Workers are spawned so that they do not inherit the connections of this process
+	workers = cint(frappe.conf.get("lms_regrade_workers")) or os.cpu_count() or 1
+	return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def clear_gradebooks(quiz):
+	"""Bulk updates skip the hooks of the submissions, so the gradebooks of the batches that
+	assess the quiz are cleared here."""
+	for batch in frappe.get_all(
+		"LMS Assessment",
+		{"assessment_type": "LMS Quiz", "assessment_name": quiz, "parenttype": "LMS Batch"},
+		pluck="parent",
+		distinct=True,
+	):
+		clear_gradebook_cache(batch)
+
+
+def notify_members(answer_key, changes):
+	for member, submissions in changes.items():
+		scores = ", ".join(
+			_("{0} (was {1})").format(submission.score, submission.old_score) for submission in submissions
+		)
+		notification = frappe._dict(
+			{
+				"subject": _("Your scores for the quiz {0} have been updated").format(answer_key.title),
+				"email_content": _(
+					"The quiz {0} has been regraded and the score of {1} of your submissions changed: {2}"
+				).format(answer_key.title, len(submissions), scores),
+				"document_type": "LMS Quiz Submission",
+				"document_name": submissions[0].name,
+				"for_user": member,
+				"from_user": "Administrator",
+				"type": "Alert",
+				"link": "",
+			}
+		)
+		make_notification_logs(notification, [member])
+		frappe.db.commit()
@@ -0,0 +1,15 @@
+// Copyright (c) 2026, Frappe and contributors
+// For license information, please see license.txt
+/* eslint-disable */
+
+frappe.query_reports["Quiz Item Analysis"] = {
+	filters: [
+		{
+			fieldname: "quiz",
+			label: __("Quiz"),
+			fieldtype: "Link",
+			options: "LMS Quiz",
+			reqd: 1,
+		},
+	],
+};
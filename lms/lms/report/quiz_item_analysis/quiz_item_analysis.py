@@ -0,0 +1,96 @@
+# Copyright (c) 2026, Frappe and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+
+from lms.lms.answer_key import OPTIONS, get_answer_key
+from lms.lms.item_analysis import compute_statistics, get_matrices
+
+
+def execute(filters=None):
+	columns = get_columns()
+	if not filters or not filters.get("quiz"):
+		return columns, []
+
+	answer_key = get_answer_key(filters.get("quiz"))
+	statistics = compute_statistics(answer_key, get_matrices(answer_key))
+	data = get_data(statistics)
+	return columns, data, None, get_chart(data), get_report_summary(statistics)
+
+
+def get_data(statistics):
+	data = []
+	for idx, question in enumerate(statistics["questions"], 1):
+		row = frappe._dict(
+			{
+				"idx": idx,
+				"question": question["question"],
+				"title": question["title"],
+				"type": question["type"],
+				"attempts": question["attempts"],
+				"p_value": question["p_value"],
+				"discrimination": question["discrimination"],
+			}
+		)
+		for option in question["options"]:
+			if option["frequency"] is not None:
+				row[f"option_{option['idx']}"] = option["frequency"] * 100
+		data.append(row)
+
+	return data
+
+
+def get_columns():
+	columns = [
+		{"fieldname": "idx", "fieldtype": "Int", "label": _("No."), "width": 60},
+		{
+			"fieldname": "question",
+			"fieldtype": "Link",
+			"label": _("Question"),
+			"options": "LMS Question",
+			"width": 120,
+		},
+		{"fieldname": "title", "fieldtype": "Data", "label": _("Title"), "width": 300},
+		{"fieldname": "type", "fieldtype": "Data", "label": _("Type"), "width": 100},
+		{"fieldname": "attempts", "fieldtype": "Int", "label": _("Attempts"), "width": 100},
+		{"fieldname": "p_value", "fieldtype": "Float", "label": _("Difficulty (p)"), "width": 120},
+		{"fieldname": "discrimination", "fieldtype": "Float", "label": _("Discrimination"), "width": 130},
+	]
+	for num in OPTIONS:
+		columns.append(
+			{
+				"fieldname": f"option_{num}",
+				"fieldtype": "Percent",
+				"label": _("Option {0} Chosen").format(num),
+				"width": 130,
+			}
+		)
+
+	return columns
+
+
+def get_chart(data):
+	if not data:
+		return None
+
+	return {
+		"data": {
+			"labels": [_("Q{0}").format(row.idx) for row in data],
+			"datasets": [
+				{"name": _("Difficulty (p)"), "values": [row.p_value or 0 for row in data]},
+				{"name": _("Discrimination"), "values": [row.discrimination or 0 for row in data]},
+			],
+		},
+		"type": "bar",
+	}
+
+
+def get_report_summary(statistics):
+	scores = statistics["scores"]
+	return [
+		{"value": statistics["submissions"], "label": _("Members"), "datatype": "Int"},
+		{"value": scores["mean"], "label": _("Average Score"), "datatype": "Float"},
+		{"value": scores["median"], "label": _("Median Score"), "datatype": "Float"},
+		{"value": scores["std"], "label": _("Standard Deviation"), "datatype": "Float"},
+	]
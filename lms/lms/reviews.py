@@ -0,0 +1,110 @@
+"""Course reviews.
+
+The summary of the reviews of a course, their count, average and star histogram, is cached
+and rebuilt with one grouped query whenever a review of the course is saved or deleted.
+Reviews themselves are served a page at a time, newest first.
+"""
+
+import frappe
+from frappe.query_builder import DocType, Order
+from frappe.utils import cint, flt, pretty_date
+
+from lms.lms.loaders import get_user_details, prime
+from lms.lms.utils import decode_cursor, encode_cursor, get_rating_scale
+
+REVIEW_SUMMARY_KEY = "lms:review_summary:{0}"
+REVIEW_SUMMARY_TTL = 24 * 60 * 60
+REVIEWER_FIELDS = ["name", "username", "full_name", "user_image"]
+
+
+def get_review_summary(course):
+	"""Returns the count, average rating and number of reviews per star of a course."""
+	cache = frappe.cache()
+	key = REVIEW_SUMMARY_KEY.format(course)
+
+	summary = cache.get_value(key)
+	if summary is None:
+		summary = build_review_summary(course)
+		cache.set_value(key, summary, expires_in_sec=REVIEW_SUMMARY_TTL)
+
+	return summary
+
+
+def build_review_summary(course):
+	scale = get_rating_scale()
+	stars = {star: 0 for star in range(scale, 0, -1)}
+	total = 0
+
+	# Ratings are stored as fractions of 1
+	for rating, count in frappe.db.sql(
+		"SELECT rating, COUNT(*) FROM `tabLMS Course Review` WHERE course = %s GROUP BY rating", course
+	):
+		star = min(max(round(flt(rating) * scale), 1), scale)
+		stars[star] += count
+		total += flt(rating) * count
+
+	count = sum(stars.values())
+	return frappe._dict(
+		{
+			"count": count,
+			"average": flt(total / count * scale, frappe.get_system_settings("float_precision") or 3)
+			if count
+			else None,
+			"scale": scale,
+			"stars": stars,
+		}
+	)
+
+
+def update_review_summary(doc, method=None):
+	"""Hook to rebuild the summary of the course of a review once the change is committed."""
+	course = doc.course
+
+	def rebuild():
+		frappe.cache().set_value(
+			REVIEW_SUMMARY_KEY.format(course),
+			build_review_summary(course),
+			expires_in_sec=REVIEW_SUMMARY_TTL,
+		)
+
+	frappe.db.after_commit.add(rebuild)
+
+
+@frappe.whitelist(allow_guest=True)
+def get_course_reviews(course, cursor=None, page_length=20):
+	"""Returns a page of the reviews of a course, newest first, and the summary with the first page."""
+	page_length = min(cint(page_length) or 20, 100)
+	Review = DocType("LMS Course Review")
+	query = (
+		frappe.qb.from_(Review)
+		.select(Review.name, Review.review, Review.rating, Review.owner, Review.creation)
+		.where(Review.course == course)
+		.orderby(Review.creation, order=Order.desc)
+		.orderby(Review.name, order=Order.desc)
+		.limit(page_length + 1)
+	)
+	if cursor:
+		creation, name = decode_cursor(cursor, 2)
+		query = query.where(
+			(Review.creation < creation) | ((Review.creation == creation) & (Review.name < name))
+		)
+
+	reviews = query.run(as_dict=True)
+
+	next_cursor = None
+	if len(reviews) > page_length:
+		reviews = reviews[:page_length]
+		next_cursor = encode_cursor([str(reviews[-1].creation), reviews[-1].name])
+
+	scale = get_rating_scale()
+	prime("User", [review.owner for review in reviews])
+	for review in reviews:
+		review.rating = review.rating * scale
+		review.owner_details = get_user_details(review.owner, REVIEWER_FIELDS)
+		review.creation = pretty_date(review.creation)
+
+	response = {"reviews": reviews, "next_cursor": next_cursor}
+	if not cursor:
+		response["summary"] = get_review_summary(course)
+
+	return response
@@ -0,0 +1,366 @@
+"""Full text search.
+
+Courses, chapters, lessons, batches and job openings are indexed in a SQLite FTS5 table kept
+next to the site in `private/lms_search.db`. Documents are re-indexed from their doc hooks
+once the transaction that changed them is committed, or by a queue job when the index can
+not be locked in time, and `rebuild_search_index` builds the whole index again from the
+database. Writes made while it runs are recorded, and replayed on the new index under a lock
+that writers take, right before it replaces the current one.
+
+Every row carries whether it is published, so that drafts are only found by moderators, and
+whether it can be previewed, so that the text of a lesson is only shown to those who can
+read the lesson.
+"""
+
+import html
+import json
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+
+import frappe
+from frappe import _
+from frappe.utils import cint, strip_html_tags
+from redis.exceptions import LockError
+
+from lms.lms.utils import has_course_moderator_role
+
+SEARCH_DATABASE = "lms_search.db"
+REBUILD_JOB_ID = "lms_rebuild_search_index"
+REBUILD_FLAG_KEY = "lms:search_index_rebuilding"
+REBUILD_PENDING_KEY = "lms:search_index_pending"
+WRITE_LOCK_KEY = "lms:search_index_write_lock"
+SNIPPET_START, SNIPPET_END = "\x02", "\x03"
+SNIPPET_TOKENS = 16
+# Weights of the columns of the index, in order, when ranking with bm25
+RANK_WEIGHTS = (0, 0, 0, 0, 0, 10.0, 1.0)
+
+SEARCH_DOCTYPES = ["LMS Course", "Course Chapter", "Course Lesson", "LMS Batch", "Job Opportunity"]
+
+# Keys of editor.js block data that hold text
+EDITOR_TEXT_KEYS = ("text", "caption", "code", "items", "content", "title", "message")
+
+
+@frappe.whitelist(allow_guest=True)
+def search(query, doctype=None, start=0, page_length=20):
+	"""Returns a page of documents that match the query, best first, with a highlighted snippet."""
+	start, page_length = cint(start), min(cint(page_length) or 20, 100)
+	match = get_match_expression(query)
+	if not match:
+		return {"results": [], "has_next_page": False}
+
+	if not os.path.exists(get_database_path()):
+		frappe.enqueue(rebuild_search_index, queue="long", job_id=REBUILD_JOB_ID, deduplicate=True)
+		return {"results": [], "has_next_page": False}
+
+	conditions = ["search_index MATCH ?"]
+	values = [match]
+	if doctype:
+		conditions.append("doctype = ?")
+		values.append(doctype)
+	if not has_course_moderator_role():
+		conditions.append("published = 1")
+
+	with get_connection() as connection:
+		rows = connection.execute(
+			f"""
+			SELECT doctype, name, course, preview, title,
+				snippet(search_index, 6, ?, ?, '...', ?) as snippet
+			FROM search_index
+			WHERE {" AND ".join(conditions)}
+			ORDER BY bm25(search_index, {", ".join(str(weight) for weight in RANK_WEIGHTS)})
+			LIMIT ? OFFSET ?
+			""",
+			[SNIPPET_START, SNIPPET_END, SNIPPET_TOKENS, *values, page_length + 1, start],
+		).fetchall()
+
+	columns = ("doctype", "name", "course", "preview", "title", "snippet")
+	results = [frappe._dict(zip(columns, row, strict=True)) for row in rows]
+	has_next_page = len(results) > page_length
+	results = results[:page_length]
+
+	hidden = [result for result in results if result.doctype == "Course Lesson" and not result.preview]
+	readable_courses = get_readable_courses({result.course for result in hidden})
+	for result in hidden:
+		if result.course not in readable_courses:
+			result.snippet = ""
+
+	for result in results:
+		result.snippet = format_snippet(result.snippet)
+		del result["preview"]
+
+	return {"results": results, "has_next_page": has_next_page}
+
+
+def get_match_expression(query):
+	"""Turns the words of the query into an FTS5 expression that matches every word as a prefix."""
+	words = re.findall(r"\w+", query or "")
+	return " ".join(f'"{word}"*' for word in words)
+
+
+def format_snippet(snippet):
+	return html.escape(snippet or "").replace(SNIPPET_START, "<mark>").replace(SNIPPET_END, "</mark>")
+
+
+def get_readable_courses(courses):
+	"""Returns the courses among the given ones whose lessons the user can read."""
+	if not courses or frappe.session.user == "Guest":
+		return set()
+	if has_course_moderator_role():
+		return courses
+
+	enrolled = frappe.get_all(
+		"LMS Enrollment", {"member": frappe.session.user, "course": ["in", list(courses)]}, pluck="course"
+	)
+	instructed = frappe.get_all(
+		"Course Instructor",
+		{"instructor": frappe.session.user, "parenttype": "LMS Course", "parent": ["in", list(courses)]},
+		pluck="parent",
+	)
+	return set(enrolled) | set(instructed)
+
+
+def update_search_index(doc, method=None):
+	"""Hook to re-index a document, or drop it from the index when it is deleted."""
+	if doc.doctype not in SEARCH_DOCTYPES:
+		return
+
+	if method == "on_trash":
+		row = None
+	else:
+		row = get_index_row(doc)
+	published_changed = doc.doctype == "LMS Course" and doc.has_value_changed("published")
+	doctype, name = doc.doctype, doc.name
+
+	def write():
+		try:
+			write_to_index(doctype, name, row, published_changed)
+		except LockError:
+			# The change is already committed, so it is indexed again from the database by a job
+			# instead of failing the request
+			frappe.log_error(title=f"Search index could not be updated for {doctype} {name}")
+			frappe.enqueue(reindex_document, queue="long", doctype=doctype, name=name)
+
+	frappe.db.after_commit.add(write)
+
+
+def write_to_index(doctype, name, row, published_changed=False):
+	cache = frappe.cache()
+	with get_write_lock():
+		if cache.get_value(REBUILD_FLAG_KEY):
+			cache.pipeline(transaction=False).sadd(
+				cache.make_key(REBUILD_PENDING_KEY), json.dumps([doctype, name])
+			).execute()
+
+		if not os.path.exists(get_database_path()):
+			# The next search builds the whole index
+			return
+
+		with get_connection() as connection:
+			write_index_row(connection, doctype, name, row, published_changed)
+
+
+def reindex_document(doctype, name):
+	"""Queue job to index a document from the database when its hook could not write it."""
+	write_to_index(doctype, name, get_stored_index_row(doctype, name), doctype == "LMS Course")
+
+
+def write_index_row(connection, doctype, name, row, published_changed=False):
+	"""Replace the row of a document, or drop it when `row` is None."""
+	connection.execute("DELETE FROM search_index WHERE doctype = ? AND name = ?", (doctype, name))
+	if row:
+		connection.execute("INSERT INTO search_index VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+	if published_changed:
+		connection.execute(
+			"""UPDATE search_index SET published = ?
+			WHERE course = ? AND doctype IN ('Course Chapter', 'Course Lesson')""",
+			(row[3] if row else 0, name),
+		)
+
+
+def get_write_lock():
+	cache = frappe.cache()
+	return cache.lock(cache.make_key(WRITE_LOCK_KEY), timeout=60, blocking_timeout=30)
+
+
+@frappe.whitelist()
+def rebuild_index():
+	frappe.only_for("System Manager")
+	frappe.enqueue(rebuild_search_index, queue="long", job_id=REBUILD_JOB_ID, deduplicate=True)
+	return _("The search index is being rebuilt")
+
+
+def rebuild_search_index():
+	"""Build the whole index in a new file and swap it in place of the current one, so that
+	searches keep working while it is built."""
+	cache = frappe.cache()
+	path = get_database_path()
+	new_path = f"{path}.{frappe.generate_hash(length=8)}"
+
+	cache.delete_value(REBUILD_PENDING_KEY)
+	cache.set_value(REBUILD_FLAG_KEY, 1, expires_in_sec=2 * 60 * 60)
+	try:
+		connection = sqlite3.connect(new_path)
+		try:
+			create_index(connection)
+			published_courses = set(frappe.get_all("LMS Course", {"published": 1}, pluck="name"))
+			for doctype in SEARCH_DOCTYPES:
+				connection.executemany(
+					"INSERT INTO search_index VALUES (?, ?, ?, ?, ?, ?, ?)",
+					get_index_rows(doctype, published_courses),
+				)
+			connection.execute("INSERT INTO search_index(search_index) VALUES ('optimize')")
+			connection.commit()
+
+			# Writers wait while the documents they changed since the start are written again
+			with get_write_lock():
+				replay_pending_writes(connection)
+				connection.commit()
+				connection.close()
+				os.replace(new_path, path)
+				cache.delete_value([REBUILD_FLAG_KEY, REBUILD_PENDING_KEY])
+		finally:
+			connection.close()
+	finally:
+		cache.delete_value(REBUILD_FLAG_KEY)
+		if os.path.exists(new_path):
+			os.remove(new_path)
+
+
+def replay_pending_writes(connection):
+	"""Index the documents written since the rebuild started again, from the database."""
+	cache = frappe.cache()
+	pending = cache.pipeline(transaction=False).smembers(cache.make_key(REBUILD_PENDING_KEY)).execute()[0]
+	for doctype, name in sorted(json.loads(frappe.safe_decode(value)) for value in pending):
+		row = get_stored_index_row(doctype, name)
+		write_index_row(connection, doctype, name, row, published_changed=doctype == "LMS Course")
+
+
+def get_stored_index_row(doctype, name):
+	"""Returns the index row of a document as it is in the database, or None once it is deleted."""
+	doc = frappe.db.get_value(doctype, name, ["name", *get_index_fields(doctype)], as_dict=True)
+	if doc:
+		doc.doctype = doctype
+		return get_index_row(doc)
+
+
+def get_index_rows(doctype, published_courses):
+	fields = ["name", *get_index_fields(doctype)]
+	for doc in frappe.get_all(doctype, fields=fields):
+		doc.doctype = doctype
+		row = get_index_row(doc, published_courses)
+		if row:
+			yield row
+
+
+def get_index_fields(doctype):
+	return {
+		"LMS Course": ["title", "short_introduction", "description", "tags", "published"],
+		"Course Chapter": ["title", "course"],
+		"Course Lesson": ["title", "course", "include_in_preview", "body", "content"],
+		"LMS Batch": ["title", "description", "batch_details", "published"],
+		"Job Opportunity": ["job_title", "company_name", "location", "description", "status", "disabled"],
+	}[doctype]
+
+
+def get_index_row(doc, published_courses=None):
+	"""Returns the (doctype, name, course, published, preview, title, content) row of a document."""
+
+	def is_course_published(course):
+		if published_courses is not None:
+			return course in published_courses
+		return bool(frappe.db.get_value("LMS Course", course, "published"))
+
+	course, preview = None, 1
+	if doc.doctype == "LMS Course":
+		title = doc.title
+		content = [doc.short_introduction, doc.tags, get_text(doc.description)]
+		published = doc.published
+	elif doc.doctype == "Course Chapter":
+		title, content, course = doc.title, [], doc.course
+		published = is_course_published(course)
+	elif doc.doctype == "Course Lesson":
+		title, course, preview = doc.title, doc.course, doc.include_in_preview
+		content = [get_markdown_text(doc.body), get_editor_text(doc.content)]
+		published = is_course_published(course)
+	elif doc.doctype == "LMS Batch":
+		title = doc.title
+		content = [doc.description, get_text(doc.batch_details)]
+		published = doc.published
+	elif doc.doctype == "Job Opportunity":
+		title = doc.job_title
+		content = [doc.company_name, doc.location, get_text(doc.description)]
+		published = doc.status == "Open" and not doc.disabled
+	else:
+		return None
+
+	content = " ".join(text for text in content if text)
+	return (doc.doctype, doc.name, course, cint(published), cint(preview), title or "", content)
+
+
+def get_text(value):
+	return " ".join(html.unescape(strip_html_tags(value or "")).split())
+
+
+def get_markdown_text(body):
+	# Drop macros like {{ YouTubeVideo('...') }}, markup is dropped by the tokenizer
+	return get_text(re.sub(r"{{.*?}}", " ", body or ""))
+
+
+def get_editor_text(content):
+	"""Returns the text of the blocks of an editor.js document."""
+	try:
+		blocks = json.loads(content or "{}").get("blocks") or []
+	except (ValueError, AttributeError):
+		return ""
+
+	texts = []
+
+	def collect(value):
+		if isinstance(value, str):
+			texts.append(value)
+		elif isinstance(value, list):
+			for item in value:
+				collect(item)
+		elif isinstance(value, dict):
+			for key in EDITOR_TEXT_KEYS:
+				collect(value.get(key))
+
+	for block in blocks:
+		collect(block.get("data"))
+
+	return get_text(" ".join(texts))
+
+
+def get_database_path():
+	return frappe.get_site_path("private", SEARCH_DATABASE)
+
+
+@contextmanager
+def get_connection():
+	"""Yields a connection to the index and commits what was written through it."""
+	connection = sqlite3.connect(get_database_path(), timeout=10)
+	try:
+		with connection:
+			yield connection
+	finally:
+		connection.close()
+
+
+def create_index(connection):
+	connection.execute(
+		"""
+		CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+			doctype UNINDEXED,
+			name UNINDEXED,
+			course UNINDEXED,
+			published UNINDEXED,
+			preview UNINDEXED,
+			title,
+			content,
+			tokenize = 'porter unicode61',
+			prefix = '2 3'
+		)
+		"""
+	)
@@ -0,0 +1,151 @@
+"""Batch seat inventory.
+
+`seats_taken` on LMS Batch counts the enrollments of a batch plus the seats held for members
+whose payment is in flight. Seats are only ever taken under a lock on the batch row, after
+reading how many are left, so concurrent enrollments can not oversell a batch.
+
+Holds live in a Redis sorted set per batch, scored by the time they expire. An enrollment
+uses the member's hold instead of taking another seat, and expired holds give their seat
+back from a scheduled job. An hourly job recounts every batch in case a seat leaked.
+"""
+
+import time
+
+import frappe
+from frappe import _
+from frappe.utils import cint
+
+from lms.lms.catalog import clear_catalog_cache
+
+SEAT_HOLDS_KEY = "lms:seat_holds:{0}"
+HELD_BATCHES_KEY = "lms:seat_hold_batches"
+SEAT_HOLD_TTL = 15 * 60
+# A hold this close to expiring is not used, so that it can not be released while the
+# enrollment that uses it is being saved
+SEAT_HOLD_MARGIN = 60
+
+
+def take_seat(batch):
+	"""Take a seat in the batch. Returns False when the batch is full."""
+	return take_seats(batch, 1) == 1
+
+
+def take_seats(batch, count):
+	"""Take up to `count` seats in the batch at once. Returns the number of seats taken."""
+	seats = frappe.db.get_value(
+		"LMS Batch", batch, ["seat_count", "seats_taken"], as_dict=True, for_update=True
+	)
+	if not seats:
+		return 0
+	if cint(seats.seat_count):
+		count = min(count, max(cint(seats.seat_count) - cint(seats.seats_taken), 0))
+
+	if count:
+		frappe.db.sql(
+			"UPDATE `tabLMS Batch` SET seats_taken = seats_taken + %s WHERE name = %s",
+			(count, batch),
+		)
+		clear_catalog_cache()
+	return count
+
+
+def release_seat(batch):
+	frappe.db.sql(
+		"UPDATE `tabLMS Batch` SET seats_taken = GREATEST(seats_taken - 1, 0) WHERE name = %s",
+		batch,
+	)
+	clear_catalog_cache()
+
+
+def claim_seat(batch, member):
+	"""Take a seat for a new enrollment, using the member's hold when they have one."""
+	if has_seat_hold(batch, member):
+		key = get_seat_holds_key(batch)
+		frappe.db.after_commit.add(lambda: frappe.cache().zrem(key, member))
+		return
+
+	if not take_seat(batch):
+		frappe.throw(_("The batch is full. Please contact the Administrator."))
+
+
+def hold_seat(batch, member=None):
+	"""Hold a seat for the member while they pay. Returns False when the batch is full."""
+	member = member or frappe.session.user
+	cache = frappe.cache()
+	key = get_seat_holds_key(batch)
+	expires_at = time.time() + SEAT_HOLD_TTL
+
+	if has_seat_hold(batch, member):
+		cache.zadd(key, {member: expires_at}, xx=True)
+		return True
+
+	# Give back a hold that is about to expire before taking a new one
+	if cache.zrem(key, member):
+		release_seat(batch)
+
+	# The hold is stored before the seat is taken, so that a recount in between can only count
+	# a seat too many, never one too few. The seat is taken in the request's transaction, and
+	# the hold is dropped again if that is rolled back.
+	cache.pipeline().zadd(key, {member: expires_at}).sadd(cache.make_key(HELD_BATCHES_KEY), batch).execute()
+	frappe.db.after_rollback.add(lambda: frappe.cache().zrem(key, member))
+	if not take_seat(batch):
+		cache.zrem(key, member)
+		return False
+
+	return True
+
+
+def has_seat_hold(batch, member=None):
+	expires_at = frappe.cache().zscore(get_seat_holds_key(batch), member or frappe.session.user)
+	return bool(expires_at and expires_at > time.time() + SEAT_HOLD_MARGIN)
+
+
+def has_seats_left(batch, member=None):
+	"""Whether the member can enroll in the batch, read from the counter instead of a count."""
+	seats = frappe.db.get_value("LMS Batch", batch, ["seat_count", "seats_taken"], as_dict=True)
+	if not seats or not cint(seats.seat_count):
+		return bool(seats)
+
+	return cint(seats.seats_taken) < cint(seats.seat_count) or has_seat_hold(batch, member)
+
+
+def release_expired_holds():
+	"""Scheduled job to give back the seats of holds that expired."""
+	cache = frappe.cache()
+	now = time.time()
+
+	held_batches = cache.make_key(HELD_BATCHES_KEY)
+	for batch in cache.pipeline(transaction=False).smembers(held_batches).execute()[0]:
+		batch = frappe.safe_decode(batch)
+		key = get_seat_holds_key(batch)
+
+		for member in cache.zrangebyscore(key, 0, now):
+			# Only the one that removes the hold gives its seat back
+			if cache.zrem(key, member):
+				release_seat(batch)
+
+		frappe.db.commit()
+		if not cache.zcard(key):
+			cache.pipeline(transaction=False).srem(held_batches, batch).execute()
+
+
+def reconcile_seats_taken():
+	"""Scheduled job to recount the seats of batches whose counter drifted."""
+	enrolled = dict(frappe.db.sql("SELECT batch, COUNT(*) FROM `tabLMS Batch Enrollment` GROUP BY batch"))
+
+	for batch in frappe.get_all("LMS Batch", fields=["name", "seats_taken"]):
+		key = get_seat_holds_key(batch.name)
+		if cint(batch.seats_taken) == enrolled.get(batch.name, 0) + frappe.cache().zcard(key):
+			continue
+
+		# Recount under the row lock, so that no seat is taken in between
+		frappe.db.get_value("LMS Batch", batch.name, "name", for_update=True)
+		seats_taken = frappe.db.count("LMS Batch Enrollment", {"batch": batch.name})
+		seats_taken += frappe.cache().zcard(key)
+		frappe.db.set_value("LMS Batch", batch.name, "seats_taken", seats_taken, update_modified=False)
+		clear_catalog_cache()
+		frappe.db.commit()
+
+
+def get_seat_holds_key(batch):
+	return frappe.cache().make_key(SEAT_HOLDS_KEY.format(batch))
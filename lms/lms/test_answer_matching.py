@@ -0,0 +1,86 @@
+import random
+import string
+import unittest
+
+from fuzzywuzzy import fuzz
+
+from .answer_matching import (
+	MATCH_THRESHOLD,
+	fuzzywuzzy_matcher,
+	normalize_answer,
+	rapidfuzz_matcher,
+	rapidfuzz_process,
+)
+
+WORDS = [
+	"paris",
+	"the",
+	"capital",
+	"of",
+	"France",
+	"photosynthesis",
+	"mitochondria",
+	"Newton's",
+	"gravity",
+	"H2O",
+	"Éclair",
+	"naïve",
+	"42",
+	"x",
+]
+
+
+def get_corpus():
+	"""Possible answers and answers typed with a few mistakes, with the edge cases of
+	fuzzywuzzy: strings that are empty once normalized and long repetitive strings."""
+	rng = random.Random(85)
+	possibilities = [" ".join(rng.choices(WORDS, k=rng.randint(1, 5))) for _ in range(60)]
+	possibilities += ["!!!", "a" * 250 + "b" * 10, "Paris, France"]
+
+	answers = ["", "???", "a" * 240 + "b" * 10, "france paris", "PARIS france!"]
+	for _ in range(600):
+		answer = list(rng.choice(possibilities))
+		for _ in range(rng.randint(0, 4)):
+			position = rng.randint(0, len(answer))
+			edit = rng.random()
+			if edit < 0.33 and answer:
+				answer.pop(min(position, len(answer) - 1))
+			elif edit < 0.66:
+				answer.insert(position, rng.choice(string.ascii_letters + " .,!"))
+			elif answer:
+				answer[min(position, len(answer) - 1)] = rng.choice(string.ascii_letters)
+		answers.append("".join(answer))
+
+	return possibilities, answers
+
+
+class TestAnswerMatching(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls.possibilities, cls.answers = get_corpus()
+		cls.expected = [
+			[
+				fuzz.token_sort_ratio(possibility, answer) > MATCH_THRESHOLD
+				for possibility in cls.possibilities
+			]
+			for answer in cls.answers
+		]
+
+	def assert_same_decisions(self, matcher):
+		decisions = matcher(
+			[normalize_answer(answer) for answer in self.answers],
+			[normalize_answer(possibility) for possibility in self.possibilities],
+		)
+		self.assertEqual(decisions, self.expected)
+
+	def test_fuzzywuzzy_matcher(self):
+		self.assert_same_decisions(fuzzywuzzy_matcher)
+
+	@unittest.skipUnless(rapidfuzz_process, "rapidfuzz is not installed")
+	def test_rapidfuzz_matcher(self):
+		self.assert_same_decisions(rapidfuzz_matcher)
+
+	def test_corpus_has_both_decisions(self):
+		decisions = [decision for row in self.expected for decision in row]
+		self.assertIn(True, decisions)
+		self.assertIn(False, decisions)
@@ -0,0 +1,168 @@
+import frappe
+from frappe.tests import IntegrationTestCase
+from frappe.utils import add_days, nowdate
+
+from lms.lms.bulk_enrollment import bulk_enroll, parse_members
+from lms.lms.doctype.lms_course.test_lms_course import new_course, new_user
+
+
+class TestBulkEnrollment(IntegrationTestCase):
+	def setUp(self):
+		self.course = new_course("Test Bulk Enrollment Course").name
+		self.users = [new_user("Test", f"bulk_{num}@test.com").name for num in range(4)]
+		frappe.db.set_value("User", self.users[3], "enabled", 0)
+		frappe.get_doc({"doctype": "LMS Enrollment", "member": self.users[2], "course": self.course}).insert()
+
+	def tearDown(self):
+		frappe.db.delete("LMS Enrollment", {"course": self.course})
+		frappe.delete_doc("LMS Course", self.course, force=True)
+
+	def get_errors(self, result):
+		return [(error["row"], error["member"], error["error"]) for error in result["errors"]]
+
+	def test_parse_members(self):
+		self.assertEqual(
+			parse_members('["A@test.com", " b@test.com", ""]'), [(1, "a@test.com"), (2, "b@test.com")]
+		)
+		self.assertEqual(
+			parse_members("email\na@test.com,Alice\n\nb@test.com"), [(2, "a@test.com"), (4, "b@test.com")]
+		)
+		self.assertRaises(frappe.ValidationError, parse_members, "5")
+		self.assertRaises(frappe.ValidationError, parse_members, '{"email": "a@test.com"}')
+
+	def test_enroll_in_course(self):
+		members = [self.users[0], self.users[1], self.users[0], "unknown@test.com", "not-an-email"]
+		members += [self.users[2], self.users[3]]
+		result = bulk_enroll(frappe.as_json(members), course=self.course)
+
+		self.assertEqual(result["total"], 7)
+		self.assertEqual(result["enrolled"], 2)
+		self.assertEqual(
+			self.get_errors(result),
+			[
+				(3, self.users[0], "Duplicate row"),
+				(4, "unknown@test.com", "User does not exist"),
+				(5, "not-an-email", "Invalid email address"),
+				(6, self.users[2], "Already enrolled"),
+				(7, self.users[3], "User is disabled"),
+			],
+		)
+		self.assertEqual(
+			sorted(frappe.get_all("LMS Enrollment", {"course": self.course}, pluck="member")),
+			sorted(self.users[:3]),
+		)
+
+	def test_enroll_in_csv(self):
+		result = bulk_enroll(f"email\n{self.users[0]}\n{self.users[1]}", course=self.course)
+
+		self.assertEqual(result["enrolled"], 2)
+		self.assertEqual(result["errors"], [])
+
+	def test_rows_past_the_seats_of_a_batch(self):
+		batch = frappe.get_doc(
+			{
+				"doctype": "LMS Batch",
+				"title": "Test Bulk Enrollment Batch",
+				"start_date": add_days(nowdate(), 10),
+				"end_date": add_days(nowdate(), 20),
+				"start_time": "10:00:00",
+				"end_time": "12:00:00",
+				"timezone": "Asia/Kolkata",
+				"description": "Test Bulk Enrollment Batch",
+				"batch_details": "Test Bulk Enrollment Batch",
+				"seat_count": 1,
+				"instructors": [{"instructor": "Administrator"}],
+				"courses": [{"course": self.course}],
+			}
+		).insert()
+
+		try:
+			result = bulk_enroll(frappe.as_json(self.users[:3]), batch=batch.name)
+
+			self.assertEqual(result["enrolled"], 1)
+			self.assertEqual(
+				self.get_errors(result),
+				[(2, self.users[1], "The batch is full."), (3, self.users[2], "The batch is full.")],
+			)
+			self.assertEqual(
+				frappe.get_all("LMS Batch Enrollment", {"batch": batch.name}, pluck="member"), [self.users[0]]
+			)
+			self.assertEqual(frappe.db.get_value("LMS Batch", batch.name, "seats_taken"), 1)
+		finally:
+			frappe.db.delete("LMS Batch Enrollment", {"batch": batch.name})
+			frappe.delete_doc("LMS Batch", batch.name, force=True)
+
+	def new_badge(self, reference_doctype, condition):
+		badge = frappe.get_doc(
+			{
+				"doctype": "LMS Badge",
+				"title": f"Test Bulk {reference_doctype} Badge",
+				"description": f"Test Bulk {reference_doctype} Badge",
+				"image": "/assets/lms/images/course-home.png",
+				"reference_doctype": reference_doctype,
+				"event": "New",
+				"condition": condition,
+				"user_field": "member",
+				"grant_only_once": 1,
+				"enabled": 1,
+			}
+		).insert()
+		frappe.cache_manager.clear_doctype_map("LMS Badge", reference_doctype)
+		self.addCleanup(frappe.cache_manager.clear_doctype_map, "LMS Badge", reference_doctype)
+		self.addCleanup(frappe.delete_doc, "LMS Badge", badge.name, force=True)
+		self.addCleanup(frappe.db.delete, "LMS Badge Assignment", {"badge": badge.name})
+		return badge
+
+	def get_badge_members(self, badge):
+		return sorted(frappe.get_all("LMS Badge Assignment", {"badge": badge.name}, pluck="member"))
+
+	def test_enrollment_hooks_run_for_bulk_enrollments(self):
+		other_course = new_course("Test Bulk Enrollment Program Course").name
+		self.addCleanup(frappe.delete_doc, "LMS Course", other_course, force=True)
+		frappe.get_doc(
+			{"doctype": "LMS Enrollment", "member": self.users[0], "course": other_course, "progress": 100}
+		).insert()
+		self.addCleanup(frappe.db.delete, "LMS Enrollment", {"course": other_course})
+
+		program = frappe.get_doc(
+			{
+				"doctype": "LMS Program",
+				"title": "Test Bulk Enrollment Program",
+				"program_courses": [{"course": self.course}, {"course": other_course}],
+				"program_members": [{"member": self.users[0]}],
+			}
+		).insert()
+		self.addCleanup(frappe.delete_doc, "LMS Program", program.name, force=True)
+		# Stale until the enrollment in the course of the program is counted
+		frappe.db.set_value("LMS Program Member", {"parent": program.name}, "progress", 100)
+
+		badge = self.new_badge("LMS Enrollment", f"doc.course == '{self.course}'")
+		result = bulk_enroll(frappe.as_json(self.users[:2]), course=self.course)
+
+		self.assertEqual(result["enrolled"], 2)
+		self.assertEqual(self.get_badge_members(badge), sorted(self.users[:2]))
+		self.assertEqual(frappe.db.get_value("LMS Program Member", {"parent": program.name}, "progress"), 50)
+
+	def test_batch_enrollment_badges_for_bulk_enrollments(self):
+		batch = frappe.get_doc(
+			{
+				"doctype": "LMS Batch",
+				"title": "Test Bulk Enrollment Badge Batch",
+				"start_date": add_days(nowdate(), 10),
+				"end_date": add_days(nowdate(), 20),
+				"start_time": "10:00:00",
+				"end_time": "12:00:00",
+				"timezone": "Asia/Kolkata",
+				"description": "Test Bulk Enrollment Badge Batch",
+				"batch_details": "Test Bulk Enrollment Badge Batch",
+				"instructors": [{"instructor": "Administrator"}],
+			}
+		).insert()
+		self.addCleanup(frappe.delete_doc, "LMS Batch", batch.name, force=True)
+		self.addCleanup(frappe.db.delete, "LMS Batch Enrollment", {"batch": batch.name})
+
+		badge = self.new_badge("LMS Batch Enrollment", f"doc.batch == '{batch.name}'")
+		result = bulk_enroll(frappe.as_json(self.users[:2]), batch=batch.name)
+
+		self.assertEqual(result["enrolled"], 2)
+		self.assertEqual(self.get_badge_members(badge), sorted(self.users[:2]))
@@ -0,0 +1,96 @@
+import frappe
+from frappe.tests import IntegrationTestCase
+
+from lms.lms.doctype.lms_course.test_lms_course import new_course
+from lms.lms.exchange_rates import (
+	LAST_KNOWN_RATES_KEY,
+	RATES_KEY,
+	TARGET_CURRENCY,
+	_rates_cache,
+	fixture_provider,
+	get_exchange_rate,
+	refresh_exchange_rates,
+)
+from lms.lms.utils import convert_prices
+
+FIXTURE_RATES = {"INR": 0.012, "GBP": 1.25}
+
+
+class TestExchangeRates(IntegrationTestCase):
+	def setUp(self):
+		self.conf = {
+			key: frappe.local.conf.get(key) for key in ("lms_exchange_rate_provider", "lms_exchange_rates")
+		}
+		frappe.local.conf.lms_exchange_rate_provider = "lms.lms.exchange_rates.fixture_provider"
+		frappe.local.conf.lms_exchange_rates = FIXTURE_RATES
+		self.last_known_rates = frappe.db.get_global(LAST_KNOWN_RATES_KEY.format(TARGET_CURRENCY))
+		self.clear_rates()
+
+		# Priced in a currency with a fixture rate and in one without
+		self.courses = []
+		for title, currency in (("Test Exchange Rate INR", "INR"), ("Test Exchange Rate EUR", "EUR")):
+			course = new_course(title).name
+			# Set directly, as paid courses can not be saved without the payments app
+			frappe.db.set_value(
+				"LMS Course", course, {"paid_course": 1, "course_price": 1000, "currency": currency}
+			)
+			self.courses.append(course)
+
+		self.settings = frappe.db.get_value(
+			"LMS Settings", None, ["show_usd_equivalent", "apply_rounding"], as_dict=True
+		)
+		frappe.db.set_single_value("LMS Settings", {"show_usd_equivalent": 1, "apply_rounding": 0})
+
+	def tearDown(self):
+		frappe.local.conf.update(self.conf)
+		frappe.db.set_single_value("LMS Settings", self.settings)
+		for course in self.courses:
+			frappe.delete_doc("LMS Course", course, force=True)
+		self.clear_rates()
+		if self.last_known_rates:
+			frappe.db.set_global(LAST_KNOWN_RATES_KEY.format(TARGET_CURRENCY), self.last_known_rates)
+		# Refreshing the rates commits
+		frappe.db.commit()
+
+	def clear_rates(self):
+		frappe.db.delete(
+			"DefaultValue", {"parent": "__global", "defkey": LAST_KNOWN_RATES_KEY.format(TARGET_CURRENCY)}
+		)
+		frappe.cache().delete_value(RATES_KEY.format(TARGET_CURRENCY))
+		_rates_cache.clear()
+
+	def test_fixture_provider(self):
+		self.assertEqual(fixture_provider(["INR", "EUR"], "USD"), {"INR": 0.012})
+
+	def test_prices_are_converted_with_fixture_rates(self):
+		refresh_exchange_rates()
+
+		self.assertEqual(get_exchange_rate("INR"), 0.012)
+		self.assertEqual(get_exchange_rate("USD"), 1)
+		self.assertIsNone(get_exchange_rate("EUR"))
+		# GBP is not a price currency, so its rate is not fetched
+		self.assertIsNone(get_exchange_rate("GBP"))
+
+		self.assertEqual(
+			convert_prices([(1000, "INR", None), (20, "USD", None), (1000, "INR", 15)], country="Germany"),
+			[(12, "USD"), (20, "USD"), (15, "USD")],
+		)
+
+		frappe.db.set_single_value("LMS Settings", "apply_rounding", 1)
+		self.assertEqual(convert_prices([(1000, "INR", None)], country="Germany"), [(100, "USD")])
+
+	def test_prices_without_a_rate_keep_their_currency(self):
+		refresh_exchange_rates()
+
+		self.assertEqual(
+			convert_prices([(1000, "EUR", None), (1000, "INR", None)], country="Germany"),
+			[(1000, "EUR"), (12, "USD")],
+		)
+
+	def test_missing_fixture_rate_keeps_the_last_known_rate(self):
+		refresh_exchange_rates()
+
+		frappe.local.conf.lms_exchange_rates = {}
+		refresh_exchange_rates()
+
+		self.assertEqual(get_exchange_rate("INR"), 0.012)
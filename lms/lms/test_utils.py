@@ -2,7 +2,7 @@ import unittest
 
 import frappe
 
-from .utils import slugify
+from .utils import convert_price, slugify
 
 
 class TestUtils(unittest.TestCase):
@@ -15,3 +15,12 @@ class TestUtils(unittest.TestCase):
 		self.assertEqual(slugify("Hello World", ["hello-world"]), "hello-world-2")
 
 		self.assertEqual(slugify("Hello World", ["hello-world", "hello-world-2"]), "hello-world-3")
+
+	def test_convert_price(self):
+		self.assertEqual(convert_price(1000, "INR", None, 0.012, False), (12, "USD"))
+		self.assertEqual(convert_price(1000, "INR", None, 0.012, True), (100, "USD"))
+		self.assertEqual(convert_price(1000, "INR", 15, 0.012, False), (15, "USD"))
+		self.assertEqual(convert_price(50, "USD", None, None, False), (50, "USD"))
+
+		# Without a known rate the price stays in its own currency
+		self.assertEqual(convert_price(1000, "INR", None, None, False), (1000, "INR"))
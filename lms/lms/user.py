@@ -4,7 +4,7 @@ from frappe.model.naming import append_number_if_name_exists
 from frappe.utils import escape_html, random_string
 from frappe.website.utils import cleanup_page_name, is_signup_disabled
 
-from lms.lms.utils import get_country_code
+from lms.lms.geoip import get_country
 
 
 def validate_username_duplicates(doc, method):
@@ -67,7 +67,12 @@ def sign_up(email, full_name, verify_terms, user_category):
 		user.add_roles(default_role)
 
 	user.add_roles("LMS Student")
-	set_country_from_ip(None, user.name)
+	frappe.enqueue(
+		set_country_from_ip,
+		user=user.name,
+		ip=frappe.local.request_ip,
+		enqueue_after_commit=True,
+	)
 
 	if user.flags.email_sent:
 		return 1, _("Please check your email for verification")
@@ -75,13 +80,15 @@ def sign_up(email, full_name, verify_terms, user_category):
 		return 2, _("Please ask your administrator to verify your sign-up")
 
 
-def set_country_from_ip(login_manager=None, user=None):
+def set_country_from_ip(login_manager=None, user=None, ip=None):
 	if not user and login_manager:
 		user = login_manager.user
 	user_country = frappe.db.get_value("User", user, "country")
 	if user_country:
 		return
-	frappe.db.set_value("User", user, "country", get_country_code())
+	country = get_country(ip or frappe.local.request_ip)
+	if country:
+		frappe.db.set_value("User", user, "country", country)
 	return
 
 
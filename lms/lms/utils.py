@@ -1,3 +1,4 @@
+import base64
 import hashlib
 import json
 import re
@@ -6,7 +7,6 @@ from datetime import datetime, timedelta
 
 import frappe
 import razorpay
-import requests
 from frappe import _
 from frappe.desk.doctype.dashboard_chart.dashboard_chart import get_result
 from frappe.desk.doctype.notification_log.notification_log import make_notification_logs
@@ -15,11 +15,9 @@ from frappe.utils import (
 	add_months,
 	ceil,
 	cint,
-	cstr,
 	flt,
 	fmt_money,
 	format_date,
-	format_datetime,
 	get_datetime,
 	get_fullname,
 	get_time_str,
@@ -29,6 +27,18 @@ from frappe.utils import (
 )
 from frappe.utils.dateutils import get_period
 
+from lms.lms.catalog import (
+	get_catalog_page,
+	set_batch_cards,
+	set_batch_prices,
+	set_course_cards,
+	set_course_prices,
+)
+from lms.lms.course_outline import get_completed_lessons, get_outline
+from lms.lms.exchange_rates import get_exchange_rate, get_exchange_rates
+from lms.lms.geoip import get_country
+from lms.lms.gradebook import get_gradebook
+from lms.lms.loaders import get_title, get_user_details, get_users_details, prime
 from lms.lms.md import find_macros, markdown_to_html
 
 RE_SLUG_NOTALLOWED = re.compile("[^a-z0-9]+")
@@ -70,6 +80,28 @@ def generate_slug(title, doctype):
 	return slugify(title, used_slugs=slugs)
 
 
+def encode_cursor(values):
+	"""Returns an opaque cursor for the keyset values of the last row of a page."""
+	return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, length):
+	"""Returns the `length` keyset values of a cursor made by `encode_cursor`."""
+	try:
+		values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+	except (ValueError, AttributeError):
+		values = None
+
+	if (
+		not isinstance(values, list)
+		or len(values) != length
+		or not all(isinstance(value, str | int | float) for value in values)
+	):
+		frappe.throw(_("Invalid cursor"))
+
+	return values
+
+
 def get_membership(course, member=None):
 	if not member:
 		member = frappe.session.user
@@ -99,70 +131,45 @@ def get_chapters(course):
 	"""Returns all chapters of this course."""
 	if not course:
 		return []
-	chapters = frappe.get_all("Chapter Reference", {"parent": course}, ["idx", "chapter"], order_by="idx")
-	for chapter in chapters:
-		chapter_details = frappe.db.get_value(
-			"Course Chapter",
-			{"name": chapter.chapter},
-			["name", "title"],
-			as_dict=True,
+	return [
+		frappe._dict(
+			{"idx": chapter.idx, "chapter": chapter.name, "name": chapter.name, "title": chapter.title}
 		)
-		chapter.update(chapter_details)
-	return chapters
+		for chapter in get_outline(course).chapters
+	]
 
 
 def get_lessons(course, chapter=None, get_details=True, progress=False):
 	"""If chapter is passed, returns lessons of only that chapter.
 	Else returns lessons of all chapters of the course"""
-	lessons = []
-	lesson_count = 0
+	outline = get_outline(course)
+	chapters = outline.chapters
 	if chapter:
-		if get_details:
-			return get_lesson_details(chapter, progress=progress)
-		else:
-			return frappe.db.count("Lesson Reference", {"parent": chapter.name})
+		chapters = [c for c in chapters if c.name == chapter.name]
 
-	for chapter in get_chapters(course):
-		if get_details:
-			lessons += get_lesson_details(chapter, progress=progress)
-		else:
-			lesson_count += frappe.db.count("Lesson Reference", {"parent": chapter.name})
+	if not get_details:
+		return outline.lesson_count if not chapter else sum(len(c.lessons) for c in chapters)
 
-	return lessons if get_details else lesson_count
+	completed = get_completed_lessons(course) if progress else set()
+	lessons = []
+	for c in chapters:
+		lessons += get_outline_lessons(c, progress, completed)
+	return lessons
 
 
 def get_lesson_details(chapter, progress=False):
-	lessons = []
-	lesson_list = frappe.get_all(
-		"Lesson Reference", {"parent": chapter.name}, ["lesson", "idx"], order_by="idx"
-	)
-	for row in lesson_list:
-		lesson_details = frappe.db.get_value(
-			"Course Lesson",
-			row.lesson,
-			[
-				"name",
-				"title",
-				"include_in_preview",
-				"body",
-				"creation",
-				"youtube",
-				"quiz_id",
-				"question",
-				"file_type",
-				"instructor_notes",
-				"course",
-				"content",
-			],
-			as_dict=True,
-		)
-		lesson_details.number = f"{chapter.idx}.{row.idx}"
-		lesson_details.icon = get_lesson_icon(lesson_details.body, lesson_details.content)
+	course = frappe.db.get_value("Course Chapter", chapter.name, "course")
+	return get_lessons(course, chapter, progress=progress)
 
-		if progress:
-			lesson_details.is_complete = get_progress(lesson_details.course, lesson_details.name)
 
-		lessons.append(lesson_details)
+def get_outline_lessons(chapter, progress=False, completed=None):
+	"""Returns copies of the lessons of an outline chapter, with progress overlaid if asked."""
+	lessons = []
+	for lesson in chapter.lessons:
+		lesson = frappe._dict(lesson)
+		if progress:
+			lesson.is_complete = lesson.name in completed
+		lessons.append(lesson)
 	return lessons
 
 
@@ -209,7 +216,6 @@ def get_tags(course):
 
 
 def get_instructors(doctype, docname):
-	instructor_details = []
 	instructors = frappe.get_all(
 		"Course Instructor",
 		{"parent": docname, "parenttype": doctype},
@@ -217,16 +223,7 @@ def get_instructors(doctype, docname):
 		pluck="instructor",
 	)
 
-	for instructor in instructors:
-		instructor_details.append(
-			frappe.db.get_value(
-				"User",
-				instructor,
-				["name", "username", "full_name", "user_image", "first_name"],
-				as_dict=True,
-			)
-		)
-	return instructor_details
+	return get_users_details(instructors, ["name", "username", "full_name", "user_image", "first_name"])
 
 
 def get_students(course, batch=None):
@@ -240,10 +237,14 @@ def get_students(course, batch=None):
 
 
 def get_average_rating(course):
-	ratings = [review.rating for review in get_reviews(course)]
-	if not len(ratings):
-		return None
-	return sum(ratings) / len(ratings)
+	from lms.lms.reviews import get_review_summary
+
+	return get_review_summary(course).average
+
+
+def get_rating_scale():
+	"""Returns the number of stars a course review is rated out of."""
+	return cint(frappe.get_meta("LMS Course Review").get_field("rating").options) or 5
 
 
 @frappe.whitelist(allow_guest=True)
@@ -255,34 +256,27 @@ def get_reviews(course):
 		order_by="creation desc",
 	)
 
-	out_of_ratings = frappe.db.get_all(
-		"DocField", {"parent": "LMS Course Review", "fieldtype": "Rating"}, ["options"]
-	)
-	out_of_ratings = (len(out_of_ratings) and out_of_ratings[0].options) or 5
+	scale = get_rating_scale()
+	prime("User", [review.owner for review in reviews])
 	for review in reviews:
-		review.rating = review.rating * out_of_ratings
-		review.owner_details = frappe.db.get_value(
-			"User", review.owner, ["name", "username", "full_name", "user_image"], as_dict=True
-		)
+		review.rating = review.rating * scale
+		review.owner_details = get_user_details(review.owner, ["name", "username", "full_name", "user_image"])
 		review.creation = pretty_date(review.creation)
 
 	return reviews
 
 
 def get_sorted_reviews(course):
-	rating_count = rating_percent = frappe._dict()
-	keys = ["5.0", "4.0", "3.0", "2.0", "1.0"]
-	for key in keys:
-		rating_count[key] = 0
+	"""Returns the percentage of reviews per star, most stars first."""
+	from lms.lms.reviews import get_review_summary
 
-	reviews = get_reviews(course)
-	for review in reviews:
-		rating_count[cstr(review.rating)] += 1
-
-	for key in keys:
-		rating_percent[key] = rating_count[key] / len(reviews) * 100
-
-	return rating_percent
+	summary = get_review_summary(course)
+	return frappe._dict(
+		{
+			f"{star}.0": (count / summary.count * 100 if summary.count else 0)
+			for star, count in summary.stars.items()
+		}
+	)
 
 
 def is_certified(course):
@@ -293,16 +287,12 @@ def is_certified(course):
 
 
 def get_lesson_index(lesson_name):
-	"""Returns the {chapter_index}.{lesson_index} for the lesson."""
-	lesson = frappe.db.get_value("Lesson Reference", {"lesson": lesson_name}, ["idx", "parent"], as_dict=True)
-	if not lesson:
-		return "1-1"
-
-	chapter = frappe.db.get_value("Chapter Reference", {"chapter": lesson.parent}, ["idx"], as_dict=True)
-	if not chapter:
+	"""Returns the {chapter_index}-{lesson_index} for the lesson."""
+	course = frappe.db.get_value("Course Lesson", lesson_name, "course")
+	if not course:
 		return "1-1"
 
-	return f"{chapter.idx}-{lesson.idx}"
+	return get_outline(course).lesson_index.get(lesson_name, "1-1")
 
 
 def get_lesson_url(course, lesson_number):
@@ -323,11 +313,7 @@ def get_progress(course, lesson, member=None):
 	if not member:
 		member = frappe.session.user
 
-	return frappe.db.exists(
-		"LMS Course Progress",
-		{"course": course, "member": member, "lesson": lesson, "status": "Complete"},
-		["status"],
-	)
+	return lesson in get_completed_lessons(course, member)
 
 
 def render_html(lesson):
@@ -367,8 +353,9 @@ def get_mentors(course):
 	"""Returns the list of all mentors for this course."""
 	course_mentors = []
 	mentors = frappe.get_all("LMS Course Mentor Mapping", {"course": course}, ["mentor"])
+	prime("User", [mentor.mentor for mentor in mentors])
 	for mentor in mentors:
-		member = frappe.db.get_value("User", mentor.mentor, ["name", "username", "full_name", "user_image"])
+		member = get_user_details(mentor.mentor, ["name", "username", "full_name", "user_image"])
 		member.batch_count = frappe.db.count(
 			"LMS Enrollment", {"member": member.name, "member_type": "Mentor"}
 		)
@@ -388,10 +375,7 @@ def get_course_progress(course, member=None):
 	lesson_count = get_lessons(course, get_details=False)
 	if not lesson_count:
 		return 0
-	completed_lessons = frappe.db.count(
-		"LMS Course Progress",
-		{"course": course, "member": member or frappe.session.user, "status": "Complete"},
-	)
+	completed_lessons = len(get_completed_lessons(course, member))
 	precision = cint(frappe.db.get_default("float_precision")) or 3
 	return flt(((completed_lessons / lesson_count) * 100), precision)
 
@@ -577,7 +561,7 @@ def create_notification_log(doc, topic):
 	users = []
 	if topic.reference_doctype == "Course Lesson":
 		course = frappe.db.get_value("Course Lesson", topic.reference_docname, "course")
-		course_title = frappe.db.get_value("LMS Course", course, "title")
+		course_title = get_title("LMS Course", course)
 		instructors = frappe.db.get_all("Course Instructor", {"parent": course}, pluck="instructor")
 
 		if doc.owner != topic.owner:
@@ -690,12 +674,7 @@ def notify_mentions_via_email(doc, topic):
 
 
 def get_lesson_count(course):
-	lesson_count = 0
-	chapters = frappe.get_all("Chapter Reference", {"parent": course}, ["chapter"])
-	for chapter in chapters:
-		lesson_count += frappe.db.count("Lesson Reference", {"parent": chapter.chapter})
-
-	return lesson_count
+	return get_outline(course).lesson_count
 
 
 def get_all_memberships(member):
@@ -880,19 +859,34 @@ def get_upcoming_evals(courses=None, batch=None):
 		order_by="date",
 	)
 
+	prime("LMS Course", [evals.course for evals in upcoming_evals])
+	prime("User", [evals.evaluator for evals in upcoming_evals])
 	for evals in upcoming_evals:
-		evals.course_title = frappe.db.get_value("LMS Course", evals.course, "title")
-		evals.evaluator_name = frappe.db.get_value("User", evals.evaluator, "full_name")
+		evals.course_title = get_title("LMS Course", evals.course)
+		evaluator = get_user_details(evals.evaluator, ["full_name"])
+		evals.evaluator_name = evaluator.full_name if evaluator else None
 	return upcoming_evals
 
 
 def check_multicurrency(amount, currency, country=None, amount_usd=None):
+	return convert_prices([(amount, currency, amount_usd)], country)[0]
+
+
+def convert_prices(prices, country=None):
+	"""Converts a list of (amount, currency, amount_usd) prices to the currency shown to the user.
+	Settings, the user's country and the exchange rates are looked up once for the whole list."""
+	if not prices:
+		return []
+
 	settings = frappe.get_single("LMS Settings")
-	show_usd_equivalent = settings.show_usd_equivalent
+	unconverted = [(amount, currency) for amount, currency, amount_usd in prices]
+
+	# If conversion is disabled from settings then return as is
+	if not settings.show_usd_equivalent:
+		return unconverted
 
 	# Countries for which currency should not be converted
-	exception_country = settings.exception_country
-	exception_country = [country.country for country in exception_country]
+	exception_country = [country.country for country in settings.exception_country]
 
 	# Get users country
 	if not country:
@@ -903,26 +897,44 @@ def check_multicurrency(amount, currency, country=None, amount_usd=None):
 
 	if not country:
 		country = get_country_code()
+		if country and frappe.session.user != "Guest":
+			# Resolve the user's country only once
+			frappe.enqueue(
+				"lms.lms.user.set_country_from_ip",
+				user=frappe.session.user,
+				ip=frappe.local.request_ip,
+				job_id=f"lms_set_country:{frappe.session.user}",
+				deduplicate=True,
+			)
 
 	# If the country is the one for which conversion is not needed then return as is
-	if not country or (exception_country and country in exception_country):
-		return amount, currency
+	if not country or country in exception_country:
+		return unconverted
+
+	rates = get_exchange_rates("USD")
+	return [
+		convert_price(amount, currency, amount_usd, rates.get(currency), settings.apply_rounding)
+		for amount, currency, amount_usd in prices
+	]
+
 
-	# If conversion is disabled from settings or the currency is already USD then return as is
-	if not show_usd_equivalent or currency == "USD":
+def convert_price(amount, currency, amount_usd, exchange_rate, apply_rounding):
+	# If the currency is already USD then return as is
+	if currency == "USD":
 		return amount, currency
 
 	# If Explicit USD price is given then return that without conversion
-	if amount_usd and country and country not in exception_country:
+	if amount_usd:
 		return amount_usd, "USD"
 
-	# Conversion logic starts here. Exchange rate is fetched and amount is converted.
-	exchange_rate = get_current_exchange_rate(currency, "USD")
+	# Without a known exchange rate the price is shown in its own currency
+	if not exchange_rate:
+		return amount, currency
+
 	amount = flt(amount * exchange_rate, 2)
 	currency = "USD"
 
 	# Check if the amount should be rounded and then apply rounding
-	apply_rounding = settings.apply_rounding
 	if apply_rounding and amount % 100 != 0:
 		amount = amount + 100 - amount % 100
 
@@ -944,11 +956,7 @@ def apply_gst(amount, country=None):
 
 
 def get_current_exchange_rate(source, target="USD"):
-	url = f"https://api.frankfurter.app/latest?from={source}&to={target}"
-
-	response = requests.request("GET", url)
-	details = response.json()
-	return details["rates"][target]
+	return get_exchange_rate(source, target)
 
 
 @frappe.whitelist()
@@ -965,6 +973,12 @@ def get_courses(filters=None, start=0):
 	if not filters:
 		filters = {}
 
+	courses = get_catalog_page("courses", build_course_page, filters=filters, start=start)
+	courses = get_enrollment_details(courses)
+	return set_course_prices(courses)
+
+
+def build_course_page(filters, start):
 	filters, or_filters, show_featured = update_course_filters(filters)
 	fields = get_course_fields()
 
@@ -981,22 +995,11 @@ def get_courses(filters=None, start=0):
 	if show_featured:
 		courses = get_featured_courses(filters, or_filters, fields) + courses
 
-	courses = get_enrollment_details(courses)
-	courses = get_course_card_details(courses)
-	return courses
+	return set_course_cards(courses)
 
 
 def get_course_card_details(courses):
-	for course in courses:
-		course.instructors = get_instructors("LMS Course", course.name)
-
-		if course.paid_course and course.published == 1:
-			course.amount, course.currency = check_multicurrency(
-				course.course_price, course.currency, None, course.amount_usd
-			)
-			course.price = fmt_money(course.amount, 0, course.currency)
-
-	return courses
+	return set_course_prices(set_course_cards(courses))
 
 
 def get_course_or_filters(filters):
@@ -1042,19 +1045,19 @@ def update_course_filters(filters):
 
 
 def get_enrollment_details(courses):
-	for course in courses:
-		filters = {
-			"course": course.name,
-			"member": frappe.session.user,
-		}
+	if frappe.session.user == "Guest" or not courses:
+		return courses
 
-		if frappe.db.exists("LMS Enrollment", filters):
-			course.membership = frappe.db.get_value(
-				"LMS Enrollment",
-				filters,
-				["name", "course", "current_lesson", "progress", "member"],
-				as_dict=1,
-			)
+	enrollments = frappe.get_all(
+		"LMS Enrollment",
+		{"member": frappe.session.user, "course": ["in", [course.name for course in courses]]},
+		["name", "course", "current_lesson", "progress", "member"],
+	)
+	enrollments = {enrollment.course: enrollment for enrollment in enrollments}
+
+	for course in courses:
+		if course.name in enrollments:
+			course.membership = enrollments[course.name]
 
 	return courses
 
@@ -1196,25 +1199,10 @@ def get_categorized_courses(courses):
 def get_course_outline(course, progress=False):
 	"""Returns the course outline."""
 	outline = []
-	chapters = frappe.get_all("Chapter Reference", {"parent": course}, ["chapter", "idx"], order_by="idx")
-	for chapter in chapters:
-		chapter_details = frappe.db.get_value(
-			"Course Chapter",
-			chapter.chapter,
-			["name", "title", "is_scorm_package", "launch_file", "scorm_package"],
-			as_dict=True,
-		)
-		chapter_details["idx"] = chapter.idx
-		chapter_details.lessons = get_lessons(course, chapter_details, progress=progress)
-
-		if chapter_details.is_scorm_package:
-			chapter_details.scorm_package = frappe.db.get_value(
-				"File",
-				chapter_details.scorm_package,
-				["file_name", "file_size", "file_url"],
-				as_dict=1,
-			)
-
+	completed = get_completed_lessons(course) if progress else set()
+	for chapter in get_outline(course).chapters:
+		chapter_details = frappe._dict(chapter)
+		chapter_details.lessons = get_outline_lessons(chapter, progress, completed)
 		outline.append(chapter_details)
 	return outline
 
@@ -1310,23 +1298,8 @@ def get_video_details(lesson_name):
 
 
 def get_neighbour_lesson(course, chapter, lesson):
-	numbers = []
-	current = f"{chapter}.{lesson}"
-	chapters = frappe.get_all("Chapter Reference", {"parent": course}, ["idx", "chapter"])
-	for chapter in chapters:
-		lessons = frappe.get_all("Lesson Reference", {"parent": chapter.chapter}, pluck="idx")
-		for lesson in lessons:
-			numbers.append(f"{chapter.idx}.{lesson}")
-
-	tuples_list = [tuple(int(x) for x in s.split(".")) for s in numbers]
-	sorted_tuples = sorted(tuples_list)
-	sorted_numbers = [".".join(str(num) for num in t) for t in sorted_tuples]
-	index = sorted_numbers.index(current)
-
-	return {
-		"prev": sorted_numbers[index - 1] if index - 1 >= 0 else None,
-		"next": sorted_numbers[index + 1] if index + 1 < len(sorted_numbers) else None,
-	}
+	neighbours = get_outline(course).neighbours.get(f"{chapter}.{lesson}")
+	return neighbours or {"prev": None, "next": None}
 
 
 @frappe.whitelist(allow_guest=True)
@@ -1353,6 +1326,7 @@ def get_batch_details(batch):
 			"start_time",
 			"end_time",
 			"seat_count",
+			"seats_taken",
 			"published",
 			"amount",
 			"amount_usd",
@@ -1390,7 +1364,7 @@ def get_batch_details(batch):
 		batch_details.price = fmt_money(batch_details.amount, 0, batch_details.currency)
 
 	if batch_details.seat_count:
-		batch_details.seats_left = batch_details.seat_count - len(batch_details.students)
+		batch_details.seats_left = max(batch_details.seat_count - batch_details.seats_taken, 0)
 
 	return batch_details
 
@@ -1426,16 +1400,8 @@ def categorize_batches(batches):
 
 
 def get_country_code():
-	ip = frappe.local.request_ip
-	res = requests.get(f"http://ip-api.com/json/{ip}")
-
-	try:
-		data = res.json()
-		if data.get("status") != "fail":
-			return frappe.db.get_value("Country", {"code": data.get("countryCode")}, "name")
-	except Exception:
-		pass
-	return
+	"""Returns the country of the request's IP address from the local GeoIP database."""
+	return get_country(frappe.local.request_ip)
 
 
 @frappe.whitelist()
@@ -1573,66 +1539,8 @@ def get_exercise_details(assessment, member):
 
 
 @frappe.whitelist()
-def get_batch_students(batch):
-	students = []
-	students_list = frappe.get_all(
-		"LMS Batch Enrollment", filters={"batch": batch}, fields=["member", "name"]
-	)
-
-	batch_courses = frappe.get_all("Batch Course", {"parent": batch}, ["course", "title"])
-	assessments = frappe.get_all(
-		"LMS Assessment",
-		filters={"parent": batch},
-		fields=["name", "assessment_type", "assessment_name"],
-	)
-
-	for student in students_list:
-		courses_completed = 0
-		assessments_completed = 0
-		detail = frappe.db.get_value(
-			"User",
-			student.member,
-			["full_name", "email", "username", "last_active", "user_image"],
-			as_dict=True,
-		)
-		detail.last_active = format_datetime(detail.last_active, "dd MMM YY")
-		detail.name = student.name
-		detail.courses = frappe._dict()
-		detail.assessments = frappe._dict()
-
-		""" Iterate through courses and track their progress """
-		for course in batch_courses:
-			progress = frappe.db.get_value(
-				"LMS Enrollment", {"course": course.course, "member": student.member}, "progress"
-			)
-			detail.courses[course.title] = progress
-			if progress == 100:
-				courses_completed += 1
-
-		""" Iterate through assessments and track their progress """
-		for assessment in assessments:
-			title = frappe.db.get_value(assessment.assessment_type, assessment.assessment_name, "title")
-			assessment_info = has_submitted_assessment(
-				assessment.assessment_name, assessment.assessment_type, student.member
-			)
-			detail.assessments[title] = assessment_info
-
-			if assessment_info.result == "Pass":
-				assessments_completed += 1
-
-		detail.courses_completed = courses_completed
-		detail.assessments_completed = assessments_completed
-		if len(batch_courses) + len(assessments):
-			detail.progress = flt(
-				((courses_completed + assessments_completed) / (len(batch_courses) + len(assessments)) * 100),
-				2,
-			)
-		else:
-			detail.progress = 0
-
-		students.append(detail)
-		students = sorted(students, key=lambda x: x.progress, reverse=True)
-	return students
+def get_batch_students(batch, start=0, page_length=None):
+	return get_gradebook(batch, start, page_length)
 
 
 def has_submitted_assessment(assessment, assessment_type, member=None):
@@ -1649,6 +1557,11 @@ def has_submitted_assessment(assessment, assessment_type, member=None):
 		docfield = "quiz"
 		fields = ["percentage"]
 		not_attempted = 0
+	elif assessment_type == "LMS Programming Exercise":
+		doctype = "LMS Programming Exercise Submission"
+		docfield = "exercise"
+		fields = ["status"]
+		not_attempted = "Not Attempted"
 
 	filters = {}
 	filters[docfield] = assessment
@@ -1663,6 +1576,8 @@ def has_submitted_assessment(assessment, assessment_type, member=None):
 			passing_percentage = frappe.db.get_value("LMS Quiz", assessment, "passing_percentage")
 			if attempt_details.percentage >= passing_percentage:
 				result = "Pass"
+		elif assessment_type == "LMS Programming Exercise":
+			result = "Pass" if attempt_details.status == "Passed" else "Failed"
 		else:
 			result = attempt_details.status
 		return frappe._dict(
@@ -1707,8 +1622,9 @@ def get_discussion_topics(doctype, docname, single_thread):
 		order_by="creation desc",
 	)
 
+	prime("User", [topic.owner for topic in topics])
 	for topic in topics:
-		topic.user = frappe.db.get_value("User", topic.owner, ["full_name", "user_image"], as_dict=True)
+		topic.user = get_user_details(topic.owner, ["full_name", "user_image"])
 
 	return topics
 
@@ -1737,8 +1653,9 @@ def get_discussion_replies(topic):
 		order_by="creation",
 	)
 
+	prime("User", [reply.owner for reply in replies])
 	for reply in replies:
-		reply.user = frappe.db.get_value("User", reply.owner, ["full_name", "user_image"], as_dict=True)
+		reply.user = get_user_details(reply.owner, ["full_name", "user_image"])
 
 	return replies
 
@@ -1898,11 +1815,7 @@ def enroll_in_course(course, payment_name):
 @frappe.whitelist()
 def enroll_in_batch(batch, payment_name=None):
 	if not frappe.db.exists("LMS Batch Enrollment", {"batch": batch, "member": frappe.session.user}):
-		batch_doc = frappe.db.get_value("LMS Batch", batch, ["name", "seat_count"], as_dict=True)
-		students = frappe.db.count("LMS Batch Enrollment", {"batch": batch})
-		if batch_doc.seat_count and students >= batch_doc.seat_count:
-			frappe.throw(_("The batch is full. Please contact the Administrator."))
-
+		# The seat is taken, or the member's hold used, when the enrollment is inserted
 		new_student = frappe.new_doc("LMS Batch Enrollment")
 		new_student.update(
 			{
@@ -2028,6 +1941,11 @@ def get_batches(filters=None, start=0, order_by="start_date"):
 	if not filters:
 		filters = {}
 
+	batches = get_catalog_page("batches", build_batch_page, filters=filters, start=start, order_by=order_by)
+	return set_batch_prices(batches)
+
+
+def build_batch_page(filters, start, order_by):
 	if filters.get("enrolled"):
 		enrolled_batches = frappe.get_all(
 			"LMS Batch Enrollment", {"member": frappe.session.user}, pluck="batch"
@@ -2043,6 +1961,7 @@ def get_batches(filters=None, start=0, order_by="start_date"):
 			"title",
 			"description",
 			"seat_count",
+			"seats_taken",
 			"paid_batch",
 			"amount",
 			"amount_usd",
@@ -2061,8 +1980,7 @@ def get_batches(filters=None, start=0, order_by="start_date"):
 	)
 
 	batches = filter_batches_based_on_start_time(batches, filters)
-	batches = get_batch_card_details(batches)
-	return batches
+	return set_batch_cards(batches)
 
 
 def filter_batches_based_on_start_time(batches, filters):
@@ -2098,20 +2016,7 @@ def get_batch_type(filters):
 
 
 def get_batch_card_details(batches):
-	for batch in batches:
-		batch.instructors = get_instructors("LMS Batch", batch.name)
-		students_count = frappe.db.count("LMS Batch Enrollment", {"batch": batch.name})
-
-		if batch.seat_count:
-			batch.seats_left = batch.seat_count - students_count
-
-		if batch.paid_batch and batch.start_date >= getdate():
-			batch.amount, batch.currency = check_multicurrency(
-				batch.amount, batch.currency, None, batch.amount_usd
-			)
-			batch.price = fmt_money(batch.amount, 0, batch.currency)
-
-	return batches
+	return set_batch_prices(set_batch_cards(batches))
 
 
 def get_palette(full_name):
@@ -2287,7 +2192,7 @@ def get_my_live_classes():
 
 	if len(live_class_details):
 		for live_class in live_class_details:
-			live_class.course_title = frappe.db.get_value("LMS Course", live_class.course, "title")
+			live_class.course_title = get_title("LMS Course", live_class.course)
 
 			my_live_classes.append(live_class)
 
@@ -2411,8 +2316,9 @@ def get_admin_evals():
 		order_by="date asc",
 	)
 
+	prime("LMS Course", [evaluation.course for evaluation in evals])
 	for evaluation in evals:
-		evaluation.course_title = frappe.db.get_value("LMS Course", evaluation.course, "title")
+		evaluation.course_title = get_title("LMS Course", evaluation.course)
 
 	return evals
 
@@ -0,0 +1,8 @@
+import frappe
+
+from lms.lms.analytics_rollup import WATERMARK_KEY, seed_watermark
+
+
+def execute():
+	if not frappe.db.get_global(WATERMARK_KEY):
+		seed_watermark()
@@ -0,0 +1,15 @@
+import frappe
+
+
+def execute():
+	frappe.db.sql(
+		"""
+		UPDATE `tabLMS Batch` b
+		LEFT JOIN (
+			SELECT batch, COUNT(*) as students
+			FROM `tabLMS Batch Enrollment`
+			GROUP BY batch
+		) e ON e.batch = b.name
+		SET b.seats_taken = COALESCE(e.students, 0)
+		"""
+	)
@@ -19,6 +19,8 @@ from urllib.parse import quote
 import frappe
 from frappe import _
 
+from lms.lms.answer_key import get_answer_key, get_question_fields
+
 
 class PageExtension:
 	"""PageExtension is a plugin to inject custom styles and scripts
@@ -99,37 +101,21 @@ def quiz_renderer(quiz_name):
 		)
 		+"</div>"
 
-	quiz = frappe.db.get_value(
-		"LMS Quiz",
-		quiz_name,
-		[
-			"name",
-			"title",
-			"max_attempts",
-			"show_answers",
-			"show_submission_history",
-			"passing_percentage",
-		],
-		as_dict=True,
-	)
-	quiz.questions = []
-	fields = ["name", "question", "type", "multiple"]
-	for num in range(1, 5):
-		fields.append(f"option_{num}")
-		fields.append(f"is_correct_{num}")
-		fields.append(f"explanation_{num}")
-		fields.append(f"possibility_{num}")
-
-	questions = frappe.get_all(
-		"LMS Quiz Question",
-		filters={"parent": quiz.name},
-		fields=["question", "marks"],
-		order_by="idx",
+	answer_key = get_answer_key(quiz_name)
+	quiz = frappe._dict(
+		{
+			"name": answer_key.quiz,
+			"title": answer_key.title,
+			"max_attempts": answer_key.max_attempts,
+			"show_answers": answer_key.show_answers,
+			"show_submission_history": answer_key.show_submission_history,
+			"passing_percentage": answer_key.passing_percentage,
+			"questions": [],
+		}
 	)
-
-	for question in questions:
-		details = frappe.db.get_value("LMS Question", question.question, fields, as_dict=1)
-		details["marks"] = question.marks
+	for name, question in answer_key.questions.items():
+		details = get_question_fields(question)
+		details.update({"name": name, "marks": question.marks})
 		quiz.questions.append(details)
 
 	no_of_attempts = frappe.db.count("LMS Quiz Submission", {"owner": frappe.session.user, "quiz": quiz_name})